@@ -0,0 +1,135 @@
+"""
+CLI команди за поддръжка (flask <команда>).
+
+Стартиране:
+    flask --app main <команда>
+"""
+import click
+from flask import Flask
+from db import db
+
+
+def register_commands(app: Flask) -> None:
+    """Регистрира командите към приложението."""
+
+    @app.cli.command('recompute-ratings')
+    @click.option('--service-id', type=int, default=None, help='Само за тази услуга')
+    def recompute_ratings(service_id: int | None) -> None:
+        """Преизчислява агрегатите на ревютата (rating_count, rating_sum, хистограма)."""
+        from models.service import Service
+
+        Service.recompute_rating_aggregates(service_id)
+        db.session.commit()
+        click.echo('Агрегатите на ревютата са преизчислени')
+
+    @app.cli.command('recompute-bookings')
+    @click.option('--service-id', type=int, default=None, help='Само за тази услуга')
+    def recompute_bookings(service_id: int | None) -> None:
+        """Преизчислява booking_count на услугите от таблицата с резервации."""
+        from models.service import Service
+
+        Service.recompute_booking_counts(service_id)
+        db.session.commit()
+        click.echo('Броят резервации е преизчислен')
+
+    @app.cli.command('recompute-favorites')
+    @click.option('--service-id', type=int, default=None, help='Само за тази услуга')
+    def recompute_favorites(service_id: int | None) -> None:
+        """Преизчислява favorite_count на услугите от таблицата с любими."""
+        from models.service import Service
+
+        Service.recompute_favorite_counts(service_id)
+        db.session.commit()
+        click.echo('Броят любими е преизчислен')
+
+    @app.cli.command('recompute-unread')
+    @click.option('--user-id', type=int, default=None, help='Само за този потребител')
+    def recompute_unread(user_id: int | None) -> None:
+        """Преизчислява броячите на непрочетените известия."""
+        from models.user import RegisteredUser
+
+        RegisteredUser.recompute_unread_counts(user_id)
+        db.session.commit()
+        click.echo('Броячите на непрочетените известия са преизчислени')
+
+    @app.cli.command('recompute-stats')
+    def recompute_stats() -> None:
+        """Преизчислява броячите за статистиките на администратора (platform_counters)."""
+        from models.platform_stats import recompute_platform_counters, invalidate_statistics_cache
+
+        values = recompute_platform_counters()
+        db.session.commit()
+        invalidate_statistics_cache()
+        for name, value in values.items():
+            click.echo(f'{name}: {value}')
+
+    @app.cli.command('backfill-rollups')
+    @click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Първи ден (по подразбиране - на първата резервация)')
+    @click.option('--to', 'end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Последен ден (по подразбиране - на последната резервация)')
+    @click.option('--days-per-batch', type=int, default=31, help='Дни на транзакция')
+    def backfill_rollups(start, end, days_per_batch: int) -> None:
+        """Преизчислява дневните обобщения на резервациите (reservation_daily_rollups)."""
+        from models.reservation_rollup import backfill_reservation_rollups
+
+        written = backfill_reservation_rollups(
+            start.date() if start else None, end.date() if end else None, days_per_batch
+        )
+        click.echo(f'Записани редове: {written}')
+
+    @app.cli.command('notifications-retention')
+    @click.option('--days', type=int, default=None, help='Трие прочетените, по-стари от толкова дни')
+    @click.option('--batch-size', type=int, default=None, help='Редове на транзакция')
+    @click.option('--min-group', type=int, default=None, help='От колко еднакви непрочетени нагоре -> обобщение')
+    def notifications_retention(days: int | None, batch_size: int | None, min_group: int | None) -> None:
+        """Трие старите прочетени известия и обединява повтарящите се непрочетени."""
+        from models.notification_retention import (
+            purge_read_notifications, compact_unread_notifications
+        )
+
+        deleted = purge_read_notifications(days, batch_size)
+        result = compact_unread_notifications(min_group)
+        click.echo(f'Изтрити прочетени: {deleted}')
+        click.echo(f"Обобщения: {result['digests']} (обединени {result['collapsed']} известия)")
+
+    @app.cli.command('import-reviews')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default=None,
+                  help='Формат на файла (по подразбиране - по разширението)')
+    @click.option('--chunk-size', type=int, default=None, help='Редове на пакет')
+    def import_reviews_command(path: str, file_format: str | None, chunk_size: int | None) -> None:
+        """Импортира ревюта от CSV/NDJSON файл (миграция от стара платформа)."""
+        from models.review_import import detect_format, import_reviews
+
+        file_format = file_format or detect_format(path)
+        if file_format is None:
+            raise click.UsageError('Не може да се познае форматът - използвайте --format')
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            report = import_reviews(stream, file_format, chunk_size)
+
+        click.echo(f"Импортирани: {report['imported']}, пропуснати: {report['skipped']}, "
+                   f"услуги: {report['services_updated']}")
+        click.echo(f"Време: {report['seconds']} s ({report['rows_per_second']} реда/s)")
+        for error in report['errors']:
+            click.echo(f"  ред {error['line']}: {error['error']}", err=True)
+
+    @app.cli.command('benchmark-password-hash')
+    @click.option('--method', 'methods', multiple=True,
+                  help='Метод за измерване (може няколко); по подразбиране - текущият и няколко алтернативи')
+    @click.option('--rounds', type=int, default=5, help='Хеша на метод')
+    def benchmark_password_hash(methods: tuple[str, ...], rounds: int) -> None:
+        """Измерва времето за хеширане - за избор на PASSWORD_HASH_METHOD."""
+        from models.password_hasher import benchmark
+
+        current = app.config['PASSWORD_HASH_METHOD']
+        methods = methods or (
+            current, 'scrypt:16384:8:1', 'scrypt:65536:8:1',
+            'pbkdf2:sha256:300000', 'pbkdf2:sha256:600000'
+        )
+        workers = max(1, app.config['PASSWORD_HASH_WORKERS'])
+        for result in benchmark(list(dict.fromkeys(methods)), rounds):
+            marker = '*' if result['method'] == current else ' '
+            click.echo(f"{marker} {result['method']:<24} {result['ms_per_hash']:>8} ms/хеш  "
+                       f"~{result['hashes_per_second'] * workers:.0f} входа/s при {workers} процеса")
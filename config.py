@@ -4,8 +4,75 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# Известен на всички - main.py отказва да стартира с него извън разработка и тестове
+DEFAULT_SECRET_KEY = 'dev-secret-key'
+
+
 class Config:
-    SECRET_KEY: str = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    SECRET_KEY: str = os.environ.get('SECRET_KEY', DEFAULT_SECRET_KEY)
     SQLALCHEMY_DATABASE_URI: str = os.environ.get('DATABASE_URL', 'sqlite:///reservations.db')
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
     DEBUG: bool = os.environ.get('FLASK_DEBUG', '0') == '1'
+    TESTING: bool = os.environ.get('FLASK_TESTING', '0') == '1'
+
+    # Подписани токени от /api/auth/login (routes/identity.py)
+    AUTH_TOKEN_MAX_AGE_SECONDS: int = int(os.environ.get('AUTH_TOKEN_MAX_AGE_SECONDS', '86400'))
+    # Демо режим: X-User-ID хедърът се приема без токен - всеки може да се представи за
+    # всеки потребител. Само при DEBUG/TESTING (там е включен по подразбиране);
+    # main.py отказва да стартира с него в production
+    AUTH_ALLOW_USER_ID_HEADER: bool = os.environ.get(
+        'AUTH_ALLOW_USER_ID_HEADER', '1' if DEBUG or TESTING else '0') == '1'
+
+    # Хеширане на пароли в пул от процеси (models/password_hasher.py).
+    # Метод/параметри - изберете с: flask --app main benchmark-password-hash
+    PASSWORD_HASH_METHOD: str = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_SALT_LENGTH: int = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH', '16'))
+    # Брой процеси (0 = в нишката на заявката) и максимум чакащи пароли (после 503)
+    PASSWORD_HASH_WORKERS: int = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '16'))
+    PASSWORD_HASH_TIMEOUT_SECONDS: int = int(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', '10'))
+
+    # Ограничаване на опитите за вход (models/rate_limit.py): пик + жетони в минута
+    LOGIN_RATE_LIMIT_ENABLED: bool = os.environ.get('LOGIN_RATE_LIMIT_ENABLED', '1') == '1'
+    LOGIN_RATE_LIMIT_IP_BURST: int = int(os.environ.get('LOGIN_RATE_LIMIT_IP_BURST', '20'))
+    LOGIN_RATE_LIMIT_IP_PER_MINUTE: int = int(os.environ.get('LOGIN_RATE_LIMIT_IP_PER_MINUTE', '20'))
+    LOGIN_RATE_LIMIT_ACCOUNT_BURST: int = int(os.environ.get('LOGIN_RATE_LIMIT_ACCOUNT_BURST', '5'))
+    LOGIN_RATE_LIMIT_ACCOUNT_PER_MINUTE: int = int(os.environ.get('LOGIN_RATE_LIMIT_ACCOUNT_PER_MINUTE', '5'))
+    # Регистрации от един IP адрес (всяка хешира парола, дори при зает имейл)
+    REGISTER_RATE_LIMIT_IP_BURST: int = int(os.environ.get('REGISTER_RATE_LIMIT_IP_BURST', '10'))
+    REGISTER_RATE_LIMIT_IP_PER_MINUTE: int = int(os.environ.get('REGISTER_RATE_LIMIT_IP_PER_MINUTE', '5'))
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = int(os.environ.get('LOGIN_RATE_LIMIT_MAX_KEYS', '100000'))
+    # Празно = в паметта на процеса; път до файл = общ SQLite файл за всички worker-и
+    LOGIN_RATE_LIMIT_STORAGE: str = os.environ.get('LOGIN_RATE_LIMIT_STORAGE', '')
+
+    # Статистиките за администратора (Admin.get_statistics) - кеш в паметта, секунди
+    ADMIN_STATS_CACHE_SECONDS: int = int(os.environ.get('ADMIN_STATS_CACHE_SECONDS', '30'))
+
+    # Колко секунди (максимум) може да е старо кешираното обобщение на фасетите
+    FACET_CACHE_SECONDS: int = int(os.environ.get('FACET_CACHE_SECONDS', '60'))
+
+    # Класация "най-добре оценени" по категория (models/leaderboard.py)
+    LEADERBOARD_SIZE: int = int(os.environ.get('LEADERBOARD_SIZE', '10'))
+    LEADERBOARD_PRIOR_WEIGHT: int = int(os.environ.get('LEADERBOARD_PRIOR_WEIGHT', '5'))
+    LEADERBOARD_REBUILD_SECONDS: int = int(os.environ.get('LEADERBOARD_REBUILD_SECONDS', '300'))
+
+    # Масов импорт на ревюта - редове, валидирани и записвани с един executemany (транзакция на пакет)
+    REVIEW_IMPORT_CHUNK_SIZE: int = int(os.environ.get('REVIEW_IMPORT_CHUNK_SIZE', '1000'))
+
+    # SSE поток с известия (GET /api/notifications/stream)
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: int = int(os.environ.get('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', '15'))
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = int(os.environ.get('NOTIFICATION_STREAM_QUEUE_SIZE', '100'))
+
+    # Почистване на известията (flask --app main notifications-retention)
+    NOTIFICATION_RETENTION_DAYS: int = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = int(os.environ.get('NOTIFICATION_RETENTION_BATCH_SIZE', '500'))
+    NOTIFICATION_DIGEST_MIN_GROUP: int = int(os.environ.get('NOTIFICATION_DIGEST_MIN_GROUP', '5'))
+
+    # Каскадно изтриване на услуги/потребители: брой на транзакция (виж models/cascade_delete.py)
+    CASCADE_DELETE_BATCH_SIZE: int = int(os.environ.get('CASCADE_DELETE_BATCH_SIZE', '500'))
+
+    # Известията от събитията се записват от фонова нишка на всеки N секунди (0 = веднага след commit)
+    NOTIFICATION_WRITE_INTERVAL_SECONDS: float = float(os.environ.get('NOTIFICATION_WRITE_INTERVAL_SECONDS', '0.5'))
+
+    # Известия към доставчика за резервации: обобщение на вълните в прозорец от N секунди (0 = веднага)
+    BOOKING_DIGEST_WINDOW_SECONDS: int = int(os.environ.get('BOOKING_DIGEST_WINDOW_SECONDS', '60'))
@@ -1,16 +1,146 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 
 db: SQLAlchemy = SQLAlchemy()
 
 
+def dialect_insert(connection, table):
+    """
+    INSERT конструкция на текущата база - поддържа on_conflict_do_nothing().
+
+    SQLite и PostgreSQL имат еднакъв синтаксис INSERT ... ON CONFLICT,
+    но SQLAlchemy го предлага само през insert() на съответния диалект.
+    """
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
 def init_db(app: Flask) -> None:
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        _migrate_schema()
         _create_initial_admin()
 
 
+def _migrate_schema() -> None:
+    """
+    Донастройва съществуваща база към текущите модели.
+
+    db.create_all() създава само ЛИПСВАЩИ таблици - не добавя колони
+    и индекси към вече съществуващи. Тук правим тези промени ръчно,
+    така че старата instance/reservations.db да продължи да работи.
+
+    Всяка стъпка проверява дали вече е изпълнена (идемпотентна е).
+    """
+    _migrate_categories()
+    added = _add_missing_columns()
+
+    from models.service import Service
+
+    if added & {('services', 'rating_count'), ('services', 'rating_avg')}:
+        # Агрегатите на ревютата са нови - пълним ги от съществуващите ревюта
+        Service.recompute_rating_aggregates()
+    if ('services', 'booking_count') in added:
+        Service.recompute_booking_counts()
+    if ('services', 'favorite_count') in added:
+        Service.recompute_favorite_counts()
+    if ('users', 'unread_notification_count') in added:
+        from models.user import RegisteredUser
+        RegisteredUser.recompute_unread_counts()
+
+    from models.platform_stats import PlatformCounter, recompute_platform_counters
+    if db.session.query(PlatformCounter).count() == 0:
+        # Нова таблица platform_counters - пълним броячите от съществуващите данни
+        recompute_platform_counters()
+
+    from models.reservation import Reservation
+    from models.reservation_rollup import ReservationRollup, rebuild_reservation_rollups
+    if db.session.query(ReservationRollup).count() == 0 and db.session.query(Reservation.id).first():
+        # Нова таблица reservation_daily_rollups - пълним я от съществуващите резервации
+        rebuild_reservation_rollups()
+
+    # price/duration са ключове за сортиране - старите NULL стойности стават стойности по подразбиране
+    Service.query.filter(Service.price.is_(None)).update({'price': 0.0})
+    Service.query.filter(Service.duration.is_(None)).update({'duration': 60})
+    db.session.commit()
+
+    # Индексите, добавени към съществуващи таблици (CREATE INDEX IF NOT EXISTS)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def _add_missing_columns() -> set[tuple[str, str]]:
+    """
+    Добавя колоните от моделите, които липсват в съществуващите таблици.
+
+    Колона със server_default се добавя с DEFAULT (и NOT NULL, ако моделът
+    го изисква) - старите редове получават стойността по подразбиране.
+    Колона с NOT NULL без server_default (напр. services.category_id) се
+    добавя като nullable без DEFAULT - SQLite не позволява ADD COLUMN ...
+    NOT NULL без стойност, а старите редове се попълват от следващите
+    стъпки на миграцията (виж _migrate_categories).
+
+    Връща:
+        Множество от (таблица, колона) за добавените колони
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added: set[tuple[str, str]] = set()
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                connection.execute(text(ddl))
+                added.add((table.name, column.name))
+
+    return added
+
+
+def _migrate_categories() -> None:
+    """
+    services.category (текст) -> categories таблица + services.category_id (FK).
+
+    1. Добавя колоната category_id
+    2. Създава по един ред в categories за всяка различна стара категория
+    3. Свързва услугите с категориите
+    4. Премахва старата текстова колона (иначе NOT NULL пречи на новите записи)
+    """
+    columns = {c['name'] for c in inspect(db.engine).get_columns('services')}
+    if 'category' not in columns:
+        return
+
+    with db.engine.begin() as connection:
+        if 'category_id' not in columns:
+            connection.execute(text(
+                'ALTER TABLE services ADD COLUMN category_id INTEGER REFERENCES categories (id)'
+            ))
+        connection.execute(text(
+            'INSERT INTO categories (name) '
+            'SELECT DISTINCT category FROM services '
+            'WHERE category IS NOT NULL AND category NOT IN (SELECT name FROM categories)'
+        ))
+        connection.execute(text(
+            'UPDATE services SET category_id = '
+            '(SELECT categories.id FROM categories WHERE categories.name = services.category)'
+        ))
+        connection.execute(text('ALTER TABLE services DROP COLUMN category'))
+
+
 def _create_initial_admin() -> None:
     """
     Създава първоначален админ ако няма такъв.
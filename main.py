@@ -1,19 +1,34 @@
 from flask import Flask
-from config import Config
+from config import Config, DEFAULT_SECRET_KEY
 from db import init_db
+from cli import register_commands
 
 app: Flask = Flask(__name__)
 app.config.from_object(Config)
 app.json.ensure_ascii = False  # type: ignore  # Показва кирилица (Flask 3.0+)
 
+# С ключа по подразбиране всеки може да подпише токен за произволен потребител,
+# а с X-User-ID изобщо не е нужен токен. python main.py е демо сървърът (debug=True).
+_development = app.config['DEBUG'] or app.config['TESTING'] or __name__ == '__main__'
+if app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY and not _development:
+    raise RuntimeError('SECRET_KEY не е зададен - задайте го (или FLASK_DEBUG=1 за разработка)')
+if app.config['AUTH_ALLOW_USER_ID_HEADER'] and not _development:
+    raise RuntimeError('AUTH_ALLOW_USER_ID_HEADER е само за разработка - изключете го (или FLASK_DEBUG=1)')
+
 from models.user import RegisteredUser, Provider, Admin
 from models.reservation import Reservation
 from models.service import Service
+from models.category import Category
 from models.review import Review
 from models.favorite import Favorite
 from models.notification import Notification
+from models.booking_digest import booking_digest  # Абонира се за събитията за резервации
+from models.notification_writer import notification_writer  # Записва известията от събитията
+from models.platform_stats import PlatformCounter  # Броячи за Admin.get_statistics()
+from models.reservation_rollup import ReservationRollup  # Дневни обобщения на резервациите
 
 init_db(app)
+register_commands(app)
 
 from routes.auth import auth_bp
 from routes.services import services_bp
@@ -21,6 +36,10 @@ from routes.reservations import reservations_bp
 from routes.reviews import reviews_bp
 from routes.favorites import favorites_bp
 from routes.notifications import notifications_bp
+from routes.admin import admin_bp
+from routes.identity import init_identity
+
+init_identity(app)
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(services_bp, url_prefix='/api/services')
@@ -28,6 +47,7 @@ app.register_blueprint(reservations_bp, url_prefix='/api/reservations')
 app.register_blueprint(reviews_bp, url_prefix='/api/reviews')
 app.register_blueprint(favorites_bp, url_prefix='/api/favorites')
 app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
 
 @app.route('/')
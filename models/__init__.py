@@ -8,6 +8,7 @@
     Admin - Администратор
 
     Service - Услуга
+    Category - Категория на услуги
     Reservation - Резервация
     Review - Ревю
     Favorite - Любима услуга
@@ -19,6 +20,7 @@
 """
 
 from models.user import Guest, RegisteredUser, Provider, Admin, UserRole
+from models.category import Category
 from models.service import Service
 from models.reservation import Reservation, ReservationStatus
 from models.review import Review
@@ -32,6 +34,7 @@ __all__ = [  # __all__ определя какво се експортира п
     'Admin',
     'UserRole',
     'Service',
+    'Category',
     'Reservation',
     'ReservationStatus',
     'Review',
@@ -0,0 +1,163 @@
+"""
+Известия към доставчика за нови/променени/отменени резервации - с обобщаване.
+
+Клиент с автопарк може да направи 30 резервации за минута; 30 отделни
+известия само пречат на сервиза. Събитията се трупат в буфер в паметта
+по ключ (доставчик, тип известие). Фонова нишка проверява буфера и щом
+прозорецът на ключа (BOOKING_DIGEST_WINDOW_SECONDS от първото събитие)
+изтече, записва:
+
+    - 1 събитие  -> обикновено известие ("Нова резервация за ...")
+    - N събития  -> едно обобщение ("N нови резервации ..."), digest_count = N
+
+BOOKING_DIGEST_WINDOW_SECONDS = 0 изключва обобщаването - известията минават
+през общия буфер за запис (models/notification_writer.py), както останалите.
+
+Буферът е в паметта на процеса: при спиране на приложението (atexit)
+останалите събития се записват; при срив се губят известията от последния
+прозорец (самите резервации са в базата). В тестов режим (TESTING) няма
+фонова нишка - буферът се изпразва само с flush().
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Optional
+from flask import Flask, current_app
+from models.events import DomainEvent, event_bus
+from models.notification import (
+    BOOKING_EVENTS, DIGEST_LABELS, EVENT_NOTIFICATIONS, insert_notifications, notification_row
+)
+from models.notification_writer import notification_writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 60
+
+# Колко често фоновата нишка проверява за изтекли прозорци
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class BookingDigestBuffer:
+    """Буфер (доставчик, тип) -> събития + фонова нишка, която го изпразва."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[tuple, list[DomainEvent]] = {}
+        self._opened_at: dict[tuple, float] = {}
+        self._app: Optional[Flask] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, events: list[DomainEvent]) -> None:
+        """Абонатът на шината - записва веднага или буферира според прозореца."""
+        window = current_app.config.get('BOOKING_DIGEST_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS)
+        if window <= 0:
+            notification_writer.add([notification_row(domain_event) for domain_event in events])
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._app = current_app._get_current_object()  # pylint: disable=protected-access
+            for domain_event in events:
+                notification_type, recipient_key, _ = EVENT_NOTIFICATIONS[domain_event.type]
+                key = (domain_event.payload[recipient_key], notification_type)
+                self._pending.setdefault(key, []).append(domain_event)
+                self._opened_at.setdefault(key, now)
+        if not current_app.testing:
+            self._ensure_thread()
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Записва групите с изтекъл прозорец (или всички при force=True).
+
+        Връща:
+            Брой записани известия (обобщението е едно)
+        """
+        with self._lock:
+            app = self._app
+            if app is None:
+                return 0
+            window = app.config.get('BOOKING_DIGEST_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS)
+            now = time.monotonic()
+            due = [
+                key for key, opened_at in self._opened_at.items()
+                if force or now - opened_at >= window
+            ]
+            groups = [self._pending.pop(key) for key in due]
+            for key in due:
+                del self._opened_at[key]
+
+        rows = [self._group_row(events) for events in groups]
+        if not rows:
+            return 0
+        try:
+            with app.app_context():
+                insert_notifications(rows)
+        except Exception:
+            # Връщаме групите в буфера - ще бъдат записани при следващия опит
+            with self._lock:
+                for key, events in zip(due, groups):
+                    self._pending[key] = events + self._pending.get(key, [])
+                    self._opened_at.setdefault(key, now)
+            raise
+        return len(rows)
+
+    def shutdown(self) -> None:
+        """Записва всичко останало при спиране на процеса (atexit)."""
+        if self._app is None or self._app.testing:
+            return
+        try:
+            self.flush(force=True)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Неуспешно записване на известията за резервации при спиране')
+
+    def clear(self) -> None:
+        """Изхвърля буферираните събития без да ги записва."""
+        with self._lock:
+            self._pending.clear()
+            self._opened_at.clear()
+
+    def pending_count(self) -> int:
+        """Брой буферирани събития (още незаписани)."""
+        with self._lock:
+            return sum(len(events) for events in self._pending.values())
+
+    @staticmethod
+    def _group_row(events: list[DomainEvent]) -> dict:
+        """Едно събитие -> обикновено известие; няколко -> обобщение."""
+        row = notification_row(events[-1])
+        if len(events) > 1:
+            label = DIGEST_LABELS[row['type']]
+            row['message'] = f"{len(events)} {label}. Последна: {row['message']}"[:500]
+            row['related_id'] = None
+            row['digest_count'] = len(events)
+        return row
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='booking-digest', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # Нишката не трябва да умира - следващият опит ще запише групите
+                logger.exception('Неуспешно записване на известията за резервации')
+
+
+booking_digest = BookingDigestBuffer()
+
+
+@event_bus.subscribe(*BOOKING_EVENTS)
+def _buffer_booking_events(events: list[DomainEvent]) -> None:
+    booking_digest.add(events)
+
+
+atexit.register(booking_digest.shutdown)
@@ -0,0 +1,198 @@
+"""
+Каскадно изтриване на услуги и потребители - множествено и на пакети.
+
+SQLite не проверява foreign key-овете (PRAGMA foreign_keys е изключено),
+затова изтрита услуга или потребител оставяше "сираци" в reservations,
+reviews, favorites и notifications. Тук зависимите редове се трият с
+DELETE ... WHERE <колона> IN (пакет от id-та) - по една заявка на таблица
+за целия пакет, без зареждане на обекти.
+
+Всеки пакет (CASCADE_DELETE_BATCH_SIZE услуги/потребители) е отделна кратка
+транзакция - SQLite заключва цялата база при запис, така че заявките на
+потребителите чакат най-много един пакет, а не изтриването на голям доставчик.
+
+Core заявките минават покрай ORM събитията, затова денормализираните броячи
+се коригират от върнатите редове (DELETE ... RETURNING):
+    - platform_counters (Admin.get_statistics)
+    - reservation_daily_rollups (графиките на резервациите)
+    - Service.booking_count / favorite_count / агрегатите на ревютата -
+      за услугите, които остават (ревюта/резервации на изтрит клиент)
+Кешовете (статистики, фасети, класация) се изчистват след всеки пакет.
+"""
+from collections import Counter
+from typing import Iterable, Optional
+from flask import current_app, has_app_context
+from sqlalchemy import inspect
+from db import db
+from models.favorite import Favorite
+from models.leaderboard import leaderboard
+from models.notification import Notification
+from models.platform_stats import ROLE_COUNTERS, apply_counter_deltas, invalidate_statistics_cache
+from models.reservation import Reservation, ReservationStatus
+from models.reservation_rollup import apply_rollup_deltas
+from models.review import Review
+from models.service import Service
+from models.service_facets import invalidate_facet_cache
+from models.user import RegisteredUser
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _batch_size(batch_size: Optional[int]) -> int:
+    if batch_size is None and has_app_context():
+        batch_size = current_app.config.get('CASCADE_DELETE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    return max(1, batch_size or DEFAULT_BATCH_SIZE)
+
+
+def _delete_returning(connection, table, condition, *columns) -> list:
+    """DELETE FROM table WHERE condition RETURNING columns (един statement)."""
+    return connection.execute(table.delete().where(condition).returning(*columns)).all()
+
+
+def _apply_grouped_deltas(apply, connection, service_ids: Iterable[int]) -> None:
+    """
+    Изважда по 1 за всяко срещане на услуга - един UPDATE на група с еднаква делта.
+
+    Параметри:
+        apply: Service.apply_booking_deltas или Service.apply_favorite_deltas
+        service_ids: id-тата на услугите на изтритите редове (с повторения)
+    """
+    by_count: dict[int, list[int]] = {}
+    for service_id, count in Counter(service_ids).items():
+        by_count.setdefault(count, []).append(service_id)
+    for count, ids in by_count.items():
+        apply(connection, ids, -count)
+
+
+def _forget(model, ids: Iterable[int]) -> None:
+    """Изтритите с Core редове не трябва да остават в identity map на сесията."""
+    ids = set(ids)
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, model) and inspect(obj).identity[0] in ids:
+            db.session.expunge(obj)
+
+
+def _delete_favorites(connection, condition) -> list[int]:
+    """Трие любимите. Връща service_id на всяка изтрита."""
+    table = Favorite.__table__
+    rows = _delete_returning(connection, table, condition, table.c.id, table.c.service_id)
+    _forget(Favorite, (row.id for row in rows))
+    return [row.service_id for row in rows]
+
+
+def _delete_reservations(connection, condition) -> list[int]:
+    """Трие резервациите и коригира броячите. Връща service_id на всяка изтрита."""
+    table = Reservation.__table__
+    rows = _delete_returning(connection, table, condition, table.c.id, table.c.service_id,
+                             table.c.provider_id, table.c.datetime, table.c.status)
+    pending = sum(1 for row in rows if row.status == ReservationStatus.PENDING)
+    apply_counter_deltas(connection, total_reservations=-len(rows), pending_reservations=-pending)
+    apply_rollup_deltas(connection, rows, -1)
+    _forget(Reservation, (row.id for row in rows))
+    return [row.service_id for row in rows]
+
+
+def _delete_reviews(connection, condition) -> list[int]:
+    """Трие ревютата и коригира total_reviews. Връща service_id на всяко изтрито."""
+    table = Review.__table__
+    rows = _delete_returning(connection, table, condition, table.c.id, table.c.service_id)
+    apply_counter_deltas(connection, total_reviews=-len(rows))
+    _forget(Review, (row.id for row in rows))
+    return [row.service_id for row in rows]
+
+
+def _delete_service_batch(connection, service_ids: list[int]) -> int:
+    """Услугите от пакета и всичко, което сочи към тях."""
+    _delete_favorites(connection, Favorite.__table__.c.service_id.in_(service_ids))
+    _delete_reviews(connection, Review.__table__.c.service_id.in_(service_ids))
+    _delete_reservations(connection, Reservation.__table__.c.service_id.in_(service_ids))
+
+    table = Service.__table__
+    deleted = len(_delete_returning(connection, table, table.c.id.in_(service_ids), table.c.id))
+    apply_counter_deltas(connection, total_services=-deleted)
+    _forget(Service, service_ids)
+    return deleted
+
+
+def _invalidate_caches() -> None:
+    invalidate_statistics_cache()
+    invalidate_facet_cache()
+    leaderboard.invalidate()
+
+
+def delete_services(condition, batch_size: Optional[int] = None) -> int:
+    """
+    Изтрива услугите, отговарящи на condition, с резервациите, ревютата и любимите им.
+
+    Параметри:
+        condition: SQL условие върху Service (например Service.category_id == 3)
+        batch_size: Услуги на транзакция (по подразбиране CASCADE_DELETE_BATCH_SIZE)
+
+    Връща:
+        Брой изтрити услуги
+    """
+    batch_size = _batch_size(batch_size)
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Service.id).where(condition).order_by(Service.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        deleted += _delete_service_batch(db.session.connection(), ids)
+        db.session.commit()
+        _invalidate_caches()
+    return deleted
+
+
+def delete_users(user_ids: Iterable[int], batch_size: Optional[int] = None) -> int:
+    """
+    Изтрива потребителите с всичко тяхно.
+
+    Параметри:
+        user_ids: id-тата на потребителите
+        batch_size: Потребители на транзакция (по подразбиране CASCADE_DELETE_BATCH_SIZE)
+
+    Връща:
+        Брой изтрити потребители
+
+    За всеки пакет: услугите на доставчиците (с каскадата на delete_services),
+    после любимите, ревютата, резервациите (като клиент или доставчик) и
+    известията на потребителите, и накрая самите потребители.
+    """
+    batch_size = _batch_size(batch_size)
+    ids = sorted(set(user_ids))
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        delete_services(Service.provider_id.in_(batch), batch_size)
+
+        connection = db.session.connection()
+        favorited = _delete_favorites(connection, Favorite.__table__.c.user_id.in_(batch))
+        _apply_grouped_deltas(Service.apply_favorite_deltas, connection, favorited)
+
+        reviewed = set(_delete_reviews(connection, Review.__table__.c.user_id.in_(batch)))
+        if reviewed:
+            Service.recompute_rating_aggregates(service_ids=reviewed)
+
+        reservations = Reservation.__table__
+        booked = _delete_reservations(connection, db.or_(
+            reservations.c.customer_id.in_(batch), reservations.c.provider_id.in_(batch)
+        ))
+        _apply_grouped_deltas(Service.apply_booking_deltas, connection, booked)
+
+        notifications = Notification.__table__
+        rows = _delete_returning(connection, notifications, notifications.c.user_id.in_(batch), notifications.c.id)
+        _forget(Notification, (row.id for row in rows))
+
+        users = RegisteredUser.__table__
+        rows = _delete_returning(connection, users, users.c.id.in_(batch), users.c.role)
+        apply_counter_deltas(connection, **{
+            ROLE_COUNTERS[role]: -count for role, count in Counter(row.role for row in rows).items()
+        })
+        _forget(RegisteredUser, batch)
+        db.session.commit()
+        _invalidate_caches()
+        deleted += len(rows)
+    return deleted
@@ -0,0 +1,60 @@
+"""Модел за категория на услуги."""
+from typing import Optional
+from db import db
+
+
+class Category(db.Model):
+    """
+    Категория на услуги (нормализирана таблица).
+
+    Полета:
+        id: Уникален идентификатор
+        name: Име на категорията (уникално)
+
+    Защо отделна таблица?
+        - Преименуването е UPDATE на ЕДИН ред, а не на всички услуги
+        - Списъкът с категории се чете само от индекса ix_categories_name
+        - Услугите сочат към категорията с FK (services.category_id)
+    """
+    __tablename__ = 'categories'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_categories_name', 'name', unique=True),
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @classmethod
+    def get_by_name(cls, name: str) -> Optional['Category']:
+        """Връща категория по име или None."""
+        return cls.query.filter_by(name=name).first()
+
+    @classmethod
+    def get_or_create(cls, name: str) -> 'Category':
+        """
+        Връща съществуваща категория или създава нова (без commit).
+
+        Забележка:
+            Първо проверяваме session.new - категория, добавена в същата
+            транзакция, но още незаписана, не бива да се дублира.
+        """
+        for pending in db.session.new:
+            if isinstance(pending, cls) and pending.name == name:
+                return pending
+
+        category = cls.get_by_name(name)
+        if not category:
+            category = cls(name=name)
+            db.session.add(category)
+        return category
+
+    def to_dict(self) -> dict:
+        """Връща речник с данните."""
+        return {
+            'id': self.id,
+            'name': self.name
+        }
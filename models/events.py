@@ -0,0 +1,97 @@
+"""
+Шина за домейн събития (in-process).
+
+Бизнес методите (confirm_reservation, leave_review, ...) само публикуват
+събитие - не знаят кой се интересува от него. Събитията се трупат в
+session.info и се доставят на абонатите ЕДВА СЛЕД успешен commit:
+
+    - при rollback се изхвърлят (няма известие за отменена промяна)
+    - абонатът получава всички събития от транзакцията наведнъж
+      (например известията се записват с един executemany INSERT)
+    - грешка в абонат не връща назад вече commit-натата бизнес операция
+"""
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable
+from sqlalchemy import event
+from db import db
+
+logger = logging.getLogger(__name__)
+
+PENDING_EVENTS_KEY = 'pending_domain_events'
+
+
+class EventType(Enum):
+    """Типове домейн събития."""
+    RESERVATION_CREATED = "reservation_created"
+    RESERVATION_UPDATED = "reservation_updated"
+    RESERVATION_CANCELED = "reservation_canceled"
+    RESERVATION_CONFIRMED = "reservation_confirmed"
+    RESERVATION_REJECTED = "reservation_rejected"
+    RESERVATION_COMPLETED = "reservation_completed"
+    REVIEW_CREATED = "review_created"
+
+
+@dataclass(frozen=True)
+class DomainEvent:
+    """Едно събитие: тип + данни (id-та, не ORM обекти - те изтичат след commit)."""
+    type: EventType
+    payload: dict = field(default_factory=dict)
+
+
+Handler = Callable[[list[DomainEvent]], None]
+
+
+class EventBus:
+    """Регистър на абонатите + опашка на събитията до commit."""
+
+    def __init__(self) -> None:
+        self._handlers: dict[EventType, list[Handler]] = {}
+
+    def subscribe(self, *event_types: EventType) -> Callable[[Handler], Handler]:
+        """
+        Декоратор - абонира функция за едно или повече събития.
+
+        Функцията получава списък от събитията (от дадените типове),
+        commit-нати в една транзакция.
+        """
+        def decorator(handler: Handler) -> Handler:
+            for event_type in event_types:
+                self._handlers.setdefault(event_type, []).append(handler)
+            return handler
+        return decorator
+
+    def publish(self, event_type: EventType, **payload) -> None:
+        """Добавя събитие към текущата транзакция на db.session."""
+        db.session.info.setdefault(PENDING_EVENTS_KEY, []).append(DomainEvent(event_type, payload))
+
+    def dispatch(self, events: list[DomainEvent]) -> None:
+        """Доставя събитията - всеки абонат веднъж, със своите събития."""
+        batches: dict[Handler, list[DomainEvent]] = {}
+        for domain_event in events:
+            for handler in self._handlers.get(domain_event.type, []):
+                batches.setdefault(handler, []).append(domain_event)
+
+        for handler, batch in batches.items():
+            try:
+                handler(batch)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Абонатът %s не успя да обработи %d събития', handler.__name__, len(batch))
+
+
+event_bus = EventBus()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _dispatch_after_commit(session) -> None:
+    events = session.info.pop(PENDING_EVENTS_KEY, None)
+    if events:
+        event_bus.dispatch(events)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction) -> None:
+    if previous_transaction.nested:
+        return  # Отменен е само SAVEPOINT - външната транзакция продължава
+    session.info.pop(PENDING_EVENTS_KEY, None)
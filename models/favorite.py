@@ -1,6 +1,8 @@
 """Модел за любими услуги."""
 from datetime import datetime, timezone
+from sqlalchemy import event
 from db import db
+from models.service import Service
 
 
 class Favorite(db.Model):
@@ -31,3 +33,17 @@ class Favorite(db.Model):
             'service_id': self.service_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+
+# ==================== ПОДДРЪЖКА НА Service.favorite_count ====================
+# В същия flush/транзакция като INSERT/DELETE на любимата (атомарно) -
+# покрива add_favorite()/remove_favorite() и всеки друг db.session.add/delete.
+
+@event.listens_for(Favorite, 'after_insert')
+def _count_favorite(_mapper, connection, target: Favorite) -> None:
+    Service.apply_favorite_delta(connection, target.service_id, 1)
+
+
+@event.listens_for(Favorite, 'after_delete')
+def _uncount_favorite(_mapper, connection, target: Favorite) -> None:
+    Service.apply_favorite_delta(connection, target.service_id, -1)
@@ -0,0 +1,251 @@
+"""
+Класация "най-добре оценени" по категория, поддържана в паметта.
+
+Оценката е Байесова средна:
+
+    score = (C * m + сума на оценките) / (C + брой оценки)
+
+    m - средната оценка за целия каталог (към последното пълно преизчисляване)
+    C - "тегло" на m (LEADERBOARD_PRIOR_WEIGHT), т.е. колко въображаеми
+        ревюта със средна оценка m добавяме към всяка услуга
+
+Така услуга с едно ревю 5 звезди не изпреварва услуга със 100 ревюта 4.8.
+
+Как се поддържа:
+    - rebuild(): една заявка върху денормализираните агрегати на services
+      (rating_count, rating_sum) - без да се чете таблицата reviews
+    - record_review(): инкрементално обновяване след ново/изтрито ревю
+      (пропуска се, ако междувременно е започнало пълно преизчисляване -
+      снимката му може вече да съдържа ревюто; виж generation)
+    - top(): O(K) - връща готовия списък за категорията
+    - Пълно преизчисляване на LEADERBOARD_REBUILD_SECONDS секунди
+      (тогава се обновява и m) или след промяна на категориите
+"""
+import bisect
+import heapq
+import threading
+import time
+from typing import Optional
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from db import db
+from models.category import Category
+from models.service import Service
+
+DEFAULT_TOP_K = 10
+DEFAULT_PRIOR_WEIGHT = 5
+DEFAULT_REBUILD_SECONDS = 300
+
+
+def _setting(name: str, default: int) -> int:
+    """Чете настройка от app.config (ако има app context)."""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+class RatingLeaderboard:
+    """
+    Top-K услуги по Байесова средна оценка за всяка категория.
+
+    Вътрешни структури:
+        _stats: service_id -> [категория, брой оценки, сума на оценките]
+        _top: категория -> списък от (-score, service_id), сортиран възходящо
+              (т.е. най-добрата услуга е първа), най-много K елемента
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: dict[int, list] = {}
+        self._top: dict[str, list[tuple[float, int]]] = {}
+        self._global_mean = 0.0
+        self._built_at: Optional[float] = None  # None = трябва пълно преизчисляване
+        self._generation = 0  # +1 при всяко начало на rebuild() и при invalidate()
+        self._changes = 0     # +1 при всяко отразено record_review()
+
+    # ==================== ЧЕТЕНЕ ====================
+
+    def top(self, category: str, limit: Optional[int] = None) -> list[dict]:
+        """
+        Връща най-добре оценените услуги в категорията.
+
+        Параметри:
+            category: Име на категорията
+            limit: Брой (най-много LEADERBOARD_SIZE)
+
+        Връща:
+            Списък с речници: service_id, score, rating_count, average_rating
+        """
+        self._rebuild_if_stale()
+        top_k = _setting('LEADERBOARD_SIZE', DEFAULT_TOP_K)
+        limit = top_k if limit is None else max(0, min(limit, top_k))
+
+        with self._lock:
+            entries = self._top.get(category, [])[:limit]
+            result = []
+            for negative_score, service_id in entries:
+                _, count, total = self._stats[service_id]
+                result.append({
+                    'service_id': service_id,
+                    'score': round(-negative_score, 4),
+                    'rating_count': count,
+                    'average_rating': total / count
+                })
+        return result
+
+    # ==================== ПОДДРЪЖКА ====================
+
+    @property
+    def generation(self) -> int:
+        """Поколението на класацията - прочита се ПРЕДИ commit и се подава на record_review()."""
+        with self._lock:
+            return self._generation
+
+    def rebuild(self) -> None:
+        """Пълно преизчисляване от агрегатите в services (една заявка)."""
+        with self._lock:
+            self._generation += 1
+            generation, changes = self._generation, self._changes
+
+        rows = db.session.execute(
+            db.select(Service.id, Category.name, Service.rating_count, Service.rating_sum)
+            .join(Category, Category.id == Service.category_id)
+            .where(Service.rating_count > 0)
+        ).all()
+
+        stats = {service_id: [category, count, total] for service_id, category, count, total in rows}
+        total_count = sum(count for _, count, _ in stats.values())
+        total_sum = sum(total for _, _, total in stats.values())
+
+        with self._lock:
+            self._stats = stats
+            self._global_mean = total_sum / total_count if total_count else 0.0
+            self._top = {}
+            for category in {entry[0] for entry in stats.values()}:
+                self._top[category] = self._compute_category_top(category)
+            # Ревю или инвалидация по време на заявката може да липсва в снимката -
+            # данните се показват, но следващото четене преизчислява отново
+            settled = self._generation == generation and self._changes == changes
+            self._built_at = time.monotonic() if settled else None
+
+    def record_review(self, service_id: int, rating: int, delta: int = 1,
+                      generation: Optional[int] = None) -> None:
+        """
+        Инкрементално отразява ново (delta=1) или изтрито (delta=-1) ревю.
+
+        Извиква се СЛЕД commit, за да не остане в паметта ревю от отменена транзакция.
+
+        Параметри:
+            generation: leaderboard.generation, прочетено ПРЕДИ commit. Ако
+                междувременно е започнало пълно преизчисляване, снимката му може
+                вече да съдържа ревюто - вместо двойно броене класацията се
+                маркира за ново преизчисляване.
+        """
+        with self._lock:
+            if not self._can_record(generation):
+                return
+            entry = self._stats.get(service_id)
+        if entry is None:
+            service = db.session.get(Service, service_id)
+            if service is None:
+                return
+            entry = [service.category, 0, 0]
+
+        with self._lock:
+            if not self._can_record(generation):
+                return
+            self._changes += 1
+            entry = self._stats.setdefault(service_id, entry)
+            entry[1] += delta
+            entry[2] += delta * rating
+            if entry[1] <= 0:
+                del self._stats[service_id]
+            self._update_category_top(entry[0], service_id)
+
+    def invalidate(self) -> None:
+        """Маркира класацията за пълно преизчисляване при следващото четене."""
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    # ==================== ВЪТРЕШНИ ====================
+
+    def _can_record(self, generation: Optional[int]) -> bool:
+        """Може ли ревюто да се отрази инкрементално. Извиква се под _lock."""
+        if self._built_at is None:
+            return False  # Така или иначе ще има пълно преизчисляване при следващото четене
+        if generation is not None and generation != self._generation:
+            self._built_at = None
+            self._generation += 1
+            return False
+        return True
+
+    def _score(self, count: int, total: int) -> float:
+        prior_weight = _setting('LEADERBOARD_PRIOR_WEIGHT', DEFAULT_PRIOR_WEIGHT)
+        return (prior_weight * self._global_mean + total) / (prior_weight + count)
+
+    def _compute_category_top(self, category: str) -> list[tuple[float, int]]:
+        """Top-K за категорията от _stats - O(n log K). Извиква се под _lock."""
+        top_k = _setting('LEADERBOARD_SIZE', DEFAULT_TOP_K)
+        candidates = (
+            (-self._score(count, total), service_id)
+            for service_id, (entry_category, count, total) in self._stats.items()
+            if entry_category == category
+        )
+        return heapq.nsmallest(top_k, candidates)
+
+    def _update_category_top(self, category: str, service_id: int) -> None:
+        """Обновява top-K на категорията след промяна на една услуга. Извиква се под _lock."""
+        top_k = _setting('LEADERBOARD_SIZE', DEFAULT_TOP_K)
+        old_top = self._top.get(category, [])
+        old_item = next((item for item in old_top if item[1] == service_id), None)
+
+        entry = self._stats.get(service_id)
+        new_item = (-self._score(entry[1], entry[2]), service_id) if entry is not None else None
+
+        if old_item is not None and len(old_top) >= top_k and (new_item is None or new_item > old_item):
+            # Услуга от пълния списък се е влошила/изчезнала - някоя извън списъка
+            # може да я е изпреварила, затова преизчисляваме категорията
+            self._top[category] = self._compute_category_top(category)
+            return
+
+        top = [item for item in old_top if item[1] != service_id]
+        if new_item is not None:
+            bisect.insort(top, new_item)
+        self._top[category] = top[:top_k]
+
+    def _rebuild_if_stale(self) -> None:
+        rebuild_seconds = _setting('LEADERBOARD_REBUILD_SECONDS', DEFAULT_REBUILD_SECONDS)
+        with self._lock:
+            built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at >= rebuild_seconds:
+            self.rebuild()
+
+
+leaderboard = RatingLeaderboard()
+
+
+# ==================== ИНВАЛИДАЦИЯ ПРИ ПРОМЯНА НА КАТЕГОРИИТЕ ====================
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_on_category_change(session, _flush_context) -> None:
+    """Смяна на категория, изтрита услуга или преименувана категория -> пълно преизчисляване."""
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Category):
+            leaderboard.invalidate()
+            return
+        if isinstance(obj, Service) and (
+            obj in session.deleted or inspect(obj).attrs.category_id.history.has_changes()
+        ):
+            leaderboard.invalidate()
+            return
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _invalidate_on_bulk_write(orm_execute_state) -> None:
+    """Масови UPDATE/DELETE върху services/categories (delete_category, сливане на категории)."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (Service, Category):
+        leaderboard.invalidate()
@@ -1,8 +1,13 @@
 """Модел за известия."""
 from datetime import datetime, timezone
 from enum import Enum
+from collections import Counter
 from typing import Optional
+from sqlalchemy import event, inspect
 from db import db
+from models.events import DomainEvent, EventType
+from models.notification_stream import notification_broker
+from models.user import RegisteredUser
 
 
 class NotificationType(Enum):
@@ -11,6 +16,21 @@ class NotificationType(Enum):
     RESERVATION_CANCELLED = "cancelled"
     RESERVATION_COMPLETED = "completed"
     NEW_REVIEW = "new_review"
+    NEW_BOOKING = "new_booking"
+    BOOKING_UPDATED = "booking_updated"
+    BOOKING_CANCELED = "booking_canceled"
+
+
+# Текстът на обобщение ("N <етикет>") за всеки тип известие
+DIGEST_LABELS = {
+    NotificationType.RESERVATION_CONFIRMED: 'потвърдени резервации',
+    NotificationType.RESERVATION_CANCELLED: 'отказани резервации',
+    NotificationType.RESERVATION_COMPLETED: 'изпълнени услуги',
+    NotificationType.NEW_REVIEW: 'нови ревюта',
+    NotificationType.NEW_BOOKING: 'нови резервации',
+    NotificationType.BOOKING_UPDATED: 'променени резервации',
+    NotificationType.BOOKING_CANCELED: 'отменени резервации',
+}
 
 
 class Notification(db.Model):
@@ -24,6 +44,15 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     related_id = db.Column(db.Integer, nullable=True)
+    # Колко известия обединява този запис (>1 след компактиране в обобщение)
+    digest_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        # Непрочетените на потребителя, най-новите първо - без сканиране на таблицата
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # Keyset пагинация на списъка: WHERE user_id = ? AND id < ? ORDER BY id DESC
+        db.Index('ix_notifications_user_id_id', 'user_id', 'id'),
+    )
 
     user = db.relationship('RegisteredUser', backref='notifications')
 
@@ -49,5 +78,126 @@ class Notification(db.Model):
             'message': self.message,
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'related_id': self.related_id
+            'related_id': self.related_id,
+            'digest_count': self.digest_count or 1
         }
+
+
+# ==================== ПОДДРЪЖКА НА RegisteredUser.unread_notification_count ====================
+# В същия flush/транзакция като промяната на известието. Масовите UPDATE/DELETE
+# (mark_all_notifications_read, retention) и Core INSERT-ите обновяват брояча сами.
+
+@event.listens_for(Notification, 'after_insert')
+def _count_unread(_mapper, connection, target: Notification) -> None:
+    if not target.is_read:
+        RegisteredUser.apply_unread_delta(connection, target.user_id, 1)
+
+
+@event.listens_for(Notification, 'after_delete')
+def _uncount_unread(_mapper, connection, target: Notification) -> None:
+    if not target.is_read:
+        RegisteredUser.apply_unread_delta(connection, target.user_id, -1)
+
+
+@event.listens_for(Notification, 'after_update')
+def _recount_unread(_mapper, connection, target: Notification) -> None:
+    history = inspect(target).attrs.is_read.history
+    if not history.has_changes():
+        return
+    was_read = bool(history.deleted[0]) if history.deleted else False
+    if was_read != bool(target.is_read):
+        RegisteredUser.apply_unread_delta(connection, target.user_id, -1 if target.is_read else 1)
+
+
+# ==================== ИЗВЕСТИЯ ОТ ДОМЕЙН СЪБИТИЯ ====================
+# Събитие -> (тип известие, кой го получава, текст). Текстът се попълва от payload-а.
+EVENT_NOTIFICATIONS = {
+    EventType.RESERVATION_CONFIRMED: (
+        NotificationType.RESERVATION_CONFIRMED, 'customer_id',
+        'Резервацията ви за "{service_name}" на {datetime} е потвърдена'
+    ),
+    EventType.RESERVATION_REJECTED: (
+        NotificationType.RESERVATION_CANCELLED, 'customer_id',
+        'Резервацията ви за "{service_name}" на {datetime} е отказана'
+    ),
+    EventType.RESERVATION_COMPLETED: (
+        NotificationType.RESERVATION_COMPLETED, 'customer_id',
+        'Услугата "{service_name}" е изпълнена - оставете ревю'
+    ),
+    EventType.REVIEW_CREATED: (
+        NotificationType.NEW_REVIEW, 'provider_id',
+        'Ново ревю ({rating}/5) за "{service_name}"'
+    ),
+    EventType.RESERVATION_CREATED: (
+        NotificationType.NEW_BOOKING, 'provider_id',
+        'Нова резервация за "{service_name}" на {datetime}'
+    ),
+    EventType.RESERVATION_UPDATED: (
+        NotificationType.BOOKING_UPDATED, 'provider_id',
+        'Променена резервация за "{service_name}" - вече на {datetime}'
+    ),
+    EventType.RESERVATION_CANCELED: (
+        NotificationType.BOOKING_CANCELED, 'provider_id',
+        'Отменена резервация за "{service_name}" на {datetime}'
+    ),
+}
+
+# Известията се записват от фонова нишка - models/notification_writer.py. Тези към
+# доставчика за резервациите идват на вълни (например 30 резервации за автопарк) -
+# те минават през буфера за обобщения в models/booking_digest.py
+BOOKING_EVENTS = (EventType.RESERVATION_CREATED, EventType.RESERVATION_UPDATED, EventType.RESERVATION_CANCELED)
+
+
+def notification_row(domain_event: DomainEvent) -> dict:
+    """Редът за таблицата notifications, съответстващ на събитието."""
+    notification_type, recipient_key, template = EVENT_NOTIFICATIONS[domain_event.type]
+    return {
+        'user_id': domain_event.payload[recipient_key],
+        'type': notification_type,
+        'message': template.format(**domain_event.payload)[:500],
+        'related_id': domain_event.payload.get('related_id'),
+        'is_read': False,
+        'digest_count': 1
+    }
+
+
+def insert_notifications(rows: list[dict]) -> None:
+    """
+    Записва готови редове (виж notification_row) с един executemany INSERT.
+
+    Изпълнява се в собствена кратка транзакция (извън сесията на заявката),
+    обновява броячите на непрочетените и публикува записаните известия
+    (вече с id) към отворените SSE връзки.
+    """
+    if not rows:
+        return
+    table = Notification.__table__
+    users = RegisteredUser.__table__
+    with db.engine.begin() as connection:
+        inserted = connection.execute(
+            table.insert().returning(table.c.id, table.c.created_at, sort_by_parameter_order=True),
+            rows
+        ).all()
+        # Броячите на непрочетените - по един UPDATE на получател (executemany)
+        per_user = Counter(row['user_id'] for row in rows)
+        connection.execute(
+            users.update()
+            .where(users.c.id == db.bindparam('recipient'))
+            .values(unread_notification_count=users.c.unread_notification_count + db.bindparam('added')),
+            [{'recipient': user_id, 'added': count} for user_id, count in per_user.items()]
+        )
+
+    notification_broker.publish([
+        {
+            'id': notification_id,
+            'user_id': row['user_id'],
+            'type': row['type'].value,
+            'message': row['message'],
+            'is_read': False,
+            'created_at': created_at.isoformat() if created_at else None,
+            'related_id': row['related_id'],
+            'digest_count': row['digest_count']
+        }
+        for row, (notification_id, created_at) in zip(rows, inserted)
+    ])
+
@@ -0,0 +1,145 @@
+"""
+Поддръжка на таблицата notifications (retention + компактиране).
+
+Две задачи, пускани периодично (flask --app main notifications-retention):
+
+    purge_read_notifications: трие прочетените известия, по-стари от N дни
+    compact_unread_notifications: обединява много непрочетени известия от
+        един тип за един потребител в едно обобщение (digest_count = N)
+
+И двете работят на малки пакети с commit след всеки пакет - SQLite
+заключва цялата база при запис, а така заявките на потребителите
+чакат най-много един пакет, а не цялото почистване.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from flask import current_app, has_app_context
+from db import db
+from models.notification import Notification, DIGEST_LABELS
+from models.user import RegisteredUser
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_DIGEST_MIN_GROUP = 5
+
+
+def _setting(name: str, default: int) -> int:
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def purge_read_notifications(older_than_days: Optional[int] = None,
+                             batch_size: Optional[int] = None) -> int:
+    """
+    Изтрива прочетените известия, по-стари от older_than_days дни.
+
+    Параметри:
+        older_than_days: По подразбиране NOTIFICATION_RETENTION_DAYS
+        batch_size: Редове на транзакция (по подразбиране NOTIFICATION_RETENTION_BATCH_SIZE)
+
+    Връща:
+        Брой изтрити известия
+
+    Броячът на непрочетените не се променя - трият се само прочетени.
+    """
+    if older_than_days is None:
+        older_than_days = _setting('NOTIFICATION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    if batch_size is None:
+        batch_size = _setting('NOTIFICATION_RETENTION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Notification.id)
+            .where(Notification.is_read.is_(True), Notification.created_at < cutoff)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(
+            db.delete(Notification).where(Notification.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        deleted += len(ids)
+
+    return deleted
+
+
+def compact_unread_notifications(min_group: Optional[int] = None) -> dict:
+    """
+    Обединява повтарящите се непрочетени известия в обобщения.
+
+    Параметри:
+        min_group: От колко известия от един тип (за един потребител) нагоре
+                   да се обединяват (по подразбиране NOTIFICATION_DIGEST_MIN_GROUP)
+
+    Връща:
+        Речник с 'digests' (брой създадени обобщения) и 'collapsed' (брой
+        изтрити отделни известия)
+
+    Всяка група (потребител, тип) е отделна кратка транзакция: DELETE ...
+    RETURNING на обединените редове + INSERT на обобщението + корекция на
+    брояча с броя на реално изтритите.
+    """
+    if min_group is None:
+        min_group = _setting('NOTIFICATION_DIGEST_MIN_GROUP', DEFAULT_DIGEST_MIN_GROUP)
+    min_group = max(2, min_group)
+
+    groups = db.session.execute(
+        db.select(Notification.user_id, Notification.type, db.func.max(Notification.id))
+        .where(Notification.is_read.is_(False))
+        .group_by(Notification.user_id, Notification.type)
+        .having(db.func.count(Notification.id) >= min_group)
+    ).all()
+
+    digests = collapsed = 0
+    for user_id, notification_type, max_id in groups:
+        group = (
+            Notification.user_id == user_id,
+            Notification.type == notification_type,
+            Notification.is_read.is_(False),
+            Notification.id <= max_id,
+        )
+        # DELETE ... RETURNING: обобщението и броячът идват от реално изтритите
+        # редове - известие, маркирано като прочетено междувременно, не се брои
+        table = Notification.__table__
+        connection = db.session.connection()
+        deleted = connection.execute(
+            db.delete(table).where(*group)
+            .returning(table.c.id, table.c.message, table.c.created_at, table.c.digest_count)
+        ).all()
+        if len(deleted) < 2:
+            db.session.rollback()  # Групата се е разпаднала - няма какво да се обединява
+            continue
+
+        rows = len(deleted)
+        total = sum(row.digest_count or 1 for row in deleted)
+        latest = max(deleted, key=lambda row: row.id)
+        latest_at = max((row.created_at for row in deleted if row.created_at is not None), default=None)
+
+        label = DIGEST_LABELS.get(notification_type, notification_type.value)
+        message = f'{total} {label}. Последно: {latest.message}'[:500]
+
+        connection.execute(
+            table.insert().values(
+                user_id=user_id,
+                type=notification_type,
+                message=message,
+                is_read=False,
+                created_at=latest_at,
+                related_id=None,
+                digest_count=total
+            )
+        )
+        # rows непрочетени изчезват, появява се 1 обобщение (Core - без ORM събития)
+        RegisteredUser.apply_unread_delta(connection, user_id, 1 - rows)
+        db.session.commit()
+
+        digests += 1
+        collapsed += rows
+
+    return {'digests': digests, 'collapsed': collapsed}
@@ -0,0 +1,85 @@
+"""
+Pub/sub в паметта за известията (Server-Sent Events).
+
+Всяка отворена SSE връзка има своя опашка. Когато абонатът на домейн
+събитията запише известия, той ги публикува тук и те се доставят на
+връзките на съответния потребител - без заявки към базата. Неактивен
+клиент просто чака на опашката си.
+
+Ако клиентът не смогва (опашката се е напълнила), връзката се затваря;
+браузърът се свързва отново с Last-Event-ID и липсващите известия се
+четат от базата.
+"""
+import queue
+import threading
+from typing import Optional
+
+DEFAULT_QUEUE_SIZE = 100
+
+
+class StreamSubscription:
+    """Една SSE връзка: опашка с известия + флаг за препълване."""
+
+    def __init__(self, user_id: int, max_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        self.user_id = user_id
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.overflowed = False
+
+    def get(self, timeout: float) -> Optional[dict]:
+        """Следващото известие или None след timeout секунди (за keep-alive)."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationBroker:
+    """Регистър user_id -> отворени връзки."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: dict[int, set[StreamSubscription]] = {}
+
+    def subscribe(self, user_id: int, max_size: int = DEFAULT_QUEUE_SIZE) -> StreamSubscription:
+        """Регистрира нова връзка за потребителя."""
+        subscription = StreamSubscription(user_id, max_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StreamSubscription) -> None:
+        """Премахва връзката (клиентът е затворил потока)."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, notifications: list[dict]) -> None:
+        """
+        Доставя записаните известия на отворените връзки на получателите.
+
+        Параметри:
+            notifications: Речници във формата на Notification.to_dict()
+        """
+        with self._lock:
+            for notification in notifications:
+                for subscription in self._subscriptions.get(notification['user_id'], ()):
+                    if subscription.overflowed:
+                        continue
+                    try:
+                        subscription.queue.put_nowait(notification)
+                    except queue.Full:
+                        subscription.overflowed = True
+
+    def subscriber_count(self, user_id: Optional[int] = None) -> int:
+        """Брой отворени връзки (общо или за потребител)."""
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscriptions.get(user_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+notification_broker = NotificationBroker()
@@ -0,0 +1,135 @@
+"""
+Запис на известията от домейн събитията - извън нишката на заявката.
+
+Абонатът на шината се извиква в after_commit на сесията, т.е. още в
+нишката на заявката. Ако записваше там, всяка смяна на статус щеше да чака
+втора транзакция (INSERT + commit) преди отговора. Затова редовете само
+се добавят в буфер в паметта, а фонова нишка ги записва на всеки
+NOTIFICATION_WRITE_INTERVAL_SECONDS - с един executemany INSERT за
+известията от всички заявки в интервала.
+
+NOTIFICATION_WRITE_INTERVAL_SECONDS = 0 изключва буфера - известията се
+записват веднага след commit, в нишката на заявката.
+
+Както при models/booking_digest.py: при спиране на приложението (atexit)
+останалите редове се записват, при срив се губят известията от последния
+интервал. В тестов режим (TESTING) няма фонова нишка - буферът се
+изпразва само с flush().
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Optional
+from flask import Flask, current_app
+from models.events import DomainEvent, event_bus
+from models.notification import BOOKING_EVENTS, EVENT_NOTIFICATIONS, insert_notifications, notification_row
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 0.5
+
+
+class NotificationWriter:
+    """Буфер с готови редове за notifications + фонова нишка, която ги записва."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: list[dict] = []
+        self._wake = threading.Event()
+        self._app: Optional[Flask] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, rows: list[dict]) -> None:
+        """Записва веднага или буферира редовете (виж notification_row) според интервала."""
+        if not rows:
+            return
+        interval = current_app.config.get('NOTIFICATION_WRITE_INTERVAL_SECONDS', DEFAULT_INTERVAL_SECONDS)
+        if interval <= 0:
+            insert_notifications(rows)
+            return
+
+        with self._lock:
+            self._app = current_app._get_current_object()  # pylint: disable=protected-access
+            self._pending.extend(rows)
+        if not current_app.testing:
+            self._ensure_thread()
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Записва всички буферирани редове с един INSERT.
+
+        Връща:
+            Брой записани известия
+        """
+        with self._lock:
+            app = self._app
+            rows, self._pending = self._pending, []
+        if not rows or app is None:
+            return 0
+        try:
+            with app.app_context():
+                insert_notifications(rows)
+        except Exception:
+            # Връщаме редовете в буфера - ще бъдат записани при следващия опит
+            with self._lock:
+                self._pending = rows + self._pending
+            raise
+        return len(rows)
+
+    def shutdown(self) -> None:
+        """Записва всичко останало при спиране на процеса (atexit)."""
+        if self._app is None or self._app.testing:
+            return
+        try:
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Неуспешно записване на известията при спиране')
+
+    def clear(self) -> None:
+        """Изхвърля буферираните редове без да ги записва."""
+        with self._lock:
+            self._pending.clear()
+
+    def pending_count(self) -> int:
+        """Брой буферирани (още незаписани) известия."""
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            app = self._app
+            interval = app.config.get('NOTIFICATION_WRITE_INTERVAL_SECONDS', DEFAULT_INTERVAL_SECONDS) \
+                if app is not None else DEFAULT_INTERVAL_SECONDS
+            # Изчакваме интервала, за да съберем известията и от следващите заявки
+            self._wake.clear()
+            time.sleep(max(interval, 0))
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # Нишката не трябва да умира - редовете са върнати в буфера
+                logger.exception('Неуспешно записване на известията')
+                self._wake.set()
+
+
+notification_writer = NotificationWriter()
+
+
+@event_bus.subscribe(*(event_type for event_type in EVENT_NOTIFICATIONS if event_type not in BOOKING_EVENTS))
+def _create_notifications(events: list[DomainEvent]) -> None:
+    """Известията за всички събития от транзакцията - към буфера (след commit)."""
+    notification_writer.add([notification_row(domain_event) for domain_event in events])
+
+
+atexit.register(notification_writer.shutdown)
@@ -0,0 +1,164 @@
+"""
+Хеширане на пароли в пул от процеси с ограничена опашка.
+
+scrypt/pbkdf2 умишлено са бавни (~50-100 ms на парола). Изпълнени в нишката
+на заявката, при вълна от входове (понеделник сутрин) те заемат всички
+worker-и и останалите endpoint-и чакат. Затова set_password/check_password
+пращат работата на отделни процеси:
+
+    - PASSWORD_HASH_WORKERS процеса смятат хешовете (0 = в нишката на заявката)
+    - най-много PASSWORD_HASH_MAX_PENDING пароли чакат/се смятат едновременно;
+      над тази граница заявката веднага получава HasherBusyError (-> 503),
+      вместо да се трупа опашка, която никога няма да бъде изчистена навреме
+
+Процесите се стартират с forkserver (spawn, където го няма), не с fork:
+приложението е многонишково, а fork копира и заключени от други нишки
+lock-ове (logging, SQLAlchemy pool), които в детето никога не се освобождават.
+
+Параметрите на хеша (PASSWORD_HASH_METHOD) се избират с
+    flask --app main benchmark-password-hash
+Старите хешове продължават да се проверяват - параметрите им са записани
+в самия хеш.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_SALT_LENGTH = 16
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 16
+DEFAULT_TIMEOUT_SECONDS = 10
+
+
+class HasherBusyError(RuntimeError):
+    """Опашката за хеширане е пълна (или хешът не е готов навреме)."""
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    """forkserver (POSIX) или spawn - никога fork на многонишков процес."""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _setting(name: str, default: Any) -> Any:
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+class PasswordHasher:
+    """Пул от процеси + семафор, който ограничава чакащите пароли."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._shape: tuple[int, int] = (0, 0)  # (workers, max_pending) на текущия пул
+
+    def hash(self, password: str) -> str:
+        """Хеш на паролата с параметрите от PASSWORD_HASH_METHOD."""
+        method = _setting('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        salt_length = _setting('PASSWORD_HASH_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+        return self._run(generate_password_hash, password, method, salt_length)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Проверява паролата срещу записания хеш."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self) -> None:
+        """Спира процесите (следващото хеширане създава нов пул)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._slots = None
+            self._shape = (0, 0)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, func: Callable, *args: Any) -> Any:
+        """
+        Изпълнява func в пула и чака резултата.
+
+        Изключения:
+            HasherBusyError: Няма свободно място в опашката или времето изтече
+        """
+        workers = _setting('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+        if workers <= 0:
+            return func(*args)
+
+        max_pending = max(workers, _setting('PASSWORD_HASH_MAX_PENDING', DEFAULT_MAX_PENDING))
+        executor, slots = self._pool(workers, max_pending)
+        if not slots.acquire(blocking=False):
+            raise HasherBusyError('Сървърът е претоварен - опитайте отново след малко')
+
+        try:
+            future: Future = executor.submit(func, *args)
+        except BrokenProcessPool as e:
+            slots.release()
+            self.shutdown()
+            raise HasherBusyError('Услугата за пароли се рестартира - опитайте отново') from e
+        except BaseException:
+            slots.release()
+            raise
+        # Мястото се освобождава, когато процесът приключи - дори ако заявката
+        # вече е отказала (timeout), работата ѝ все още заема пула
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=_setting('PASSWORD_HASH_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS))
+        except FutureTimeoutError as e:
+            future.cancel()
+            raise HasherBusyError('Сървърът е претоварен - опитайте отново след малко') from e
+        except BrokenProcessPool as e:
+            self.shutdown()
+            raise HasherBusyError('Услугата за пароли се рестартира - опитайте отново') from e
+
+    def _pool(self, workers: int, max_pending: int) -> tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+        """Пулът се създава при първа нужда (и наново, ако настройките са сменени)."""
+        with self._lock:
+            if self._executor is None or self._shape != (workers, max_pending):
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=_process_context())
+                self._slots = threading.BoundedSemaphore(max_pending)
+                self._shape = (workers, max_pending)
+            return self._executor, self._slots
+
+
+password_hasher = PasswordHasher()
+
+
+def benchmark(methods: list[str], rounds: int = 5) -> list[dict]:
+    """
+    Мери колко време отнема един хеш с всеки от методите (в текущия процес).
+
+    Параметри:
+        methods: Например ['scrypt:32768:8:1', 'pbkdf2:sha256:600000']
+        rounds: Колко хеша на метод (взима се медианата)
+
+    Връща:
+        Списък с речници: method, ms_per_hash, hashes_per_second (на процес)
+
+    Ориентир: ~50-250 ms на хеш; хешове/s x PASSWORD_HASH_WORKERS е
+    максималният брой входове в секунда.
+    """
+    results = []
+    for method in methods:
+        timings = []
+        for _ in range(max(1, rounds)):
+            started = time.perf_counter()
+            generate_password_hash('benchmark-password', method)
+            timings.append(time.perf_counter() - started)
+        median = sorted(timings)[len(timings) // 2]
+        results.append({
+            'method': method,
+            'ms_per_hash': round(median * 1000, 1),
+            'hashes_per_second': round(1 / median, 1) if median > 0 else None
+        })
+    return results
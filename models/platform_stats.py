@@ -0,0 +1,288 @@
+"""
+Статистики за администратора (Admin.get_statistics) без пълни сканирания.
+
+Броячите се пазят в таблицата platform_counters (име -> стойност) и се
+поддържат инкрементално от събитията на моделите: INSERT/DELETE на
+потребител, услуга, резервация и ревю, смяна на ролята и на статуса
+на резервация. Четенето е една заявка по 7-те реда; резултатът се кешира в
+паметта за ADMIN_STATS_CACHE_SECONDS. Commit на запис в същия процес изчиства
+кеша, така че изоставане има само спрямо записи от други worker процеси.
+
+Масовите query.update()/query.delete() и Core заявките минават покрай
+събитията - след тях броячите се преизчисляват изцяло преди commit
+(една агрегирана заявка), а Core пътищата подават делтата си сами
+(apply_counter_deltas).
+
+Ако редовете липсват (нова база преди първото преизчисляване), статистиката
+се смята директно с агрегираната заявка.
+"""
+import threading
+import time
+from typing import Optional
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from db import db, dialect_insert
+from models.reservation import Reservation, ReservationStatus
+from models.review import Review
+from models.service import Service
+from models.user import RegisteredUser, UserRole
+
+DEFAULT_CACHE_SECONDS = 30
+
+# Броячите по ролята на потребителя
+ROLE_COUNTERS = {
+    UserRole.USER: 'total_users',
+    UserRole.PROVIDER: 'total_providers',
+    UserRole.ADMIN: 'total_admins',
+}
+
+COUNTER_NAMES = (
+    'total_users', 'total_providers', 'total_admins', 'total_services',
+    'total_reservations', 'pending_reservations', 'total_reviews',
+)
+
+STALE_KEY = 'platform_counters_stale'
+# Транзакцията е писала в следените таблици - кешът се изчиства след commit
+DIRTY_KEY = 'platform_stats_cache_dirty'
+
+_cache_lock = threading.Lock()
+_stats_cache: dict = {'value': None, 'created_at': 0.0, 'generation': 0}  # generation: +1 при invalidate
+
+
+class PlatformCounter(db.Model):
+    """Един денормализиран брояч (например total_reviews)."""
+    __tablename__ = 'platform_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+def compute_statistics(connection=None) -> dict:
+    """
+    Всички броячи с ЕДНА заявка - по една агрегираща подзаявка на таблица.
+
+    SELECT u.*, s.*, r.*, v.* FROM (SELECT SUM(CASE role ...) ... FROM users) u,
+           (SELECT COUNT(*) FROM services) s, ...
+    Всяка подзаявка връща точно един ред, така че резултатът е един ред.
+    """
+    def count_where(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+    users = db.select(*[
+        count_where(RegisteredUser.role == role).label(name) for role, name in ROLE_COUNTERS.items()
+    ]).subquery()
+    services = db.select(db.func.count(Service.id).label('total_services')).subquery()
+    reservations = db.select(
+        db.func.count(Reservation.id).label('total_reservations'),
+        count_where(Reservation.status == ReservationStatus.PENDING).label('pending_reservations')
+    ).subquery()
+    reviews = db.select(db.func.count(Review.id).label('total_reviews')).subquery()
+
+    # Подзаявките са по един ред - съединяваме ги без условие (ON 1 = 1)
+    statement = db.select(users, services, reservations, reviews).select_from(
+        users.join(services, db.true()).join(reservations, db.true()).join(reviews, db.true())
+    )
+    row = (connection or db.session).execute(statement).one()
+    return {name: int(row._mapping[name]) for name in COUNTER_NAMES}
+
+
+def recompute_platform_counters(connection=None) -> dict:
+    """
+    Преизчислява броячите от таблиците и ги записва (поправка / първо пълнене).
+
+    Връща:
+        Новите стойности
+    """
+    connection = connection or db.session.connection()
+    values = compute_statistics(connection)
+    table = PlatformCounter.__table__
+    statement = dialect_insert(connection, table)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.name], set_={'value': statement.excluded.value}
+        ),
+        [{'name': name, 'value': value} for name, value in values.items()]
+    )
+    return values
+
+
+def apply_counter_deltas(connection, **deltas: int) -> None:
+    """
+    Добавя делти към броячите (например total_reviews=+500 след импорт).
+
+    Липсващ ред не се създава - той ще бъде попълнен с пълно преизчисляване.
+    """
+    table = PlatformCounter.__table__
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                table.update().where(table.c.name == name).values(value=table.c.value + delta)
+            )
+
+
+def get_platform_statistics(max_age: Optional[float] = None) -> dict:
+    """
+    Статистиките от броячите, кеширани най-много max_age секунди.
+
+    Параметри:
+        max_age: По подразбиране ADMIN_STATS_CACHE_SECONDS; 0 = без кеш
+
+    Стойностите, прочетени преди инвалидация от commit на друга заявка, се
+    връщат, но не се кешират (сравнява се поколението на кеша).
+    """
+    if max_age is None:
+        max_age = DEFAULT_CACHE_SECONDS
+        if has_app_context():
+            max_age = current_app.config.get('ADMIN_STATS_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)
+
+    with _cache_lock:
+        cached: Optional[dict] = _stats_cache['value']
+        if cached is not None and time.monotonic() - _stats_cache['created_at'] < max_age:
+            return dict(cached)
+        generation = _stats_cache['generation']
+
+    rows = dict(db.session.execute(db.select(PlatformCounter.name, PlatformCounter.value)).all())
+    if all(name in rows for name in COUNTER_NAMES):
+        stats = {name: rows[name] for name in COUNTER_NAMES}
+    else:
+        stats = compute_statistics()
+
+    with _cache_lock:
+        if _stats_cache['generation'] == generation:
+            _stats_cache['value'] = stats
+            _stats_cache['created_at'] = time.monotonic()
+    return dict(stats)
+
+
+def invalidate_statistics_cache() -> None:
+    """Изчиства кешираните статистики (следващото четене е от броячите)."""
+    with _cache_lock:
+        _stats_cache['value'] = None
+        _stats_cache['generation'] += 1
+
+
+# ==================== ИНКРЕМЕНТАЛНО ОБНОВЯВАНЕ ====================
+
+@event.listens_for(RegisteredUser, 'after_insert', propagate=True)
+def _count_user(_mapper, connection, target: RegisteredUser) -> None:
+    apply_counter_deltas(connection, **{ROLE_COUNTERS[target.role]: 1})
+
+
+@event.listens_for(RegisteredUser, 'after_delete', propagate=True)
+def _uncount_user(_mapper, connection, target: RegisteredUser) -> None:
+    apply_counter_deltas(connection, **{ROLE_COUNTERS[target.role]: -1})
+
+
+# active_history: старата стойност се зарежда при присвояване дори върху
+# изтекъл (expired) след commit обект - иначе history.deleted е празно
+@event.listens_for(RegisteredUser.role, 'set', active_history=True, propagate=True)
+@event.listens_for(Reservation.status, 'set', active_history=True)
+def _keep_previous_value(_target, value, _oldvalue, _initiator):
+    return value
+
+
+@event.listens_for(RegisteredUser, 'after_update', propagate=True)
+def _move_user_role(_mapper, connection, target: RegisteredUser) -> None:
+    """Admin.change_user_role() - от един брояч в друг."""
+    history = inspect(target).attrs.role.history
+    if history.has_changes() and history.deleted and history.deleted[0] != target.role:
+        apply_counter_deltas(connection, **{ROLE_COUNTERS[history.deleted[0]]: -1})
+        apply_counter_deltas(connection, **{ROLE_COUNTERS[target.role]: 1})
+
+
+@event.listens_for(Service, 'after_insert')
+def _count_service(_mapper, connection, _target: Service) -> None:
+    apply_counter_deltas(connection, total_services=1)
+
+
+@event.listens_for(Service, 'after_delete')
+def _uncount_service(_mapper, connection, _target: Service) -> None:
+    apply_counter_deltas(connection, total_services=-1)
+
+
+@event.listens_for(Review, 'after_insert')
+def _count_review(_mapper, connection, _target: Review) -> None:
+    apply_counter_deltas(connection, total_reviews=1)
+
+
+@event.listens_for(Review, 'after_delete')
+def _uncount_review(_mapper, connection, _target: Review) -> None:
+    apply_counter_deltas(connection, total_reviews=-1)
+
+
+def _pending(status: ReservationStatus) -> int:
+    return 1 if status == ReservationStatus.PENDING else 0
+
+
+@event.listens_for(Reservation, 'after_insert')
+def _count_reservation(_mapper, connection, target: Reservation) -> None:
+    apply_counter_deltas(connection, total_reservations=1, pending_reservations=_pending(target.status))
+
+
+@event.listens_for(Reservation, 'after_delete')
+def _uncount_reservation(_mapper, connection, target: Reservation) -> None:
+    apply_counter_deltas(connection, total_reservations=-1, pending_reservations=-_pending(target.status))
+
+
+@event.listens_for(Reservation, 'after_update')
+def _move_reservation_status(_mapper, connection, target: Reservation) -> None:
+    """confirm/reject/cancel/complete - само pending_reservations се променя."""
+    history = inspect(target).attrs.status.history
+    if history.has_changes() and history.deleted:
+        delta = _pending(target.status) - _pending(history.deleted[0])
+        apply_counter_deltas(connection, pending_reservations=delta)
+
+
+# ==================== МАСОВИ ЗАПИСИ ====================
+
+TRACKED_CLASSES = (RegisteredUser, Service, Reservation, Review)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _mark_dirty_on_flush(session, _flush_context) -> None:
+    """ORM запис на потребител/услуга/резервация/ревю."""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, TRACKED_CLASSES) for obj in changed):
+        session.info[DIRTY_KEY] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_stale_on_bulk_write(orm_execute_state) -> None:
+    """query.update()/query.delete() не минават през събитията на обектите."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, TRACKED_CLASSES):
+        return
+    # UPDATE променя броячите само през ролята или статуса (не и напр. агрегатите на Service)
+    if orm_execute_state.is_update and not issubclass(mapper.class_, (RegisteredUser, Reservation)):
+        return
+    orm_execute_state.session.info[STALE_KEY] = True
+    orm_execute_state.session.info[DIRTY_KEY] = True
+
+
+@event.listens_for(db.session, 'before_commit')
+def _recompute_if_stale(session) -> None:
+    if session.info.pop(STALE_KEY, False):
+        recompute_platform_counters(session.connection())
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_stale_on_rollback(session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(STALE_KEY, None)
+
+
+# Кешът се изчиства СЛЕД commit: изчистен при flush, той може да се напълни
+# отново от друга заявка със старите броячи, преди записът да е commit-нат.
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session) -> None:
+    if session.info.pop(DIRTY_KEY, False):
+        invalidate_statistics_cache()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _invalidate_after_rollback(session) -> None:
+    """За всеки случай - и при rollback, ако транзакцията е писала в следените таблици."""
+    if session.info.pop(DIRTY_KEY, False):
+        invalidate_statistics_cache()
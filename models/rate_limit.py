@@ -0,0 +1,253 @@
+"""
+Ограничаване на опитите за вход и за регистрация (token bucket).
+
+Всеки ключ (IP адрес или акаунт) има "кофа" с capacity жетона, която се
+пълни с refill_per_minute жетона в минута. Всеки опит за вход взима един
+жетон; празна кофа -> 429 с Retry-After. Проверката е ПРЕДИ заявката към
+базата и хеширането на паролата, така че отказаните опити не струват нищо.
+
+Състоянието на ключ е само (жетони, последно обновяване) - O(1) памет.
+Хранилища (LOGIN_RATE_LIMIT_STORAGE):
+
+    ''           -> MemoryBackend: речник в паметта на процеса, LRU - при
+                    повече от LOGIN_RATE_LIMIT_MAX_KEYS ключа се изхвърля
+                    най-отдавна използваният (изхвърлена кофа = пълна кофа)
+    път до файл  -> SQLiteBackend: общ SQLite файл, който няколко worker
+                    процеса на една машина споделят (заместител на Redis)
+"""
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from flask import current_app
+
+DEFAULT_MAX_KEYS = 100_000
+
+# Колко взимания между две почиствания на SQLite таблицата
+SQLITE_PRUNE_EVERY = 1000
+
+# Горна граница на Retry-After - при *_PER_MINUTE = 0 кофата не се пълни
+# и времето до следващия жетон е безкрайно
+MAX_RETRY_AFTER_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """Параметри на кофата: капацитет (пик) и пълнене в минута."""
+    capacity: float
+    refill_per_minute: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.refill_per_minute / 60
+
+    @property
+    def full_after_seconds(self) -> float:
+        """След колко секунди без опити празна кофа е отново пълна."""
+        return self.capacity / self.refill_per_second if self.refill_per_second > 0 else math.inf
+
+
+def _take(tokens: float, updated_at: float, now: float,
+          limit: BucketLimit) -> tuple[bool, float, float]:
+    """
+    Пълни кофата за изминалото време и опитва да вземе един жетон.
+
+    Връща:
+        (разрешено, нов брой жетони, секунди до следващия жетон)
+    """
+    tokens = min(limit.capacity, tokens + max(0.0, now - updated_at) * limit.refill_per_second)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    if limit.refill_per_second <= 0:
+        return False, tokens, math.inf
+    return False, tokens, (1 - tokens) / limit.refill_per_second
+
+
+class MemoryBackend:
+    """Кофи в паметта на процеса (LRU с ограничен брой ключове)."""
+
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, limit: BucketLimit, now: Optional[float] = None) -> tuple[bool, float]:
+        """Взима жетон от кофата на key. Връща (разрешено, retry_after секунди)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, limit)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def reset(self) -> None:
+        """Изчиства всички кофи."""
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class SQLiteBackend:
+    """
+    Кофи в общ SQLite файл - за няколко worker процеса на една машина.
+
+    Четенето и записът на кофа са в една BEGIN IMMEDIATE транзакция, така
+    че два процеса не могат да вземат последния жетон едновременно.
+    """
+
+    def __init__(self, path: str, max_keys: int = DEFAULT_MAX_KEYS) -> None:
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._takes = 0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_updated_at '
+                'ON rate_limit_buckets (updated_at)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # isolation_level=None - транзакциите се управляват ръчно (BEGIN IMMEDIATE)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key: str, limit: BucketLimit, now: Optional[float] = None) -> tuple[bool, float]:
+        """Взима жетон от кофата на key. Връща (разрешено, retry_after секунди)."""
+        now = time.time() if now is None else now  # Общ часовник за всички процеси
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (limit.capacity, now)
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, limit)
+            connection.execute(
+                'INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._takes += 1
+        if self._takes % SQLITE_PRUNE_EVERY == 0:
+            self._prune()
+        return allowed, retry_after
+
+    def _prune(self) -> None:
+        """LRU: над max_keys се трият най-отдавна използваните кофи."""
+        self._connect().execute(
+            'DELETE FROM rate_limit_buckets WHERE key IN ('
+            ' SELECT key FROM rate_limit_buckets ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_keys,)
+        )
+
+    def reset(self) -> None:
+        """Изчиства всички кофи."""
+        self._connect().execute('DELETE FROM rate_limit_buckets')
+
+    def __len__(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM rate_limit_buckets').fetchone()[0]
+
+
+class LoginRateLimiter:
+    """Две кофи на опит за вход: по IP адрес и по акаунт (имейл/потребителско име)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._backend = None
+        self._storage: Optional[tuple[str, int]] = None
+
+    def check(self, ip: Optional[str], account: str) -> Optional[float]:
+        """
+        Взима по един жетон от кофата на IP адреса и на акаунта.
+
+        Параметри:
+            ip: request.remote_addr (None -> само по акаунт)
+            account: Въведеният имейл или потребителско име
+
+        Връща:
+            None ако опитът е разрешен, иначе секунди до следващия разрешен опит
+            (най-много MAX_RETRY_AFTER_SECONDS)
+        """
+        config = current_app.config
+        if not config.get('LOGIN_RATE_LIMIT_ENABLED', True):
+            return None
+
+        backend = self.backend()
+        checks = [(
+            f'account:{account.strip().lower()[:255]}',
+            BucketLimit(config['LOGIN_RATE_LIMIT_ACCOUNT_BURST'], config['LOGIN_RATE_LIMIT_ACCOUNT_PER_MINUTE'])
+        )]
+        if ip:
+            checks.insert(0, (
+                f'ip:{ip}',
+                BucketLimit(config['LOGIN_RATE_LIMIT_IP_BURST'], config['LOGIN_RATE_LIMIT_IP_PER_MINUTE'])
+            ))
+
+        for key, limit in checks:
+            allowed, retry_after = backend.take(key, limit)
+            if not allowed:
+                return min(retry_after, MAX_RETRY_AFTER_SECONDS)
+        return None
+
+    def check_registration(self, ip: Optional[str]) -> Optional[float]:
+        """
+        Взима жетон от кофата за регистрации на IP адреса.
+
+        Регистрацията хешира паролата преди INSERT-а да открие зает
+        username/email, така че всеки опит (и повторен) струва едно хеширане.
+
+        Връща:
+            None ако опитът е разрешен, иначе секунди до следващия разрешен опит
+        """
+        config = current_app.config
+        if not ip or not config.get('LOGIN_RATE_LIMIT_ENABLED', True):
+            return None
+
+        limit = BucketLimit(config['REGISTER_RATE_LIMIT_IP_BURST'], config['REGISTER_RATE_LIMIT_IP_PER_MINUTE'])
+        allowed, retry_after = self.backend().take(f'register:{ip}', limit)
+        return None if allowed else min(retry_after, MAX_RETRY_AFTER_SECONDS)
+
+    def backend(self):
+        """Хранилището според LOGIN_RATE_LIMIT_STORAGE (създава се при първа нужда)."""
+        storage = (
+            current_app.config.get('LOGIN_RATE_LIMIT_STORAGE', ''),
+            current_app.config.get('LOGIN_RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS)
+        )
+        with self._lock:
+            if self._backend is None or self._storage != storage:
+                path, max_keys = storage
+                self._backend = SQLiteBackend(path, max_keys) if path else MemoryBackend(max_keys)
+                self._storage = storage
+            return self._backend
+
+    def reset(self) -> None:
+        """Изчиства кофите (тестове, ръчно отблокиране)."""
+        with self._lock:
+            backend = self._backend
+        if backend is not None:
+            backend.reset()
+
+
+login_rate_limiter = LoginRateLimiter()
@@ -1,7 +1,9 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional
+from sqlalchemy import event
 from db import db
+from models.service import Service
 
 
 class ReservationStatus(Enum):
@@ -11,6 +13,10 @@ class ReservationStatus(Enum):
     COMPLETED = "Completed"
 
 
+# Статуси, които заемат час в графика (отменените и изпълнените не блокират)
+ACTIVE_STATUSES = (ReservationStatus.PENDING, ReservationStatus.CONFIRMED)
+
+
 class Reservation(db.Model):
     """
     Модел за резервация за авто сервиз.
@@ -40,6 +46,11 @@ class Reservation(db.Model):
     service = db.relationship('Service', backref='reservations')
     provider = db.relationship('RegisteredUser', foreign_keys=[provider_id], backref='provided_reservations')
 
+    __table_args__ = (
+        # Покрива търсенето на заети часове за услуга в даден ден (service_id = ? AND datetime в интервал)
+        db.Index('ix_reservations_service_datetime', 'service_id', 'datetime'),
+    )
+
     def __init__(self, datetime, customer_id: int, provider_id: int, service_id: int,
                  status: ReservationStatus = ReservationStatus.PENDING,
                  notes: Optional[str] = None, problem_image_url: Optional[str] = None):
@@ -76,3 +87,15 @@ class Reservation(db.Model):
             'service_id': self.service_id
         }
 
+
+# ==================== ПОДДРЪЖКА НА Service.booking_count ====================
+# В същия flush/транзакция като INSERT/DELETE на резервацията (атомарно).
+
+@event.listens_for(Reservation, 'after_insert')
+def _count_booking(_mapper, connection, target: Reservation) -> None:
+    Service.apply_booking_delta(connection, target.service_id, 1)
+
+
+@event.listens_for(Reservation, 'after_delete')
+def _uncount_booking(_mapper, connection, target: Reservation) -> None:
+    Service.apply_booking_delta(connection, target.service_id, -1)
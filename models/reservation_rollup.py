@@ -0,0 +1,285 @@
+"""
+Дневни обобщения (rollups) на резервациите - за графики по доставчик и услуга.
+
+Таблицата reservation_daily_rollups има по един ред на (ден, доставчик,
+услуга) с броя резервации във всеки статус. Денят е датата на самата
+резервация (Reservation.datetime). Графиката за произволен период чете
+най-много (дни x услуги) реда от индекса, вместо да сканира reservations;
+седмиците се сглобяват от дните.
+
+Поддръжка:
+    - събитията на Reservation (INSERT/DELETE, смяна на статус, дата,
+      услуга или доставчик) местят по една бройка в същата транзакция -
+      INSERT ... ON CONFLICT DO UPDATE SET <статус> = <статус> + 1
+    - Core изтриванията (cascade_delete) подават изтритите редове на
+      apply_rollup_deltas
+    - масови query.update()/query.delete() върху Reservation маркират
+      обобщенията за пълно преизчисляване преди commit
+    - rebuild_reservation_rollups() / flask --app main backfill-rollups
+      преизчисляват период (на пакети от дни) от таблицата reservations
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+from sqlalchemy import event, inspect
+from db import db, dialect_insert
+from models.reservation import Reservation, ReservationStatus
+
+# Статус -> колона с броя
+STATUS_COLUMNS = {
+    ReservationStatus.PENDING: 'pending',
+    ReservationStatus.CONFIRMED: 'confirmed',
+    ReservationStatus.CANCELED: 'canceled',
+    ReservationStatus.COMPLETED: 'completed',
+}
+
+GRANULARITIES = ('day', 'week')
+
+STALE_KEY = 'reservation_rollups_stale'
+
+
+class ReservationRollup(db.Model):
+    """Брой резервации по статус за един ден, доставчик и услуга."""
+    __tablename__ = 'reservation_daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+    provider_id = db.Column(db.Integer, primary_key=True)
+    service_id = db.Column(db.Integer, primary_key=True)
+
+    pending = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    confirmed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    canceled = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # Графика за доставчик/услуга: WHERE provider_id = ? AND day BETWEEN ? AND ?
+        db.Index('ix_reservation_rollups_provider_day', 'provider_id', 'day'),
+        db.Index('ix_reservation_rollups_service_day', 'service_id', 'day'),
+    )
+
+
+def apply_rollup_delta(connection, day: date, provider_id: int, service_id: int,
+                       status: ReservationStatus, delta: int) -> None:
+    """
+    Атомарно добавя delta към брояча на статуса за (ден, доставчик, услуга).
+
+    Липсващият ред се създава (INSERT ... ON CONFLICT DO UPDATE).
+    """
+    if not delta:
+        return
+    table = ReservationRollup.__table__
+    column = STATUS_COLUMNS[status]
+    statement = dialect_insert(connection, table).values(
+        day=day, provider_id=provider_id, service_id=service_id, **{column: delta}
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.provider_id, table.c.service_id],
+        set_={column: table.c[column] + delta}
+    ))
+
+
+def apply_rollup_deltas(connection, rows: Iterable, delta: int) -> None:
+    """
+    Масов вариант - по един UPSERT на група (ден, доставчик, услуга, статус).
+
+    Параметри:
+        rows: Редове с datetime, provider_id, service_id, status (напр. от DELETE ... RETURNING)
+        delta: -1 за изтрити резервации
+    """
+    groups = Counter(
+        (row.datetime.date(), row.provider_id, row.service_id, row.status) for row in rows
+    )
+    for (day, provider_id, service_id, status), count in groups.items():
+        apply_rollup_delta(connection, day, provider_id, service_id, status, delta * count)
+
+
+def rebuild_reservation_rollups(start: Optional[date] = None, end: Optional[date] = None,
+                                connection=None) -> int:
+    """
+    Преизчислява обобщенията за дните от start до end (включително) - без commit.
+
+    Параметри:
+        start, end: Периодът (None = без граница)
+
+    Връща:
+        Брой записани редове
+
+    Изтрива редовете за периода и ги пълни с една INSERT ... SELECT ... GROUP BY.
+    """
+    connection = connection or db.session.connection()
+    table = ReservationRollup.__table__
+
+    rollup_range, reservation_range = [], []
+    if start is not None:
+        rollup_range.append(table.c.day >= start)
+        reservation_range.append(Reservation.datetime >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        rollup_range.append(table.c.day <= end)
+        reservation_range.append(
+            Reservation.datetime < datetime.combine(end + timedelta(days=1), datetime.min.time())
+        )
+
+    connection.execute(table.delete().where(*rollup_range))
+
+    def count_status(status):
+        return db.func.sum(db.case((Reservation.status == status, 1), else_=0))
+
+    day = db.func.date(Reservation.datetime)
+    select = (
+        db.select(day, Reservation.provider_id, Reservation.service_id,
+                  *[count_status(status) for status in STATUS_COLUMNS])
+        .where(*reservation_range)
+        .group_by(day, Reservation.provider_id, Reservation.service_id)
+    )
+    columns = ['day', 'provider_id', 'service_id', *STATUS_COLUMNS.values()]
+    result = connection.execute(table.insert().from_select(columns, select))
+    return result.rowcount
+
+
+def backfill_reservation_rollups(start: Optional[date] = None, end: Optional[date] = None,
+                                 days_per_batch: int = 31) -> int:
+    """
+    Пълни обобщенията от съществуващите резервации - на пакети от дни, с commit след всеки.
+
+    Параметри:
+        start, end: Периодът (по подразбиране - от първата до последната резервация)
+        days_per_batch: Дни на транзакция
+
+    Връща:
+        Брой записани редове
+    """
+    first, last = db.session.execute(
+        db.select(db.func.min(Reservation.datetime), db.func.max(Reservation.datetime))
+    ).one()
+    if first is None:
+        return 0
+    start = start or first.date()
+    end = end or last.date()
+
+    written = 0
+    batch_start = start
+    while batch_start <= end:
+        batch_end = min(end, batch_start + timedelta(days=max(1, days_per_batch) - 1))
+        written += rebuild_reservation_rollups(batch_start, batch_end)
+        db.session.commit()
+        batch_start = batch_end + timedelta(days=1)
+    return written
+
+
+def reservation_series(start: date, end: date, provider_id: Optional[int] = None,
+                       service_id: Optional[int] = None, granularity: str = 'day') -> list[dict]:
+    """
+    Брой резервации по ден или седмица за периода - само от обобщенията.
+
+    Параметри:
+        start, end: Периодът (включително)
+        provider_id, service_id: Филтри (незадължителни)
+        granularity: 'day' или 'week' (седмицата започва в понеделник)
+
+    Връща:
+        Списък с речници: period (ISO дата), pending, confirmed, canceled,
+        completed, total - по един за всеки ден/седмица, включително празните
+    """
+    conditions = [ReservationRollup.day >= start, ReservationRollup.day <= end]
+    if provider_id is not None:
+        conditions.append(ReservationRollup.provider_id == provider_id)
+    if service_id is not None:
+        conditions.append(ReservationRollup.service_id == service_id)
+
+    names = list(STATUS_COLUMNS.values())
+    rows = db.session.execute(
+        db.select(ReservationRollup.day,
+                  *[db.func.sum(getattr(ReservationRollup, name)).label(name) for name in names])
+        .where(*conditions)
+        .group_by(ReservationRollup.day)
+    ).all()
+
+    def period_of(day: date) -> date:
+        return day - timedelta(days=day.weekday()) if granularity == 'week' else day
+
+    step = timedelta(days=7 if granularity == 'week' else 1)
+    buckets: dict[date, dict] = {}
+    period = period_of(start)
+    while period <= end:
+        buckets[period] = dict.fromkeys(names, 0)
+        period += step
+
+    for row in rows:
+        counts = buckets[period_of(row.day)]
+        for name in names:
+            counts[name] += int(getattr(row, name) or 0)
+
+    return [
+        {'period': period.isoformat(), **counts, 'total': sum(counts.values())}
+        for period, counts in buckets.items()
+    ]
+
+
+# ==================== ИНКРЕМЕНТАЛНО ОБНОВЯВАНЕ ====================
+
+ROLLUP_KEY_ATTRIBUTES = ('datetime', 'provider_id', 'service_id', 'status')
+
+
+# Старите стойности трябват при смяна (и на изтекъл след commit обект)
+@event.listens_for(Reservation.datetime, 'set', active_history=True)
+@event.listens_for(Reservation.provider_id, 'set', active_history=True)
+@event.listens_for(Reservation.service_id, 'set', active_history=True)
+@event.listens_for(Reservation.status, 'set', active_history=True)
+def _keep_previous_value(_target, value, _oldvalue, _initiator):
+    return value
+
+
+@event.listens_for(Reservation, 'after_insert')
+def _count_in_rollup(_mapper, connection, target: Reservation) -> None:
+    apply_rollup_delta(connection, target.datetime.date(), target.provider_id, target.service_id,
+                       target.status, 1)
+
+
+@event.listens_for(Reservation, 'after_delete')
+def _uncount_from_rollup(_mapper, connection, target: Reservation) -> None:
+    apply_rollup_delta(connection, target.datetime.date(), target.provider_id, target.service_id,
+                       target.status, -1)
+
+
+@event.listens_for(Reservation, 'after_update')
+def _move_in_rollup(_mapper, connection, target: Reservation) -> None:
+    """Смяна на статус, дата, услуга или доставчик - от стария ред в новия."""
+    state = inspect(target)
+    previous = {}
+    for name in ROLLUP_KEY_ATTRIBUTES:
+        history = state.attrs[name].history
+        previous[name] = history.deleted[0] if history.has_changes() and history.deleted else getattr(target, name)
+    current = {name: getattr(target, name) for name in ROLLUP_KEY_ATTRIBUTES}
+    if previous['datetime'].date() == current['datetime'].date() and all(
+        previous[name] == current[name] for name in ROLLUP_KEY_ATTRIBUTES[1:]
+    ):
+        return
+
+    apply_rollup_delta(connection, previous['datetime'].date(), previous['provider_id'],
+                       previous['service_id'], previous['status'], -1)
+    apply_rollup_delta(connection, current['datetime'].date(), current['provider_id'],
+                       current['service_id'], current['status'], 1)
+
+
+# ==================== МАСОВИ ЗАПИСИ ====================
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_stale_on_bulk_write(orm_execute_state) -> None:
+    """query.update()/query.delete() върху Reservation не минават през събитията."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Reservation:
+        orm_execute_state.session.info[STALE_KEY] = True
+
+
+@event.listens_for(db.session, 'before_commit')
+def _rebuild_if_stale(session) -> None:
+    if session.info.pop(STALE_KEY, False):
+        rebuild_reservation_rollups(connection=session.connection())
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_stale_on_rollback(session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(STALE_KEY, None)
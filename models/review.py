@@ -1,5 +1,7 @@
 from typing import Optional
+from sqlalchemy import event, inspect
 from db import db
+from models.service import Service
 
 
 class Review(db.Model):
@@ -12,6 +14,12 @@ class Review(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
 
+    __table_args__ = (
+        # Keyset пагинация "най-новите първо": WHERE service_id = ? AND id < ? ORDER BY id DESC
+        db.Index('ix_reviews_service_id_id', 'service_id', 'id'),
+        db.Index('ix_reviews_user_id_id', 'user_id', 'id'),
+    )
+
     def __init__(self, rating: int, user_id: int, service_id: int, comment: Optional[str] = None):
         """
         Конструктор за Review.
@@ -26,3 +34,43 @@ class Review(db.Model):
         self.comment = comment
         self.user_id = user_id
         self.service_id = service_id
+
+    def to_dict(self) -> dict:
+        """Връща речник с данните."""
+        return {
+            'id': self.id,
+            'rating': self.rating,
+            'comment': self.comment,
+            'user_id': self.user_id,
+            'service_id': self.service_id
+        }
+
+
+# ==================== ПОДДРЪЖКА НА АГРЕГАТИТЕ В Service ====================
+# Събитията се изпълняват вътре в същия flush/транзакция като INSERT/DELETE на ревюто,
+# затова агрегатите се обновяват атомарно - независимо дали ревюто е създадено
+# през leave_review(), route или директно с db.session.add().
+
+@event.listens_for(Review, 'after_insert')
+def _add_to_aggregates(_mapper, connection, target: Review) -> None:
+    Service.apply_rating_delta(connection, target.service_id, target.rating, 1)
+
+
+@event.listens_for(Review, 'after_delete')
+def _remove_from_aggregates(_mapper, connection, target: Review) -> None:
+    Service.apply_rating_delta(connection, target.service_id, target.rating, -1)
+
+
+@event.listens_for(Review, 'after_update')
+def _move_in_aggregates(_mapper, connection, target: Review) -> None:
+    """Промяна на оценката (или услугата) на съществуващо ревю."""
+    state = inspect(target)
+    rating_history = state.attrs.rating.history
+    service_history = state.attrs.service_id.history
+    if not (rating_history.has_changes() or service_history.has_changes()):
+        return
+
+    old_rating = rating_history.deleted[0] if rating_history.deleted else target.rating
+    old_service_id = service_history.deleted[0] if service_history.deleted else target.service_id
+    Service.apply_rating_delta(connection, old_service_id, old_rating, -1)
+    Service.apply_rating_delta(connection, target.service_id, target.rating, 1)
@@ -0,0 +1,199 @@
+"""
+Масов импорт на ревюта (миграция от стара платформа).
+
+Файлът се чете поточно (ред по ред), валидира се на пакети от по
+REVIEW_IMPORT_CHUNK_SIZE реда и всеки пакет се записва с един executemany
+INSERT. ORM събитията на Review се заобикалят нарочно - агрегатите на
+засегнатите от пакета услуги се увеличават с оценките от пакета
+(Service.apply_rating_deltas - без преброяване на старите ревюта), а
+total_reviews с броя им, в същата транзакция.
+
+Всеки пакет е отделна транзакция: SQLite заключва цялата база при запис,
+затова голям файл не спира останалите заявки до края на импорта. При
+грешка вече записаните пакети остават (отчетът на CLI/API не се връща).
+
+Поддържани формати:
+    csv: заглавен ред rating,user_id,service_id[,comment]
+    ndjson: по един JSON обект на ред със същите полета
+"""
+import csv
+import json
+import time
+from collections import Counter
+from itertools import islice
+from typing import IO, Any, Iterator, Optional
+from flask import current_app, has_app_context
+from db import db
+from models.leaderboard import leaderboard
+from models.platform_stats import apply_counter_deltas, invalidate_statistics_cache
+from models.review import Review
+from models.service import Service, RATING_STARS
+
+FORMATS = ('csv', 'ndjson')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Колко грешки да върнем в отчета (останалите само се броят)
+MAX_REPORTED_ERRORS = 50
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Познава формата по разширението на файла или Content-Type.
+
+    Връща:
+        'csv', 'ndjson' или None
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+def _read_rows(stream: IO[str], file_format: str) -> Iterator[tuple[int, Any]]:
+    """Генератор (номер на ред, суров запис) - файлът никога не е изцяло в паметта."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_no, None
+
+
+def _parse_row(raw: Any) -> dict:
+    """
+    Превръща суров запис в ред за INSERT.
+
+    Изключения:
+        ValueError: Липсващо/невалидно поле
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('Невалиден запис')
+
+    try:
+        rating = int(raw.get('rating'))
+        user_id = int(raw.get('user_id'))
+        service_id = int(raw.get('service_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Липсват или са невалидни rating, user_id, service_id')
+
+    if rating not in RATING_STARS:
+        raise ValueError('Рейтингът трябва да е между 1 и 5')
+
+    comment = raw.get('comment') or None
+    return {'rating': rating, 'user_id': user_id, 'service_id': service_id, 'comment': comment}
+
+
+def _existing_ids(column, ids: set[int]) -> set[int]:
+    """Кои от id-тата съществуват - една заявка за целия пакет."""
+    if not ids:
+        return set()
+    return set(db.session.execute(db.select(column).where(column.in_(ids))).scalars())
+
+
+def import_reviews(stream: IO[str], file_format: str, chunk_size: Optional[int] = None) -> dict:
+    """
+    Импортира ревюта от поток - с commit след всеки пакет.
+
+    Параметри:
+        stream: Текстов поток (отворен файл, request.stream през TextIOWrapper...)
+        file_format: 'csv' или 'ndjson'
+        chunk_size: Редове на пакет (по подразбиране REVIEW_IMPORT_CHUNK_SIZE)
+
+    Връща:
+        Отчет: imported, skipped, errors (първите MAX_REPORTED_ERRORS),
+        services_updated, seconds, rows_per_second
+
+    Изключения:
+        ValueError: Непознат формат
+    """
+    from models.user import RegisteredUser
+
+    if file_format not in FORMATS:
+        raise ValueError(f'Непознат формат (позволени: {", ".join(FORMATS)})')
+    if chunk_size is None:
+        chunk_size = current_app.config.get('REVIEW_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE) \
+            if has_app_context() else DEFAULT_CHUNK_SIZE
+    chunk_size = max(1, chunk_size)
+
+    started = time.perf_counter()
+    imported = skipped = 0
+    errors: list[dict] = []
+    touched_services: set[int] = set()
+
+    def reject(line_no: int, message: str) -> None:
+        nonlocal skipped
+        skipped += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_no, 'error': message})
+
+    rows = _read_rows(stream, file_format)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            parsed = []
+            for line_no, raw in chunk:
+                try:
+                    parsed.append((line_no, _parse_row(raw)))
+                except ValueError as e:
+                    reject(line_no, str(e))
+
+            users = _existing_ids(RegisteredUser.id, {row['user_id'] for _, row in parsed})
+            services = _existing_ids(Service.id, {row['service_id'] for _, row in parsed})
+
+            valid = []
+            for line_no, row in parsed:
+                if row['user_id'] not in users:
+                    reject(line_no, 'Потребителят не съществува')
+                elif row['service_id'] not in services:
+                    reject(line_no, 'Услугата не съществува')
+                else:
+                    valid.append(row)
+
+            if valid:
+                # Core INSERT с list от параметри -> executemany, без ORM обекти и събития
+                db.session.execute(Review.__table__.insert(), valid)
+                apply_counter_deltas(db.session.connection(), total_reviews=len(valid))
+                ratings_by_service: dict[int, Counter] = {}
+                for row in valid:
+                    ratings_by_service.setdefault(row['service_id'], Counter())[row['rating']] += 1
+                Service.apply_rating_deltas(db.session.connection(), ratings_by_service)
+                db.session.commit()
+                imported += len(valid)
+                touched_services.update(ratings_by_service)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if touched_services:
+            # Core INSERT-ът минава покрай събитията, които изчистват кешовете
+            invalidate_statistics_cache()
+            leaderboard.invalidate()
+
+    seconds = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'errors': errors,
+        'services_updated': len(touched_services),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round((imported + skipped) / seconds) if seconds > 0 else 0
+    }
@@ -1,5 +1,23 @@
-from typing import Optional
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
 from db import db
+from models.category import Category
+
+# Работно време по подразбиране, ако услугата няма working_hours_start/end
+DEFAULT_WORK_START = 9   # 09:00
+DEFAULT_WORK_END = 18    # 18:00
+
+# Възможните оценки (звезди) - за всяка има колона rating_<звезди> в хистограмата
+RATING_STARS = range(1, 6)
+
+# Колко id-та да има в един IN (...) при масово преизчисляване (лимит на параметрите в SQLite)
+RECOMPUTE_BATCH_SIZE = 500
+
+# До колко дни напред търсим първия свободен час (next_free_slots)
+NEXT_SLOT_HORIZON_DAYS = 14
 
 
 class Service(db.Model):
@@ -10,19 +28,24 @@ class Service(db.Model):
         id: Уникален идентификатор
         name: Име на услугата
         description: Описание
-        category: Категория
+        category: Име на категорията (чете/записва през category_id -> categories)
         price: Цена
         duration: Продължителност в минути
         availability: Работно време (текст)
         image_url: URL на снимка
         provider_id: ID на доставчика (собственик)
+        rating_count, rating_sum: Брой и сума на оценките (денормализирани)
+        rating_1 ... rating_5: Хистограма - брой ревюта с 1..5 звезди
+        rating_avg: Средна оценка (0 ако няма ревюта) - ключ за сортиране
+        booking_count: Брой резервации (популярност) - ключ за сортиране
+        favorite_count: Брой потребители, добавили услугата в любими - ключ за сортиране
     """
     __tablename__ = 'services'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    category = db.Column(db.String(50), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
 
     price = db.Column(db.Float, nullable=True, default=0.0)
     duration = db.Column(db.Integer, nullable=True, default=60)  # В минути
@@ -38,7 +61,32 @@ class Service(db.Model):
 
     provider_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    # Агрегати на ревютата - поддържат се инкрементално (виж apply_rating_delta),
+    # за да не четем всички ревюта при всяка средна оценка / сортиране
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+
+    booking_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # (ключ за сортиране, id) - keyset пагинацията на каталога чете само индекса
+        db.Index('ix_services_price_id', 'price', 'id'),
+        db.Index('ix_services_duration_id', 'duration', 'id'),
+        db.Index('ix_services_rating_avg_id', 'rating_avg', 'id'),
+        db.Index('ix_services_booking_count_id', 'booking_count', 'id'),
+        db.Index('ix_services_favorite_count_id', 'favorite_count', 'id'),
+    )
+
     reviews = db.relationship('Review', backref='service', lazy=True)
+    # lazy='joined' - името на категорията идва със същия SELECT (без N+1 при списъци)
+    category_ref = db.relationship('Category', lazy='joined')
 
     def __init__(self, name: str, category: str, provider_id: int,
                  description: Optional[str] = None, price: float = 0.0,
@@ -66,6 +114,391 @@ class Service(db.Model):
         self.image_url = image_url
         self.provider_id = provider_id
 
+    @validates('price', 'duration')
+    def _validate_sort_key(self, key: str, value):
+        """
+        price и duration са ключове за сортиране на каталога - не допускаме NULL,
+        за да работи keyset пагинацията (NULL не се сравнява с >).
+        """
+        if value is None:
+            return 0.0 if key == 'price' else 60
+        return value
+
+    @hybrid_property
+    def category(self) -> Optional[str]:
+        """Името на категорията (обратна съвместимост със старото текстово поле)."""
+        return self.category_ref.name if self.category_ref else None
+
+    @category.inplace.setter
+    def _category_setter(self, name: str) -> None:
+        self.category_ref = Category.get_or_create(name)
+
+    @category.inplace.expression
+    @classmethod
+    def _category_expression(cls):
+        """SQL версия - корелирана подзаявка по PK, позволява filter_by(category=...)."""
+        return (
+            db.select(Category.name)
+            .where(Category.id == cls.category_id)
+            .scalar_subquery()
+        )
+
+    def get_working_hours(self) -> tuple[int, int]:
+        """
+        Връща работното време като (начален час, краен час).
+
+        Ако услугата няма дефинирано работно време, се използва
+        DEFAULT_WORK_START - DEFAULT_WORK_END.
+        """
+        if self.working_hours_start and self.working_hours_end:
+            return self.working_hours_start.hour, self.working_hours_end.hour
+        return DEFAULT_WORK_START, DEFAULT_WORK_END
+
+    @hybrid_property
+    def daily_slots(self) -> int:
+        """Брой едночасови слотове в един работен ден."""
+        start, end = self.get_working_hours()
+        return max(end - start, 0)
+
+    @daily_slots.inplace.expression
+    @classmethod
+    def _daily_slots_expression(cls):
+        """
+        SQL версия на daily_slots - позволява сравнение вътре в заявка
+        (например в HAVING на корелирана подзаявка).
+        """
+        start, end = cls.working_hours_expression()
+        return db.case((end > start, end - start), else_=0)  # Като max(end - start, 0)
+
+    @classmethod
+    def working_hours_expression(cls):
+        """SQL версия на get_working_hours() - (начален час, краен час)."""
+        has_hours = db.and_(cls.working_hours_start.isnot(None), cls.working_hours_end.isnot(None))
+        start = db.case((has_hours, db.extract('hour', cls.working_hours_start)), else_=DEFAULT_WORK_START)
+        end = db.case((has_hours, db.extract('hour', cls.working_hours_end)), else_=DEFAULT_WORK_END)
+        return start, end
+
+    # ==================== АГРЕГАТИ НА РЕВЮТАТА ====================
+
+    @property
+    def average_rating(self) -> Optional[float]:
+        """Средна оценка от денормализираните агрегати (None ако няма ревюта)."""
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @property
+    def rating_histogram(self) -> dict:
+        """Брой ревюта по звезди: {'1': ..., '5': ...}."""
+        return {str(stars): getattr(self, f'rating_{stars}') or 0 for stars in RATING_STARS}
+
+    @classmethod
+    def apply_rating_delta(cls, connection, service_id: int, rating: int, delta: int = 1) -> None:
+        """
+        Атомарно добавя (delta=1) или премахва (delta=-1) една оценка от агрегатите.
+
+        Параметри:
+            connection: Връзката на текущата транзакция (от mapper event или session)
+            service_id: ID на услугата
+            rating: Оценката (1-5)
+            delta: +1 при ново ревю, -1 при изтриване
+
+        Забележка:
+            Един UPDATE ... SET rating_count = rating_count + 1 - базата прави
+            увеличението, затова паралелни ревюта не губят обновявания.
+        """
+        table = cls.__table__
+        new_count = table.c.rating_count + delta
+        new_sum = table.c.rating_sum + delta * rating
+        values = {
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            # SET изразите виждат СТАРИТЕ стойности, затова смятаме средната от new_sum/new_count
+            'rating_avg': db.case((new_count > 0, db.cast(new_sum, db.Float) / new_count), else_=0.0),
+        }
+        if rating in RATING_STARS:
+            star_column = table.c[f'rating_{rating}']
+            values[star_column.name] = star_column + delta
+
+        connection.execute(table.update().where(table.c.id == service_id).values(values))
+
+    @classmethod
+    def apply_rating_deltas(cls, connection, ratings_by_service: dict[int, Counter]) -> None:
+        """
+        Масов вариант на apply_rating_delta - добавя оценките на пакет нови ревюта.
+
+        Параметри:
+            connection: Връзката на текущата транзакция
+            ratings_by_service: service_id -> Counter {оценка: брой нови ревюта}
+
+        Един UPDATE ... SET rating_count = rating_count + :count, ... изпълнен с
+        executemany (по един набор параметри на услуга) - без преброяване на
+        всички ревюта на услугата, както прави recompute_rating_aggregates.
+        """
+        if not ratings_by_service:
+            return
+        table = cls.__table__
+        new_count = table.c.rating_count + db.bindparam('delta_count')
+        new_sum = table.c.rating_sum + db.bindparam('delta_sum')
+        values = {
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            'rating_avg': db.case((new_count > 0, db.cast(new_sum, db.Float) / new_count), else_=0.0),
+        }
+        for stars in RATING_STARS:
+            values[f'rating_{stars}'] = table.c[f'rating_{stars}'] + db.bindparam(f'delta_{stars}')
+
+        parameters = [
+            {
+                'service_id': service_id,
+                'delta_count': sum(ratings.values()),
+                'delta_sum': sum(rating * count for rating, count in ratings.items()),
+                **{f'delta_{stars}': ratings[stars] for stars in RATING_STARS},
+            }
+            for service_id, ratings in ratings_by_service.items()
+        ]
+        connection.execute(
+            table.update().where(table.c.id == db.bindparam('service_id')).values(values), parameters
+        )
+
+    @classmethod
+    def recompute_rating_aggregates(cls, service_id: Optional[int] = None,
+                                    service_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Преизчислява агрегатите от нулата (repair job) - без commit.
+
+        Параметри:
+            service_id: Само за тази услуга (ако None - за всички)
+            service_ids: Само за тези услуги (масов импорт - по една заявка на пакет от id-та)
+
+        Използва се след масови операции, които заобикалят ORM събитията
+        (например query(Review).delete()), или ако агрегатите са се разминали.
+        """
+        from models.review import Review
+
+        def reviews_for_service(aggregate, *conditions):
+            return (
+                db.select(aggregate)
+                .where(Review.service_id == cls.id, *conditions)
+                .scalar_subquery()
+            )
+
+        values = {
+            cls.rating_count: reviews_for_service(db.func.count(Review.id)),
+            cls.rating_sum: reviews_for_service(db.func.coalesce(db.func.sum(Review.rating), 0)),
+            cls.rating_avg: reviews_for_service(db.func.coalesce(db.func.avg(Review.rating), 0.0)),
+        }
+        for stars in RATING_STARS:
+            values[getattr(cls, f'rating_{stars}')] = reviews_for_service(
+                db.func.count(Review.id), Review.rating == stars
+            )
+
+        statement = db.update(cls).values(values).execution_options(synchronize_session=False)
+        if service_ids is not None:
+            ids = sorted(set(service_ids))
+            # SQLite има лимит на параметрите в една заявка - обновяваме на пакети
+            for start in range(0, len(ids), RECOMPUTE_BATCH_SIZE):
+                batch = ids[start:start + RECOMPUTE_BATCH_SIZE]
+                db.session.execute(statement.where(cls.id.in_(batch)))
+        elif service_id is not None:
+            db.session.execute(statement.where(cls.id == service_id))
+        else:
+            db.session.execute(statement)
+        db.session.expire_all()
+
+    # ==================== СВОБОДНИ ЧАСОВЕ ====================
+
+    @classmethod
+    def next_free_slots(cls, services: Iterable['Service'], now: Optional[datetime] = None,
+                        horizon_days: int = NEXT_SLOT_HORIZON_DAYS) -> dict[int, Optional[datetime]]:
+        """
+        Първият свободен едночасов слот за всяка от услугите - с ЕДНА заявка.
+
+        Параметри:
+            services: Услугите (например страница от любимите)
+            now: От кога да търсим (по подразбиране - сега)
+            horizon_days: До колко дни напред
+
+        Връща:
+            Речник service_id -> datetime на слота (None ако няма в хоризонта)
+
+        Обяснение:
+            Взимаме активните резервации на всички услуги в интервала наведнъж
+            (индекс (service_id, datetime)) и обхождаме часовете в паметта -
+            както /reservations/available-slots, но без заявка на ден/услуга.
+        """
+        from models.reservation import Reservation, ACTIVE_STATUSES
+
+        services = list(services)
+        if not services:
+            return {}
+
+        now = now or datetime.now()
+        start = now.replace(minute=0, second=0, microsecond=0)
+        if start < now:
+            start += timedelta(hours=1)
+        end = start.replace(hour=0) + timedelta(days=horizon_days)
+
+        occupied: dict[int, set[datetime]] = {service.id: set() for service in services}
+        rows = db.session.execute(
+            db.select(Reservation.service_id, Reservation.datetime).where(
+                Reservation.service_id.in_(occupied.keys()),
+                Reservation.datetime >= start,
+                Reservation.datetime < end,
+                Reservation.status.in_(ACTIVE_STATUSES)
+            )
+        ).all()
+        for service_id, slot in rows:
+            occupied[service_id].add(slot.replace(minute=0, second=0, microsecond=0))
+
+        result: dict[int, Optional[datetime]] = {}
+        for service in services:
+            work_start, work_end = service.get_working_hours()
+            result[service.id] = None
+            day = start.replace(hour=0)
+            while day < end and result[service.id] is None:
+                for hour in range(work_start, work_end):
+                    slot = day.replace(hour=hour)
+                    if slot >= start and slot not in occupied[service.id]:
+                        result[service.id] = slot
+                        break
+                day += timedelta(days=1)
+        return result
+
+    # ==================== БРОЙ РЕЗЕРВАЦИИ ====================
+
+    @classmethod
+    def apply_booking_delta(cls, connection, service_id: int, delta: int = 1) -> None:
+        """Атомарно променя booking_count (извиква се от събитията на Reservation)."""
+        table = cls.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.id == service_id)
+            .values(booking_count=table.c.booking_count + delta)
+        )
+
+    @classmethod
+    def apply_booking_deltas(cls, connection, service_ids: Iterable[int], delta: int) -> None:
+        """Масов вариант на apply_booking_delta - един UPDATE ... WHERE id IN (...)."""
+        ids = sorted(set(service_ids))
+        table = cls.__table__
+        for start in range(0, len(ids), RECOMPUTE_BATCH_SIZE):
+            connection.execute(
+                table.update()
+                .where(table.c.id.in_(ids[start:start + RECOMPUTE_BATCH_SIZE]))
+                .values(booking_count=table.c.booking_count + delta)
+            )
+
+    @classmethod
+    def recompute_booking_counts(cls, service_id: Optional[int] = None) -> None:
+        """Преизчислява booking_count от таблицата reservations (repair job) - без commit."""
+        from models.reservation import Reservation
+
+        bookings = (
+            db.select(db.func.count(Reservation.id))
+            .where(Reservation.service_id == cls.id)
+            .scalar_subquery()
+        )
+        statement = db.update(cls).values({cls.booking_count: bookings})
+        if service_id is not None:
+            statement = statement.where(cls.id == service_id)
+        db.session.execute(statement.execution_options(synchronize_session=False))
+        db.session.expire_all()
+
+    # ==================== БРОЙ ЛЮБИМИ ====================
+
+    @classmethod
+    def apply_favorite_delta(cls, connection, service_id: int, delta: int = 1) -> None:
+        """Атомарно променя favorite_count (извиква се от събитията на Favorite)."""
+        table = cls.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.id == service_id)
+            .values(favorite_count=table.c.favorite_count + delta)
+        )
+
+    @classmethod
+    def apply_favorite_deltas(cls, connection, service_ids: Iterable[int], delta: int) -> None:
+        """Масов вариант на apply_favorite_delta - един UPDATE ... WHERE id IN (...)."""
+        ids = sorted(set(service_ids))
+        table = cls.__table__
+        for start in range(0, len(ids), RECOMPUTE_BATCH_SIZE):
+            connection.execute(
+                table.update()
+                .where(table.c.id.in_(ids[start:start + RECOMPUTE_BATCH_SIZE]))
+                .values(favorite_count=table.c.favorite_count + delta)
+            )
+
+    @classmethod
+    def recompute_favorite_counts(cls, service_id: Optional[int] = None) -> None:
+        """Преизчислява favorite_count от таблицата favorites (repair job) - без commit."""
+        from models.favorite import Favorite
+
+        favorites = (
+            db.select(db.func.count(Favorite.id))
+            .where(Favorite.service_id == cls.id)
+            .scalar_subquery()
+        )
+        statement = db.update(cls).values({cls.favorite_count: favorites})
+        if service_id is not None:
+            statement = statement.where(cls.id == service_id)
+        db.session.execute(statement.execution_options(synchronize_session=False))
+        db.session.expire_all()
+
+    # ==================== КАТАЛОГ (СОРТИРАНЕ + KEYSET ПАГИНАЦИЯ) ====================
+
+    # Позволените ключове за сортиране -> име на колоната (всяка има индекс (колона, id))
+    SORT_KEYS = {
+        'id': 'id',
+        'price': 'price',
+        'duration': 'duration',
+        'rating': 'rating_avg',
+        'bookings': 'booking_count',
+        'favorites': 'favorite_count',
+    }
+
+    @classmethod
+    def catalog_page(cls, sort: str = 'id', descending: bool = False,
+                     limit: int = 20, after: Optional[list] = None) -> list['Service']:
+        """
+        Връща една страница от каталога, сортирана по sort.
+
+        Параметри:
+            sort: Ключ от SORT_KEYS
+            descending: Низходящ ред
+            limit: Брой редове
+            after: Курсор - [стойност на ключа, id] на последния ред от предишната страница
+
+        Връща:
+            Списък с услуги
+
+        Как работи:
+            WHERE (ключ, id) > (курсор) ORDER BY ключ, id LIMIT n
+            Индексът (ключ, id) дава редовете вече подредени, затова базата
+            прочита само n реда, колкото и голям да е каталогът.
+        """
+        column = getattr(cls, cls.SORT_KEYS[sort])
+        query = cls.query
+
+        if sort == 'id':
+            if after:
+                query = query.filter(cls.id < after[-1] if descending else cls.id > after[-1])
+            order = [cls.id.desc() if descending else cls.id]
+        else:
+            if after:
+                key = db.tuple_(column, cls.id)
+                cursor = db.tuple_(after[0], after[1])
+                query = query.filter(key < cursor if descending else key > cursor)
+            order = [column.desc(), cls.id.desc()] if descending else [column, cls.id]
+
+        return query.order_by(*order).limit(limit).all()
+
+    def cursor_for(self, sort: str) -> list:
+        """Стойностите за курсора след тази услуга при сортиране по sort."""
+        if sort == 'id':
+            return [self.id]
+        return [getattr(self, self.SORT_KEYS[sort]), self.id]
+
     def to_dict(self) -> dict:
         """Преобразува услугата в речник."""
         return {
@@ -77,5 +510,10 @@ class Service(db.Model):
             'duration': self.duration,
             'availability': self.availability,
             'image_url': self.image_url,
-            'provider_id': self.provider_id
+            'provider_id': self.provider_id,
+            'average_rating': self.average_rating,
+            'rating_count': self.rating_count or 0,
+            'rating_histogram': self.rating_histogram,
+            'booking_count': self.booking_count or 0,
+            'favorite_count': self.favorite_count or 0
         }
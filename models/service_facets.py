@@ -0,0 +1,171 @@
+"""
+Фасети (facets) за каталога с услуги.
+
+Фасетите са броячите, които UI-ят показва до резултатите от търсенето:
+    - брой услуги по категория
+    - брой услуги по ценови диапазон
+    - брой услуги по продължителност
+
+Всичко се изчислява с ЕДНА групирана SQL заявка (UNION ALL от три GROUP BY),
+вместо да зареждаме услугите в Python. Обобщението без филтри се кешира
+в паметта и се инвалидира след всеки commit, който е писал в таблицата services.
+"""
+import threading
+import time
+from typing import Optional
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from db import db
+from models.category import Category
+from models.service import Service
+
+# (долна граница, горна граница, етикет) - горната граница НЕ е включена, None = без горна граница
+PRICE_BUCKETS = [
+    (0, 50, '0-50'),
+    (50, 100, '50-100'),
+    (100, 200, '100-200'),
+    (200, None, '200+'),
+]
+
+DURATION_BUCKETS = [
+    (0, 30, '0-30'),
+    (30, 60, '30-60'),
+    (60, 120, '60-120'),
+    (120, None, '120+'),
+]
+
+DEFAULT_CACHE_SECONDS = 60
+
+_cache_lock = threading.Lock()
+_summary_cache: dict = {'value': None, 'created_at': 0.0, 'generation': 0}  # generation: +1 при invalidate
+
+
+def _bucket_case(column, buckets: list):
+    """Строи CASE израз, който превръща числова колона в етикет на диапазон."""
+    whens = []
+    for low, high, label in buckets:
+        if high is None:
+            whens.append((column >= low, label))
+        else:
+            whens.append((db.and_(column >= low, column < high), label))
+    return db.case(*whens, else_=None)
+
+
+def _ordered_buckets(counts: dict, buckets: list) -> list[dict]:
+    """Връща всички диапазони в естествения им ред (включително тези с 0 услуги)."""
+    return [{'value': label, 'count': counts.get(label, 0)} for _, _, label in buckets]
+
+
+def compute_facets(query) -> dict:
+    """
+    Изчислява фасетите за произволна (филтрирана) заявка върху Service.
+
+    Параметри:
+        query: Service.query с приложени филтри
+
+    Връща:
+        Речник с 'categories', 'price' и 'duration' - списъци от {'value', 'count'}
+    """
+    filtered = query.order_by(None).subquery()
+    count = db.func.count().label('count')
+
+    price_bucket = _bucket_case(filtered.c.price, PRICE_BUCKETS)
+    duration_bucket = _bucket_case(filtered.c.duration, DURATION_BUCKETS)
+
+    statement = db.union_all(
+        db.select(db.literal('category').label('facet'), Category.name.label('value'), count)
+        .join_from(filtered, Category, Category.id == filtered.c.category_id)
+        .group_by(Category.name),
+        db.select(db.literal('price').label('facet'), price_bucket.label('value'), count)
+        .group_by(price_bucket),
+        db.select(db.literal('duration').label('facet'), duration_bucket.label('value'), count)
+        .group_by(duration_bucket),
+    )
+
+    grouped: dict[str, dict] = {'category': {}, 'price': {}, 'duration': {}}
+    for facet, value, value_count in db.session.execute(statement):
+        if value is not None:  # NULL цена/продължителност не попада в диапазон
+            grouped[facet][value] = value_count
+
+    return {
+        'categories': [{'value': name, 'count': grouped['category'][name]}
+                       for name in sorted(grouped['category'])],
+        'price': _ordered_buckets(grouped['price'], PRICE_BUCKETS),
+        'duration': _ordered_buckets(grouped['duration'], DURATION_BUCKETS),
+    }
+
+
+def get_facet_summary() -> dict:
+    """
+    Връща фасетите за целия каталог (без филтри) от кеша.
+
+    Кешът се инвалидира при запис в services (виж invalidate_facet_cache).
+    FACET_CACHE_SECONDS ограничава колко стар може да е, ако записът е
+    направен от друг процес (всеки worker има собствен кеш).
+
+    Ако по време на изчислението кешът е инвалидиран (commit на друга
+    заявка), резултатът може да е от старите данни - връща се, но не се
+    кешира (поколението се сравнява, както в models/leaderboard.py).
+    """
+    max_age = DEFAULT_CACHE_SECONDS
+    if has_app_context():
+        max_age = current_app.config.get('FACET_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)
+
+    with _cache_lock:
+        cached: Optional[dict] = _summary_cache['value']
+        if cached is not None and time.monotonic() - _summary_cache['created_at'] < max_age:
+            return cached
+        generation = _summary_cache['generation']
+
+    summary = compute_facets(Service.query)
+
+    with _cache_lock:
+        if _summary_cache['generation'] == generation:
+            _summary_cache['value'] = summary
+            _summary_cache['created_at'] = time.monotonic()
+    return summary
+
+
+def invalidate_facet_cache() -> None:
+    """Изчиства кешираното обобщение - извиква се при всеки запис в services."""
+    with _cache_lock:
+        _summary_cache['value'] = None
+        _summary_cache['generation'] += 1
+
+
+# ==================== ИНВАЛИДАЦИЯ ПРИ ЗАПИС ====================
+
+# Кешът се изчиства СЛЕД commit: изчистен при flush, той може да се напълни
+# отново от друга заявка със старите данни, преди записът да е commit-нат.
+DIRTY_KEY = 'facet_cache_dirty'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _mark_dirty_on_flush(session, _flush_context) -> None:
+    """ORM запис (add/промяна/delete) на Service или Category."""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, (Service, Category)) for obj in changed):
+        session.info[DIRTY_KEY] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_dirty_on_bulk_write(orm_execute_state) -> None:
+    """Масови query.update()/query.delete() върху Service/Category."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (Service, Category):
+        orm_execute_state.session.info[DIRTY_KEY] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session) -> None:
+    if session.info.pop(DIRTY_KEY, False):
+        invalidate_facet_cache()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _invalidate_after_rollback(session) -> None:
+    """За всеки случай - и при rollback, ако транзакцията е писала в каталога."""
+    if session.info.pop(DIRTY_KEY, False):
+        invalidate_facet_cache()
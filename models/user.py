@@ -1,11 +1,16 @@
 from enum import Enum
 from typing import Optional, List
-from datetime import datetime, date
-from werkzeug.security import generate_password_hash, check_password_hash
-from db import db
+from datetime import datetime, date, timedelta
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from db import db, dialect_insert
+from models.category import Category
+from models.events import EventType, event_bus
+from models.leaderboard import leaderboard
+from models.password_hasher import password_hasher
 from models.service import Service
 from models.review import Review
-from models.reservation import Reservation, ReservationStatus
+from models.reservation import Reservation, ReservationStatus, ACTIVE_STATUSES
 
 
 class Guest:
@@ -36,7 +41,43 @@ class Guest:
         Връща:
             Списък с речници, съдържащи данни за услугите
         """
+        services = self._build_search_query(name, category, date_on).all()
 
+        result = []
+        for s in services: # Преобразуваме SQLAlchemy обектите в прости речници
+            result.append({
+                'id': s.id,
+                'name': s.name,
+                'description': s.description,
+                'category': s.category
+            })
+        return result
+
+    def search_facets(self, name: Optional[str] = None,
+                      category: Optional[str] = None,
+                      date_on: Optional[date] = None) -> dict:
+        """
+        Фасети (броячи по категория, цена и продължителност) за търсенето.
+
+        Параметри:
+            Същите като search_services()
+
+        Връща:
+            Речник с 'categories', 'price' и 'duration'
+
+        Забележка:
+            Без филтри се връща кешираното обобщение за целия каталог.
+        """
+        from models.service_facets import compute_facets, get_facet_summary
+
+        if not (name or category or date_on):
+            return get_facet_summary()
+        return compute_facets(self._build_search_query(name, category, date_on))
+
+    @staticmethod
+    def _build_search_query(name: Optional[str], category: Optional[str],
+                            date_on: Optional[date]):
+        """Строи филтрираната заявка, обща за search_services() и search_facets()."""
         query = Service.query  # Започваме с празна заявка (SELECT * FROM services)
 
         # Добавяме филтри само ако параметърът е подаден
@@ -51,30 +92,32 @@ class Guest:
             query = query.filter(db.func.lower(Service.category).like(search_term))
 
         if date_on:
-            # Вземаме резервациите за тази дата
-            # db.func.date() = SQL функция DATE() - извлича само датата от datetime поле
-            reserved_reservations = Reservation.query.filter(
-                db.func.date(Reservation.datetime) == date_on
-            ).all()
-
-            # Извличаме service_id от всяка резервация
-            if reserved_reservations:
-                reserved_ids = [r.service_id for r in reserved_reservations]
-                # ~ = NOT оператор, .in_() = SQL IN оператор
-                # Филтрираме услуги, които НЕ са в списъка с резервирани
-                query = query.filter(~Service.id.in_(reserved_ids))
+            # Anti-join (NOT EXISTS): услугата отпада САМО ако всички нейни часове за деня са заети.
+            # Една резервация не прави услугата "недостъпна" за целия ден.
+            # Подзаявката е корелирана със services.id и използва индекса (service_id, datetime),
+            # вместо да зарежда резервациите в Python и да строи огромен NOT IN (...) списък.
+            day_start = datetime.combine(date_on, datetime.min.time())
+            day_end = day_start + timedelta(days=1)
+            booked_hour = db.extract('hour', Reservation.datetime)
+            # Броят се само часовете в работното време - резервация в 20:00 не заема слот
+            work_start, work_end = Service.working_hours_expression()
+
+            fully_booked = (
+                db.select(Reservation.service_id)
+                .where(
+                    Reservation.service_id == Service.id,
+                    Reservation.datetime >= day_start,
+                    Reservation.datetime < day_end,
+                    Reservation.status.in_(ACTIVE_STATUSES),
+                    booked_hour >= work_start,
+                    booked_hour < work_end
+                )
+                .group_by(Reservation.service_id)
+                .having(db.func.count(db.distinct(booked_hour)) >= Service.daily_slots)
+            )
+            query = query.filter(~fully_booked.exists())
 
-        services = query.all()  # Изпълняваме заявката и взимаме всички резултати
-
-        result = []
-        for s in services: # Преобразуваме SQLAlchemy обектите в прости речници
-            result.append({
-                'id': s.id,
-                'name': s.name,
-                'description': s.description,
-                'category': s.category
-            })
-        return result
+        return query
 
     def view_service(self, service_id: int) -> Optional[dict]:
         """
@@ -103,24 +146,34 @@ class Guest:
             'provider_id': service.provider_id
         }
 
-    def view_reviews(self, service_id: int) -> List[dict]:
+    def view_reviews(self, service_id: int, limit: Optional[int] = None,
+                     before_id: Optional[int] = None) -> List[dict]:
         """
-        Преглед на ревюта за услуга.
+        Преглед на ревюта за услуга (най-новите първо).
 
         Параметри:
             service_id: ID на услугата
+            limit: Максимален брой ревюта (ако None - всички)
+            before_id: Курсор - връща само ревюта с id < before_id (следваща страница)
 
         Връща:
             Списък с речници, съдържащи ревютата
 
         Обяснение:
             - filter_by(service_id=X) = WHERE service_id = X
-            - Проста форма на filter() за точно съвпадение
+            - Индексът (service_id, id) дава ревютата вече подредени,
+              затова страница от N ревюта струва N реда, колкото и ревюта да има
         """
-        reviews = Review.query.filter_by(service_id=service_id).all()
+        query = Review.query.filter_by(service_id=service_id)
+        if before_id is not None:
+            query = query.filter(Review.id < before_id)
+
+        query = query.order_by(Review.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
 
         result = []
-        for r in reviews:
+        for r in query.all():
             result.append({
                 'id': r.id,
                 'rating': r.rating,
@@ -129,6 +182,28 @@ class Guest:
             })
         return result
 
+    def view_rating_summary(self, service_id: int) -> Optional[dict]:
+        """
+        Обобщение на оценките за услуга (от денормализираните агрегати).
+
+        Параметри:
+            service_id: ID на услугата
+
+        Връща:
+            Речник с rating_count, average_rating, rating_histogram
+            или None ако услугата не съществува
+        """
+        service = db.session.get(Service, service_id)
+        if not service:
+            return None
+
+        return {
+            'service_id': service.id,
+            'rating_count': service.rating_count,
+            'average_rating': service.average_rating,
+            'rating_histogram': service.rating_histogram
+        }
+
 
 class UserRole(Enum):
     USER = "user"
@@ -136,6 +211,34 @@ class UserRole(Enum):
     ADMIN = "admin"
 
 
+# Най-много толкова услуги в една синхронизация на любимите (IN (...) и VALUES
+# на заявките не бива да надхвърлят лимита на параметрите в SQLite)
+MAX_SYNC_FAVORITES = 500
+
+# Уникалните колони на users -> съобщение при нарушение на ограничението
+UNIQUE_FIELD_ERRORS = {
+    'username': "Потребителското име е заето",
+    'email': "Имейлът е зает",
+}
+
+
+def _unique_violation_message(error: IntegrityError) -> Optional[str]:
+    """
+    Кое уникално поле е нарушено, по текста на грешката от базата.
+
+    SQLite: "UNIQUE constraint failed: users.email"
+    PostgreSQL: 'violates unique constraint "users_email_key"'
+
+    Връща:
+        Съобщението за полето или None (друго ограничение)
+    """
+    detail = str(error.orig)
+    for column, message in UNIQUE_FIELD_ERRORS.items():
+        if f'users.{column}' in detail or f'users_{column}_key' in detail:
+            return message
+    return None
+
+
 class RegisteredUser(Guest, db.Model):
     """
     Регистриран потребител - наследява Guest.
@@ -165,6 +268,18 @@ class RegisteredUser(Guest, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.Enum(UserRole), nullable=False, default=UserRole.USER)
 
+    # Брой непрочетени известия (денормализиран) - значката в клиента е O(1).
+    # Поддържа се от събитията на Notification (models/notification.py)
+    unread_notification_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Single Table Inheritance: role определя класа на заредения обект -
+    # db.session.get(RegisteredUser, id) връща Provider/Admin директно,
+    # без второ зареждане на същия ред през подкласа
+    __mapper_args__ = {
+        'polymorphic_on': role,
+        'polymorphic_identity': UserRole.USER
+    }
+
     # backref='customer' означава: от Reservation можеш да достъпиш reservation.customer
     reservations = db.relationship('Reservation', foreign_keys='Reservation.customer_id', backref='customer', lazy=True)
     reviews = db.relationship('Review', backref='author', lazy=True)
@@ -188,6 +303,37 @@ class RegisteredUser(Guest, db.Model):
 
     # ==================== МЕТОДИ ЗА АВТЕНТИКАЦИЯ ====================
 
+    @classmethod
+    def register(cls, username: str, email: str, password: str,
+                 role: UserRole = UserRole.USER) -> 'RegisteredUser':
+        """
+        Създава нов акаунт с един INSERT.
+
+        Параметри:
+            username: Потребителско име
+            email: Имейл
+            password: Паролата в чист текст
+            role: Роля - определя класа (RegisteredUser, Provider или Admin)
+
+        Връща:
+            Новия потребител
+
+        Изключения:
+            ValueError: Ако потребителското име или имейлът са заети
+
+        Компромис: заетостта се разбира от UNIQUE ограниченията при INSERT-а,
+        т.е. СЛЕД хеширането - повторен опит също струва едно хеширане (и може
+        да получи HasherBusyError). Затова /register е ограничен по IP адрес
+        (REGISTER_RATE_LIMIT_*), вместо да се добави SELECT преди всеки INSERT.
+        """
+        user_class = {UserRole.PROVIDER: Provider, UserRole.ADMIN: Admin}.get(role, RegisteredUser)
+        user = user_class(username=username, email=email, role=role)
+        user.set_password(password)
+
+        db.session.add(user)
+        user._commit_unique()  # pylint: disable=protected-access
+        return user
+
     @classmethod
     def login(cls, email_or_username: str, password: str) -> Optional['RegisteredUser']:
         """
@@ -227,8 +373,13 @@ class RegisteredUser(Guest, db.Model):
             - Никога не записваме пароли в чист текст!
             - generate_password_hash() създава hash, който не може да се обърне
             - Дори ако базата бъде хакната, паролите са защитени
+
+        Хешът се смята в пула от процеси (models/password_hasher.py).
+
+        Изключения:
+            HasherBusyError: Опашката за хеширане е пълна
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
         """
@@ -244,8 +395,11 @@ class RegisteredUser(Guest, db.Model):
             - check_password_hash() хешира подадената парола
             - Сравнява я със записания hash
             - Връща True/False
+
+        Изключения:
+            HasherBusyError: Опашката за хеширане е пълна
         """
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     def create_reservation(self, service_id: int, reservation_date: datetime,
                           notes: Optional[str] = None,
@@ -285,11 +439,28 @@ class RegisteredUser(Guest, db.Model):
         )
 
         db.session.add(reservation)
+        db.session.flush()
+        self.publish_booking_event(EventType.RESERVATION_CREATED, reservation, service)
 
         db.session.commit()
 
         return reservation
 
+    @staticmethod
+    def publish_booking_event(event_type: EventType, reservation: Reservation,
+                               service: Optional[Service] = None) -> None:
+        """Публикува събитие за резервацията (известието се създава след commit)."""
+        if service is None:
+            service = db.session.get(Service, reservation.service_id)
+        event_bus.publish(
+            event_type,
+            customer_id=reservation.customer_id,
+            provider_id=reservation.provider_id,
+            service_name=service.name if service else '',
+            datetime=reservation.datetime.strftime('%d.%m.%Y %H:%M'),
+            related_id=reservation.id
+        )
+
     def get_my_reservations(self, status: Optional[ReservationStatus] = None) -> List[dict]:
         """
         Връща всички резервации на потребителя.
@@ -339,6 +510,7 @@ class RegisteredUser(Guest, db.Model):
             return False
 
         reservation.status = ReservationStatus.CANCELED
+        self.publish_booking_event(EventType.RESERVATION_CANCELED, reservation)
         db.session.commit()
         return True
 
@@ -369,6 +541,8 @@ class RegisteredUser(Guest, db.Model):
         if new_notes is not None:  # Позволяваме празен string
             reservation.notes = new_notes
 
+        if db.session.is_modified(reservation):
+            self.publish_booking_event(EventType.RESERVATION_UPDATED, reservation)
         db.session.commit()
         return True
 
@@ -406,7 +580,19 @@ class RegisteredUser(Guest, db.Model):
         )
 
         db.session.add(review)
+        db.session.flush()
+        event_bus.publish(
+            EventType.REVIEW_CREATED,
+            provider_id=service.provider_id,
+            service_name=service.name,
+            rating=rating,
+            related_id=review.id
+        )
+        generation = leaderboard.generation
         db.session.commit()
+
+        # Класацията в паметта се обновява след commit (агрегатите в services - в самия commit)
+        leaderboard.record_review(service_id, rating, 1, generation)
         return review
 
     # ==================== МЕТОДИ ЗА ПРОФИЛ ====================
@@ -427,20 +613,31 @@ class RegisteredUser(Guest, db.Model):
             ValueError: Ако потребителското име или имейл вече са заети
         """
         if new_username:
-            existing = RegisteredUser.query.filter_by(username=new_username).first()
-            if existing and existing.id != self.id:
-                raise ValueError("Потребителското име е заето")
             self.username = new_username
-
         if new_email:
-            existing = RegisteredUser.query.filter_by(email=new_email).first()
-            if existing and existing.id != self.id:
-                raise ValueError("Имейлът е зает")
             self.email = new_email
 
-        db.session.commit()
+        # Уникалността се проверява от ограниченията в базата - един UPDATE,
+        # без предварителни SELECT-и (и без състезание между тях и записа)
+        self._commit_unique()
         return True
 
+    def _commit_unique(self) -> None:
+        """
+        Commit, като нарушение на UNIQUE (username/email) става ValueError.
+
+        Изключения:
+            ValueError: Потребителското име или имейлът са заети
+        """
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            message = _unique_violation_message(e)
+            if message is None:
+                raise
+            raise ValueError(message) from e
+
     # ==================== МЕТОДИ ЗА ЛЮБИМИ ====================
 
     def add_favorite(self, service_id: int) -> bool:
@@ -496,25 +693,144 @@ class RegisteredUser(Guest, db.Model):
         db.session.commit()
         return True
 
-    def get_favorites(self) -> List[dict]:
+    def sync_favorites(self, service_ids: List[int]) -> dict:
+        """
+        Заменя любимите с подадения набор (синхронизация от офлайн хранилище).
+
+        Параметри:
+            service_ids: Пълният списък с ID-та на услуги, които трябва да са в любими
+
+        Връща:
+            Речник с 'added', 'removed' (приложената разлика) и 'unknown'
+            (несъществуващи услуги - пропуснати)
+
+        Изключения:
+            ValueError: Ако service_ids не е списък от цели числа или е по-дълъг
+                от MAX_SYNC_FAVORITES
+
+        Обяснение:
+            Разликата спрямо текущия набор се прилага с един
+            INSERT ... ON CONFLICT (user_id, service_id) DO NOTHING и един DELETE -
+            вместо SELECT + INSERT + COMMIT за всяка услуга. Паралелна синхронизация
+            не може да създаде дубликат - конфликтът се поглъща от unique_user_service.
+        """
+        from models.favorite import Favorite
+
+        if not isinstance(service_ids, list) or not all(
+            isinstance(sid, int) and not isinstance(sid, bool) for sid in service_ids
+        ):
+            raise ValueError("service_ids трябва да е списък от цели числа")
+
+        wanted = set(service_ids)
+        if len(wanted) > MAX_SYNC_FAVORITES:
+            raise ValueError(f"Най-много {MAX_SYNC_FAVORITES} услуги в любими наведнъж")
+        existing_services = set(db.session.execute(
+            db.select(Service.id).where(Service.id.in_(wanted))
+        ).scalars()) if wanted else set()
+        unknown = wanted - existing_services
+
+        current = set(db.session.execute(
+            db.select(Favorite.service_id).where(Favorite.user_id == self.id)
+        ).scalars())
+        to_add = existing_services - current
+        to_remove = current - wanted
+
+        # Директно през връзката - като събитията на Favorite, които тук заобикаляме
+        connection = db.session.connection()
+        table = Favorite.__table__
+        added: List[int] = []
+        removed: List[int] = []
+
+        if to_add:
+            statement = (
+                dialect_insert(connection, table)
+                .values([{'user_id': self.id, 'service_id': sid} for sid in sorted(to_add)])
+                .on_conflict_do_nothing(index_elements=['user_id', 'service_id'])
+                .returning(table.c.service_id)
+            )
+            added = list(connection.execute(statement).scalars())
+            Service.apply_favorite_deltas(connection, added, 1)
+
+        if to_remove:
+            statement = (
+                table.delete()
+                # NOT IN по подадения (ограничен) набор - текущите любими може да са повече
+                .where(table.c.user_id == self.id, table.c.service_id.not_in(wanted))
+                .returning(table.c.service_id)
+            )
+            removed = list(connection.execute(statement).scalars())
+            Service.apply_favorite_deltas(connection, removed, -1)
+
+        db.session.commit()
+        return {'added': sorted(added), 'removed': sorted(removed), 'unknown': sorted(unknown)}
+
+    def get_favorites(self, expand: bool = False, include_next_slot: bool = False,
+                      limit: Optional[int] = None, after_id: Optional[int] = None) -> List[dict]:
         """
         Връща списък с любими услуги.
 
+        Параметри:
+            expand: Ако е True, всеки запис съдържа и 'service' (данните на услугата
+                    заедно с агрегатите на оценките) - вместо заявка за всяка услуга
+            include_next_slot: Добавя 'next_free_slot' към услугата (само при expand)
+            limit: Максимален брой записи (ако None - всички)
+            after_id: Курсор - само любими с id > after_id (следваща страница)
+
         Връща:
             Списък с речници, съдържащи данни за любимите услуги
+
+        Обяснение:
+            При expand любимите и услугите се четат с един JOIN (favorites -> services),
+            а свободните часове - с още една заявка за цялата страница.
         """
         from models.favorite import Favorite
-        favorites = Favorite.query.filter_by(user_id=self.id).all()
-        return [f.to_dict() for f in favorites]
+
+        if not expand:
+            query = Favorite.query.filter_by(user_id=self.id)
+            if after_id is not None:
+                query = query.filter(Favorite.id > after_id)
+            query = query.order_by(Favorite.id)
+            if limit is not None:
+                query = query.limit(limit)
+            return [f.to_dict() for f in query.all()]
+
+        statement = (
+            db.select(Favorite, Service)
+            .join(Service, Service.id == Favorite.service_id)
+            .where(Favorite.user_id == self.id)
+        )
+        if after_id is not None:
+            statement = statement.where(Favorite.id > after_id)
+        statement = statement.order_by(Favorite.id)
+        if limit is not None:
+            statement = statement.limit(limit)
+        rows = db.session.execute(statement).all()
+
+        next_slots = {}
+        if include_next_slot:
+            next_slots = Service.next_free_slots(service for _, service in rows)
+
+        result = []
+        for favorite, service in rows:
+            item = favorite.to_dict()
+            item['service'] = service.to_dict()
+            if include_next_slot:
+                slot = next_slots.get(service.id)
+                item['service']['next_free_slot'] = slot.isoformat() if slot else None
+            result.append(item)
+        return result
 
     # ==================== МЕТОДИ ЗА ИЗВЕСТИЯ ====================
 
-    def get_notifications(self, unread_only: bool = False) -> dict:
+    def get_notifications(self, unread_only: bool = False, limit: Optional[int] = None,
+                          before_id: Optional[int] = None) -> dict:
         """
-        Връща известията на потребителя.
+        Връща известията на потребителя (най-новите първо).
 
         Параметри:
             unread_only: Ако е True, връща само непрочетените
+            limit: Максимален брой известия (ако None - всички)
+            before_id: Курсор - само известия с id < before_id (следваща страница)
 
         Връща:
             Речник с 'notifications' списък и 'unread_count'
@@ -524,15 +840,17 @@ class RegisteredUser(Guest, db.Model):
         query = Notification.query.filter_by(user_id=self.id)
         if unread_only:
             query = query.filter_by(is_read=False)
+        if before_id is not None:
+            query = query.filter(Notification.id < before_id)
 
-        notifications = query.order_by(Notification.created_at.desc()).all()
-        unread_count = Notification.query.filter_by(
-            user_id=self.id, is_read=False
-        ).count()
+        query = query.order_by(Notification.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        notifications = query.all()
 
         return {
             'notifications': [n.to_dict() for n in notifications],
-            'unread_count': unread_count
+            'unread_count': self.unread_notification_count
         }
 
     def mark_notification_read(self, notification_id: int) -> bool:
@@ -568,9 +886,39 @@ class RegisteredUser(Guest, db.Model):
         count = Notification.query.filter_by(
             user_id=self.id, is_read=False
         ).update({'is_read': True})
+        # Масовият UPDATE заобикаля ORM събитията - броячът се намалява тук, в същата транзакция
+        RegisteredUser.apply_unread_delta(db.session.connection(), self.id, -count)
         db.session.commit()
         return count
 
+    @classmethod
+    def apply_unread_delta(cls, connection, user_id: int, delta: int) -> None:
+        """Атомарно променя unread_notification_count (UPDATE users SET ... + delta)."""
+        if not delta:
+            return
+        table = cls.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.id == user_id)
+            .values(unread_notification_count=table.c.unread_notification_count + delta)
+        )
+
+    @classmethod
+    def recompute_unread_counts(cls, user_id: Optional[int] = None) -> None:
+        """Преизчислява unread_notification_count от таблицата notifications (repair job) - без commit."""
+        from models.notification import Notification
+
+        unread = (
+            db.select(db.func.count(Notification.id))
+            .where(Notification.user_id == cls.id, Notification.is_read.is_(False))
+            .scalar_subquery()
+        )
+        statement = db.update(cls).values({cls.unread_notification_count: unread})
+        if user_id is not None:
+            statement = statement.where(cls.id == user_id)
+        db.session.execute(statement.execution_options(synchronize_session=False))
+        db.session.expire_all()
+
     def to_dict(self) -> dict:
         """
         Преобразува потребителя в речник.
@@ -736,8 +1084,9 @@ class Provider(RegisteredUser):
         if not service:
             return False
 
-        db.session.delete(service)  # db.session.delete() = премахва от базата
-        db.session.commit()
+        # Заедно с резервациите, ревютата и любимите ѝ (виж models/cascade_delete.py)
+        from models.cascade_delete import delete_services
+        delete_services(Service.id == service.id)
         return True
 
     def get_my_services(self) -> List[dict]:
@@ -817,6 +1166,7 @@ class Provider(RegisteredUser):
             return False
 
         reservation.status = ReservationStatus.CONFIRMED
+        self.publish_booking_event(EventType.RESERVATION_CONFIRMED, reservation)
         db.session.commit()
         return True
 
@@ -839,6 +1189,7 @@ class Provider(RegisteredUser):
             return False
 
         reservation.status = ReservationStatus.CANCELED
+        self.publish_booking_event(EventType.RESERVATION_REJECTED, reservation)
         db.session.commit()
         return True
 
@@ -861,6 +1212,7 @@ class Provider(RegisteredUser):
             return False
 
         reservation.status = ReservationStatus.COMPLETED
+        self.publish_booking_event(EventType.RESERVATION_COMPLETED, reservation)
         db.session.commit()
         return True
 
@@ -911,28 +1263,21 @@ class Provider(RegisteredUser):
             provider.get_average_rating()           # За всички услуги
             provider.get_average_rating(service_id=5)  # За конкретна услуга
         """
+        # Четем денормализираните агрегати (rating_sum / rating_count) вместо всички ревюта
+        query = db.select(db.func.sum(Service.rating_sum), db.func.sum(Service.rating_count))
+
         if service_id:
             # Средна оценка за конкретна услуга
-            reviews = Review.query.filter_by(service_id=service_id).all()
+            query = query.where(Service.id == service_id)
         else:
-            # Средна оценка за ВСИЧКИ наши услуги
-            my_services = Service.query.filter_by(provider_id=self.id).all()
+            # Средна оценка за ВСИЧКИ наши услуги (една заявка, без цикъл по услугите)
+            query = query.where(Service.provider_id == self.id)
 
-            if not my_services:
-                return None
-
-            # Събираме ревютата за всяка наша услуга
-            reviews = []
-            for service in my_services:
-                service_reviews = Review.query.filter_by(service_id=service.id).all()
-                reviews.extend(service_reviews)  # extend = добавя елементите към списъка
-
-        if not reviews:
+        total, count = db.session.execute(query).one()
+        if not count:
             return None
 
-        # Изчисляваме средната стойност
-        total = sum(r.rating for r in reviews)
-        return total / len(reviews)
+        return total / count
 
     # ==================== УПРАВЛЕНИЕ НА РАБОТНО ВРЕМЕ ====================
 
@@ -997,20 +1342,31 @@ class Admin(Provider):
 
     # ==================== УПРАВЛЕНИЕ НА ПОТРЕБИТЕЛИ ====================
 
-    def get_all_users(self, role: Optional[UserRole] = None) -> List[dict]:
+    def get_all_users(self, role: Optional[UserRole] = None, search: Optional[str] = None,
+                      limit: Optional[int] = None, after_id: Optional[int] = None) -> List[dict]:
         """
-        Връща всички потребители.
+        Връща потребителите (по id, възходящо).
 
         Параметри:
             role: Филтрира по роля (незадължително)
+            search: Начало на потребителското име или имейла (незадължително)
+            limit: Най-много толкова потребители (None = всички)
+            after_id: Keyset пагинация - само потребители с id > after_id
 
         Връща:
             Списък с речници с данни за потребителите
         """
+        query = RegisteredUser.query
         if role:
-            users = RegisteredUser.query.filter_by(role=role).all()
-        else:
-            users = RegisteredUser.query.all()
+            query = query.filter_by(role=role)
+        if search:
+            query = query.filter(db.or_(
+                RegisteredUser.username.startswith(search, autoescape=True),
+                RegisteredUser.email.startswith(search, autoescape=True)
+            ))
+        if after_id is not None:
+            query = query.filter(RegisteredUser.id > after_id)
+        users = query.order_by(RegisteredUser.id).limit(limit).all()
 
         result = []
         for u in users:
@@ -1057,8 +1413,9 @@ class Admin(Provider):
         if not user:
             return False
 
-        db.session.delete(user)
-        db.session.commit()
+        # Заедно с услугите, резервациите, ревютата, любимите и известията му
+        from models.cascade_delete import delete_users
+        delete_users([user_id])
         return True
 
     def change_user_role(self, user_id: int, new_role: UserRole) -> bool:
@@ -1086,22 +1443,74 @@ class Admin(Provider):
         db.session.commit()
         return True
 
+    def delete_users(self, user_ids: List[int]) -> int:
+        """
+        Изтрива няколко потребителя (с една DELETE заявка на таблица за пакет).
+
+        Параметри:
+            user_ids: ID-тата на потребителите (собственото се пропуска)
+
+        Връща:
+            Броят изтрити потребители
+        """
+        from models.cascade_delete import delete_users
+
+        return delete_users(user_id for user_id in user_ids if user_id != self.id)
+
+    def change_users_role(self, user_ids: List[int], new_role: UserRole) -> int:
+        """
+        Сменя ролята на няколко потребителя с една UPDATE заявка.
+
+        Параметри:
+            user_ids: ID-тата на потребителите (собственото се пропуска)
+            new_role: Новата роля
+
+        Връща:
+            Броят потребители, чиято роля е сменена
+
+        UPDATE-ът сменя колоната role, но заредените обекти остават от стария
+        клас (Provider/Admin/RegisteredUser) - затова се махат от сесията и
+        следващото db.session.get() ги зарежда наново с новия клас.
+        """
+        ids = {user_id for user_id in user_ids if user_id != self.id}
+        if not ids:
+            return 0
+
+        result = db.session.execute(
+            db.update(RegisteredUser)
+            .where(RegisteredUser.id.in_(ids), RegisteredUser.role != new_role)
+            .values(role=new_role)
+        )
+        db.session.commit()
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, RegisteredUser) and inspect(obj).identity[0] in ids:
+                db.session.expunge(obj)
+        return result.rowcount
+
     # ==================== УПРАВЛЕНИЕ НА ВСИЧКИ УСЛУГИ ====================
 
-    def get_all_services(self, category: Optional[str] = None) -> List[dict]:
+    def get_all_services(self, category: Optional[str] = None, provider_id: Optional[int] = None,
+                         limit: Optional[int] = None, after_id: Optional[int] = None) -> List[dict]:
         """
-        Връща всички услуги в системата.
+        Връща услугите в системата (по id, възходящо).
 
         Параметри:
             category: Филтрира по категория (незадължително)
+            provider_id: Филтрира по доставчик (незадължително)
+            limit: Най-много толкова услуги (None = всички)
+            after_id: Keyset пагинация - само услуги с id > after_id
 
         Връща:
             Списък с речници с данни за услугите
         """
+        query = Service.query
         if category:
-            services = Service.query.filter_by(category=category).all()
-        else:
-            services = Service.query.all()
+            query = query.filter_by(category=category)
+        if provider_id:
+            query = query.filter_by(provider_id=provider_id)
+        if after_id is not None:
+            query = query.filter(Service.id > after_id)
+        services = query.order_by(Service.id).limit(limit).all()
 
         result = []
         for s in services:
@@ -1125,30 +1534,40 @@ class Admin(Provider):
         Връща:
             True ако е успешно, False ако не е намерена
         """
-        service = db.session.get(Service, service_id)
-        if not service:
-            return False
+        from models.cascade_delete import delete_services
 
-        db.session.delete(service)
-        db.session.commit()
-        return True
+        return delete_services(Service.id == service_id) > 0
 
     # ==================== УПРАВЛЕНИЕ НА ВСИЧКИ РЕЗЕРВАЦИИ ====================
 
-    def get_all_reservations(self, status: Optional[ReservationStatus] = None) -> List[dict]:
+    def get_all_reservations(self, status: Optional[ReservationStatus] = None,
+                             customer_id: Optional[int] = None, provider_id: Optional[int] = None,
+                             service_id: Optional[int] = None, limit: Optional[int] = None,
+                             before_id: Optional[int] = None) -> List[dict]:
         """
-        Връща всички резервации в системата.
+        Връща резервациите в системата (най-новите първо).
 
         Параметри:
             status: Филтрира по статус (незадължително)
+            customer_id, provider_id, service_id: Филтри по клиент/доставчик/услуга
+            limit: Най-много толкова резервации (None = всички)
+            before_id: Keyset пагинация - само резервации с id < before_id
 
         Връща:
             Списък с речници с данни за резервациите
         """
+        query = Reservation.query
         if status:
-            reservations = Reservation.query.filter_by(status=status).all()
-        else:
-            reservations = Reservation.query.all()
+            query = query.filter_by(status=status)
+        if customer_id:
+            query = query.filter_by(customer_id=customer_id)
+        if provider_id:
+            query = query.filter_by(provider_id=provider_id)
+        if service_id:
+            query = query.filter_by(service_id=service_id)
+        if before_id is not None:
+            query = query.filter(Reservation.id < before_id)
+        reservations = query.order_by(Reservation.id.desc()).limit(limit).all()
 
         result = []
         for r in reservations:
@@ -1183,14 +1602,28 @@ class Admin(Provider):
 
     # ==================== УПРАВЛЕНИЕ НА РЕВЮТА ====================
 
-    def get_all_reviews(self) -> List[dict]:
+    def get_all_reviews(self, service_id: Optional[int] = None, user_id: Optional[int] = None,
+                        limit: Optional[int] = None, after_id: Optional[int] = None) -> List[dict]:
         """
-        Връща всички ревюта в системата.
+        Връща ревютата в системата (по id, възходящо).
+
+        Параметри:
+            service_id: Филтрира по услуга (незадължително)
+            user_id: Филтрира по автор (незадължително)
+            limit: Най-много толкова ревюта (None = всички)
+            after_id: Keyset пагинация - само ревюта с id > after_id
 
         Връща:
             Списък с речници с данни за ревютата
         """
-        reviews = Review.query.all()
+        query = Review.query
+        if service_id:
+            query = query.filter_by(service_id=service_id)
+        if user_id:
+            query = query.filter_by(user_id=user_id)
+        if after_id is not None:
+            query = query.filter(Review.id > after_id)
+        reviews = query.order_by(Review.id).limit(limit).all()
 
         result = []
         for r in reviews:
@@ -1217,50 +1650,61 @@ class Admin(Provider):
         if not review:
             return False
 
+        service_id, rating = review.service_id, review.rating
         db.session.delete(review)
+        generation = leaderboard.generation
         db.session.commit()
+
+        leaderboard.record_review(service_id, rating, -1, generation)
         return True
 
     # ==================== УПРАВЛЕНИЕ НА КАТЕГОРИИ ====================
 
     def get_all_categories(self) -> List[str]:
         """
-        Връща списък с всички уникални категории.
+        Връща списък с всички категории, в които има поне една услуга.
 
         Връща:
-            Списък със стрингове - имената на категориите
+            Списък със стрингове - имената на категориите (азбучно)
 
         Забележка:
-            Категориите се извличат от съществуващите услуги.
-            За по-сложна система може да се създаде отделен модел Category.
+            Четем само индексите: ix_categories_name дава имената вече сортирани,
+            а EXISTS проверката минава през индекса на services.category_id.
         """
-        # Вземаме всички услуги и извличаме уникалните категории
-        services = Service.query.all()
-        categories = set()  # set = колекция без повторения
-
-        for s in services:
-            if s.category:
-                categories.add(s.category)
-
-        return sorted(list(categories))  # Сортираме азбучно
+        has_services = db.select(Service.id).where(Service.category_id == Category.id).exists()
+        names = db.session.scalars(
+            db.select(Category.name).where(has_services).order_by(Category.name)
+        )
+        return list(names)
 
     def rename_category(self, old_name: str, new_name: str) -> int:
         """
-        Преименува категория (променя във всички услуги).
+        Преименува категория.
 
         Параметри:
             old_name: Старото име на категорията
             new_name: Новото име
 
         Връща:
-            Брой променени услуги
+            Брой услуги в преименуваната категория (0 ако не съществува)
+
+        Забележка:
+            Обикновено това е UPDATE на един ред в categories.
+            Ако new_name вече съществува, категориите се сливат с един
+            set-based UPDATE на services.category_id.
         """
-        services = Service.query.filter_by(category=old_name).all()
-        count = 0
+        category = Category.get_by_name(old_name)
+        if not category:
+            return 0
 
-        for s in services:
-            s.category = new_name
-            count += 1
+        count = Service.query.filter_by(category_id=category.id).count()
+
+        target = Category.get_by_name(new_name)
+        if target and target.id != category.id:
+            Service.query.filter_by(category_id=category.id).update({'category_id': target.id})
+            db.session.delete(category)
+        else:
+            category.name = new_name
 
         db.session.commit()
         return count
@@ -1275,13 +1719,18 @@ class Admin(Provider):
         Връща:
             Брой изтрити услуги
 
-        ВНИМАНИЕ: Това изтрива всички услуги в категорията!
+        ВНИМАНИЕ: Това изтрива всички услуги в категорията - заедно с техните
+        резервации, ревюта и любими! Изтриването е на пакети (по една DELETE
+        заявка на таблица за пакет, без зареждане на услугите).
         """
-        services = Service.query.filter_by(category=category_name).all()
-        count = len(services)
+        from models.cascade_delete import delete_services
 
-        for s in services:
-            db.session.delete(s)
+        category = Category.get_by_name(category_name)
+        if not category:
+            return 0
+
+        count = delete_services(Service.category_id == category.id)
+        db.session.delete(category)
 
         db.session.commit()
         return count
@@ -1299,16 +1748,13 @@ class Admin(Provider):
             - total_services: Брой услуги
             - total_reservations: Брой резервации
             - total_reviews: Брой ревюта
+
+        Стойностите идват от поддържаните броячи (models/platform_stats.py) -
+        една заявка без сканиране на таблиците, кеширана ADMIN_STATS_CACHE_SECONDS.
         """
-        return {
-            'total_users': RegisteredUser.query.filter_by(role=UserRole.USER).count(),
-            'total_providers': RegisteredUser.query.filter_by(role=UserRole.PROVIDER).count(),
-            'total_admins': RegisteredUser.query.filter_by(role=UserRole.ADMIN).count(),
-            'total_services': Service.query.count(),
-            'total_reservations': Reservation.query.count(),
-            'pending_reservations': Reservation.query.filter_by(status=ReservationStatus.PENDING).count(),
-            'total_reviews': Review.query.count()
-        }
+        from models.platform_stats import get_platform_statistics
+
+        return get_platform_statistics()
 
     @classmethod
     def create_initial_admin(cls, username: str, email: str, password: str) -> 'Admin':
@@ -0,0 +1,322 @@
+"""
+Администраторски API (/api/admin) над методите на Admin.
+
+Всички маршрути изискват роля ADMIN (Authorization: Bearer <токен>; X-User-ID
+само в демо режим). Списъците са с keyset пагинация (limit + cursor, хедър
+X-Next-Cursor) - никога не се връща цялата таблица. Масовите действия
+(изтриване, смяна на роля) са една заявка за всички подадени id-та.
+Изтриването на потребител, услуга или категория е каскадно
+(models/cascade_delete.py).
+"""
+from typing import Any, Optional
+from flask import Blueprint, request, jsonify, Response
+from models.category import Category
+from models.reservation import ReservationStatus
+from models.user import Admin, UserRole
+from routes.identity import current_user, current_user_id, current_role
+from routes.pagination import ID_CURSOR, decode_cursor, get_page_limit, split_page, page_response
+
+admin_bp = Blueprint('admin', __name__)
+
+# Най-много толкова id-та в едно масово действие
+MAX_BULK_IDS = 500
+
+
+@admin_bp.before_request
+def _require_admin() -> Optional[tuple[Response, int]]:
+    """Само администратори - ролята идва от токена (без база) или от current_user()."""
+    if not current_user_id():
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+    if current_role() != UserRole.ADMIN:
+        return jsonify({'error': 'Нямате права'}), 403
+    return None
+
+
+def _admin() -> Admin:
+    admin = current_user()
+    if not isinstance(admin, Admin):
+        raise PermissionError('Нямате права')
+    return admin
+
+
+def _cursor_id() -> Optional[int]:
+    """
+    id-то от курсора на предишната страница.
+
+    Изключения:
+        ValueError: Невалиден курсор
+    """
+    after = decode_cursor(request.args.get('cursor'), ID_CURSOR)
+    return after[0] if after else None
+
+
+def _bulk_ids(data: Optional[dict]) -> list[int]:
+    """
+    Списъкът "ids" от тялото на масово действие.
+
+    Изключения:
+        ValueError: Липсващ, празен или прекалено дълъг списък
+    """
+    ids = (data or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('Липсва списък ids')
+    if len(ids) > MAX_BULK_IDS:
+        raise ValueError(f'Най-много {MAX_BULK_IDS} id-та наведнъж')
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError('ids трябва да съдържа цели числа')
+    return ids
+
+
+@admin_bp.errorhandler(PermissionError)
+def _forbidden(error: PermissionError) -> tuple[Response, int]:
+    return jsonify({'error': str(error)}), 403
+
+
+# ==================== ПОТРЕБИТЕЛИ ====================
+
+@admin_bp.route('/users', methods=['GET'])
+def list_users() -> tuple[Response, int]:
+    """
+    Страница с потребители (по id).
+
+    Query параметри:
+        role: user, provider или admin
+        q: Начало на потребителското име или имейла
+        limit: Брой потребители (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
+    try:
+        after_id = _cursor_id()
+        role = UserRole(request.args['role']) if request.args.get('role') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    users = _admin().get_all_users(role=role, search=request.args.get('q'),
+                                   limit=limit + 1, after_id=after_id)
+    page, next_cursor = split_page(users, limit, lambda u: [u['id']])
+    return page_response(page, next_cursor), 200
+
+
+@admin_bp.route('/users/<int:user_id>', methods=['GET'])
+def get_user(user_id: int) -> tuple[Response, int]:
+    """Данните на един потребител."""
+    user = _admin().get_user_by_id(user_id)
+    if user is None:
+        return jsonify({'error': 'Потребителят не е намерен'}), 404
+    return jsonify(user), 200
+
+
+@admin_bp.route('/users/<int:user_id>', methods=['DELETE'])
+def delete_user(user_id: int) -> tuple[Response, int]:
+    """Изтрива потребител с всичко негово (собственият профил не може)."""
+    if user_id == current_user_id():
+        return jsonify({'error': 'Не можете да изтриете собствения си профил'}), 400
+    if not _admin().delete_user(user_id):
+        return jsonify({'error': 'Потребителят не е намерен'}), 404
+    return jsonify({'message': 'Потребителят е изтрит'}), 200
+
+
+@admin_bp.route('/users/<int:user_id>/role', methods=['PUT'])
+def change_user_role(user_id: int) -> tuple[Response, int]:
+    """
+    Сменя ролята на потребител (собствената не може).
+
+    Очаква JSON: role (user, provider или admin)
+    """
+    try:
+        role = UserRole((request.get_json(silent=True) or {}).get('role'))
+    except ValueError:
+        return jsonify({'error': 'Невалидна роля'}), 400
+    if user_id == current_user_id():
+        return jsonify({'error': 'Не можете да смените собствената си роля'}), 400
+
+    admin = _admin()
+    if not admin.change_user_role(user_id, role):
+        return jsonify({'error': 'Потребителят не е намерен'}), 404
+    return jsonify(admin.get_user_by_id(user_id)), 200
+
+
+@admin_bp.route('/users/bulk-delete', methods=['POST'])
+def bulk_delete_users() -> tuple[Response, int]:
+    """
+    Изтрива няколко потребителя наведнъж.
+
+    Очаква JSON: ids (списък, собственият профил се пропуска)
+    """
+    try:
+        ids = _bulk_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    deleted = _admin().delete_users(ids)
+    return jsonify({'deleted': deleted}), 200
+
+
+@admin_bp.route('/users/bulk-role', methods=['POST'])
+def bulk_change_role() -> tuple[Response, int]:
+    """
+    Сменя ролята на няколко потребителя наведнъж.
+
+    Очаква JSON: ids (списък, собственият профил се пропуска), role
+    """
+    data: dict[str, Any] | None = request.get_json(silent=True)
+    try:
+        ids = _bulk_ids(data)
+        role = UserRole((data or {}).get('role'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    updated = _admin().change_users_role(ids, role)
+    return jsonify({'updated': updated}), 200
+
+
+# ==================== УСЛУГИ И РЕЗЕРВАЦИИ ====================
+
+@admin_bp.route('/services', methods=['GET'])
+def list_services() -> tuple[Response, int]:
+    """
+    Страница с услуги (по id).
+
+    Query параметри:
+        category: Филтрира по категория
+        provider_id: Филтрира по доставчик
+        limit, cursor: Keyset пагинация (хедър X-Next-Cursor)
+    """
+    try:
+        after_id = _cursor_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    services = _admin().get_all_services(
+        category=request.args.get('category'),
+        provider_id=request.args.get('provider_id', type=int),
+        limit=limit + 1,
+        after_id=after_id
+    )
+    page, next_cursor = split_page(services, limit, lambda s: [s['id']])
+    return page_response(page, next_cursor), 200
+
+
+@admin_bp.route('/services/<int:service_id>', methods=['DELETE'])
+def delete_service(service_id: int) -> tuple[Response, int]:
+    """Изтрива услуга (на всеки доставчик) с резервациите, ревютата и любимите ѝ."""
+    if not _admin().delete_any_service(service_id):
+        return jsonify({'error': 'Услугата не е намерена'}), 404
+    return jsonify({'message': 'Услугата е изтрита'}), 200
+
+
+@admin_bp.route('/reservations', methods=['GET'])
+def list_reservations() -> tuple[Response, int]:
+    """
+    Страница с резервации (най-новите първо).
+
+    Query параметри:
+        status: Pending, Confirmed, Canceled, Completed
+        customer_id, provider_id, service_id: Филтри
+        limit, cursor: Keyset пагинация (хедър X-Next-Cursor)
+    """
+    try:
+        before_id = _cursor_id()
+        status = ReservationStatus(request.args['status']) if request.args.get('status') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    reservations = _admin().get_all_reservations(
+        status=status,
+        customer_id=request.args.get('customer_id', type=int),
+        provider_id=request.args.get('provider_id', type=int),
+        service_id=request.args.get('service_id', type=int),
+        limit=limit + 1,
+        before_id=before_id
+    )
+    page, next_cursor = split_page(reservations, limit, lambda r: [r['id']])
+    return page_response(page, next_cursor), 200
+
+
+@admin_bp.route('/reservations/<int:reservation_id>', methods=['DELETE'])
+def delete_reservation(reservation_id: int) -> tuple[Response, int]:
+    """Изтрива резервация."""
+    if not _admin().delete_reservation(reservation_id):
+        return jsonify({'error': 'Резервацията не е намерена'}), 404
+    return jsonify({'message': 'Резервацията е изтрита'}), 200
+
+
+# ==================== РЕВЮТА ====================
+
+@admin_bp.route('/reviews', methods=['GET'])
+def list_reviews() -> tuple[Response, int]:
+    """
+    Страница с ревюта (по id).
+
+    Query параметри:
+        service_id, user_id: Филтри
+        limit, cursor: Keyset пагинация (хедър X-Next-Cursor)
+    """
+    try:
+        after_id = _cursor_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    reviews = _admin().get_all_reviews(
+        service_id=request.args.get('service_id', type=int),
+        user_id=request.args.get('user_id', type=int),
+        limit=limit + 1,
+        after_id=after_id
+    )
+    page, next_cursor = split_page(reviews, limit, lambda r: [r['id']])
+    return page_response(page, next_cursor), 200
+
+
+@admin_bp.route('/reviews/<int:review_id>', methods=['DELETE'])
+def delete_review(review_id: int) -> tuple[Response, int]:
+    """Изтрива ревю (агрегатите и класацията се обновяват)."""
+    if not _admin().delete_review(review_id):
+        return jsonify({'error': 'Ревюто не е намерено'}), 404
+    return jsonify({'message': 'Ревюто е изтрито'}), 200
+
+
+# ==================== КАТЕГОРИИ ====================
+
+@admin_bp.route('/categories', methods=['GET'])
+def list_categories() -> tuple[Response, int]:
+    """Категориите с поне една услуга (азбучно)."""
+    return jsonify(_admin().get_all_categories()), 200
+
+
+@admin_bp.route('/categories/<string:name>', methods=['PUT'])
+def rename_category(name: str) -> tuple[Response, int]:
+    """
+    Преименува категория (ако новото име съществува - сливане).
+
+    Очаква JSON: name (новото име)
+    """
+    new_name = (request.get_json(silent=True) or {}).get('name')
+    if not isinstance(new_name, str) or not new_name.strip():
+        return jsonify({'error': 'Липсва ново име (name)'}), 400
+    if Category.get_by_name(name) is None:
+        return jsonify({'error': 'Категорията не е намерена'}), 404
+
+    services = _admin().rename_category(name, new_name.strip())
+    return jsonify({'services': services}), 200
+
+
+@admin_bp.route('/categories/<string:name>', methods=['DELETE'])
+def delete_category(name: str) -> tuple[Response, int]:
+    """Изтрива категория с ВСИЧКИ услуги в нея (каскадно)."""
+    if Category.get_by_name(name) is None:
+        return jsonify({'error': 'Категорията не е намерена'}), 404
+
+    deleted = _admin().delete_category(name)
+    return jsonify({'deleted_services': deleted}), 200
+
+
+# ==================== СТАТИСТИКИ ====================
+
+@admin_bp.route('/statistics', methods=['GET'])
+def get_statistics() -> tuple[Response, int]:
+    """Статистики на платформата (от броячите, виж models/platform_stats.py)."""
+    return jsonify(_admin().get_statistics()), 200
@@ -1,10 +1,31 @@
+import math
 from flask import Blueprint, request, jsonify, Response
 from typing import Any
-from db import db
-from models.user import RegisteredUser, Provider, Admin, UserRole
+from models.password_hasher import HasherBusyError
+from models.rate_limit import login_rate_limiter
+from models.user import RegisteredUser, UserRole
+from routes.identity import current_user, current_user_id, issue_token
 
 auth_bp = Blueprint('auth', __name__)
 
+# Колко секунди клиентът да изчака при пълна опашка за хеширане
+BUSY_RETRY_AFTER_SECONDS = 1
+
+
+@auth_bp.app_errorhandler(HasherBusyError)
+def hasher_busy(error: HasherBusyError) -> tuple[Response, int]:
+    """Пълна опашка за пароли -> 503 вместо чакане без край (за всички blueprint-и)."""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(BUSY_RETRY_AFTER_SECONDS)
+    return response, 503
+
+
+def _too_many_attempts(retry_after: float, message: str) -> tuple[Response, int]:
+    """429 с Retry-After (цели секунди, поне 1)."""
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
 
 @auth_bp.route('/register', methods=['POST'])
 def register() -> tuple[Response, int]:
@@ -16,32 +37,27 @@ def register() -> tuple[Response, int]:
         email: Имейл
         password: Парола
         role: Роля (незадължително, по подразбиране 'user')
+
+    Твърде много регистрации от един IP адрес -> 429 (Retry-After)
     """
     data: dict[str, Any] | None = request.get_json()
 
     if not data or not data.get('username') or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Липсват задължителни полета'}), 400
 
-    if RegisteredUser.query.filter_by(username=data['username']).first():
-        return jsonify({'error': 'Потребителското име е заето'}), 400
-
-    if RegisteredUser.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Имейлът е зает'}), 400
+    # Паролата се хешира преди INSERT-а да открие заетия имейл - ограничаваме опитите
+    retry_after = login_rate_limiter.check_registration(request.remote_addr)
+    if retry_after is not None:
+        return _too_many_attempts(retry_after, 'Твърде много регистрации - опитайте по-късно')
 
     role_str = data.get('role', 'user')
     role = UserRole(role_str)
 
-    if role == UserRole.ADMIN:
-        user = Admin(username=data['username'], email=data['email'], role=role)
-    elif role == UserRole.PROVIDER:
-        user = Provider(username=data['username'], email=data['email'], role=role)
-    else:
-        user = RegisteredUser(username=data['username'], email=data['email'], role=role)
-
-    user.set_password(data['password'])
-
-    db.session.add(user)
-    db.session.commit()
+    # Заетите username/email се откриват от UNIQUE ограниченията при INSERT-а
+    try:
+        user = RegisteredUser.register(data['username'], data['email'], data['password'], role)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     return jsonify({'message': 'Регистрацията е успешна', 'user_id': user.id}), 201
 
@@ -54,12 +70,20 @@ def login() -> tuple[Response, int]:
     Очаква JSON:
         email: Имейл ИЛИ потребителско име
         password: Парола
+
+    Връща token - подписан токен за хедъра Authorization: Bearer <token>
+    Твърде много опити от един IP адрес или за един акаунт -> 429 (Retry-After)
     """
     data: dict[str, Any] | None = request.get_json()
 
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Липсват имейл или парола'}), 400
 
+    # Преди заявката към базата и хеширането - отказаният опит не струва CPU
+    retry_after = login_rate_limiter.check(request.remote_addr, str(data['email']))
+    if retry_after is not None:
+        return _too_many_attempts(retry_after, 'Твърде много опити за вход - опитайте по-късно')
+
     user = RegisteredUser.login(data['email'], data['password'])
 
     if not user:
@@ -69,7 +93,8 @@ def login() -> tuple[Response, int]:
         'message': 'Успешен вход',
         'user_id': user.id,
         'username': user.username,
-        'role': user.role.value
+        'role': user.role.value,
+        'token': issue_token(user)  # -> Authorization: Bearer <token>
     }), 200
 
 
@@ -84,11 +109,10 @@ def get_profile() -> tuple[Response, int]:
     """
     Връща профила на текущия потребител.
     """
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
+    if not current_user_id():
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
+    user = current_user()
     if not user:
         return jsonify({'error': 'Потребителят не е намерен'}), 404
 
@@ -100,14 +124,13 @@ def update_profile() -> tuple[Response, int]:
     """
     Обновява профила на текущия потребител.
 
-    Очаква header: X-User-ID
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
     Очаква JSON: username, email (незадължителни)
     """
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
+    if not current_user_id():
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
+    user = current_user()
     if not user:
         return jsonify({'error': 'Потребителят не е намерен'}), 404
 
@@ -1,33 +1,52 @@
 """Маршрути за любими услуги."""
 from flask import Blueprint, request, jsonify, Response
-from db import db
-from models.user import RegisteredUser
+from routes.identity import current_user
+from routes.pagination import ID_CURSOR, decode_cursor, get_page_limit, split_page, page_response
 
 favorites_bp = Blueprint('favorites', __name__)
 
 
-def _get_current_user() -> RegisteredUser | None:
-    """Помощна функция за взимане на текущия потребител."""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return None
-    return db.session.get(RegisteredUser, int(user_id))
-
-
 @favorites_bp.route('', methods=['GET'])
 def get_favorites() -> tuple[Response, int]:
-    """Връща любимите услуги на потребителя."""
-    user = _get_current_user()
+    """
+    Връща любимите услуги на потребителя.
+
+    Query параметри:
+        expand: true - включва данните на услугата (с оценките) в същия отговор
+        next_slot: true - и първия свободен час на услугата (само с expand)
+        limit, cursor: Keyset пагинация (хедър X-Next-Cursor); при expand
+                       по подразбиране страница от 20
+    """
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    return jsonify(user.get_favorites()), 200
+    expand = request.args.get('expand', 'false').lower() == 'true'
+    include_next_slot = request.args.get('next_slot', 'false').lower() == 'true'
+
+    try:
+        after = decode_cursor(request.args.get('cursor'), ID_CURSOR)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not expand and after is None and 'limit' not in request.args:
+        return jsonify(user.get_favorites()), 200
+
+    limit = get_page_limit()
+    favorites = user.get_favorites(
+        expand=expand,
+        include_next_slot=include_next_slot,
+        limit=limit + 1,
+        after_id=after[0] if after else None
+    )
+    page, next_cursor = split_page(favorites, limit, lambda f: [f['id']])
+    return page_response(page, next_cursor), 200
 
 
 @favorites_bp.route('', methods=['POST'])
 def add_favorite() -> tuple[Response, int]:
     """Добавя услуга към любими."""
-    user = _get_current_user()
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
@@ -44,10 +63,32 @@ def add_favorite() -> tuple[Response, int]:
         return jsonify({'error': str(e)}), 404
 
 
+@favorites_bp.route('', methods=['PUT'])
+def sync_favorites() -> tuple[Response, int]:
+    """
+    Синхронизира любимите с пълния набор от клиента (една заявка вместо по една на услуга).
+
+    Очаква JSON: service_ids - всички услуги, които трябва да са в любими
+    Връща: added, removed (приложената разлика) и unknown (пропуснати несъществуващи услуги)
+    """
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'service_ids' not in data:
+        return jsonify({'error': 'Липсва service_ids'}), 400
+
+    try:
+        return jsonify(user.sync_favorites(data['service_ids'])), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @favorites_bp.route('/<int:service_id>', methods=['DELETE'])
 def remove_favorite(service_id: int) -> tuple[Response, int]:
     """Премахва услуга от любими."""
-    user = _get_current_user()
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
@@ -0,0 +1,141 @@
+"""
+Идентичност на заявката: подписани токени + текущият потребител.
+
+/api/auth/login връща токен, подписан с HMAC (SECRET_KEY), който носи
+id-то и ролята на потребителя. Хукът before_request проверява подписа
+и срока и записва id/ролята във flask.g - без заявка към базата.
+Проверките на роля при четене използват ролята от токена директно;
+записите (create_service, update_service...) я сверяват с базата -
+current_role(fresh=True) - защото изтрит или понижен потребител
+запазва валиден токен до изтичането му.
+
+Клиентът праща токена в хедъра:
+    Authorization: Bearer <токен>
+
+X-User-ID (виж README) е само за демото и тестовете: приема се, ако
+AUTH_ALLOW_USER_ID_HEADER е включено И приложението е в DEBUG или TESTING
+режим - тогава ролята се чете от базата при първата нужда.
+
+current_user() зарежда потребителя най-много веднъж на заявка (кешира се
+в g) и връща обект от правилния клас - RegisteredUser, Provider или Admin
+(полиморфно зареждане по колоната role). Всички blueprint-и го използват
+вместо собствено четене на хедъра и db.session.get().
+"""
+from typing import Optional
+from flask import Flask, Response, current_app, g, has_app_context, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from db import db
+from models.user import RegisteredUser, UserRole
+
+TOKEN_SALT = 'auth-token'
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+
+def issue_token(user: RegisteredUser) -> str:
+    """Подписан токен с id и роля на потребителя."""
+    return _serializer().dumps({'uid': user.id, 'role': user.role.value})
+
+
+def verify_token(token: str) -> tuple[int, UserRole]:
+    """
+    Проверява подписа и срока на токена.
+
+    Връща:
+        (user_id, роля)
+
+    Изключения:
+        ValueError: Невалиден или изтекъл токен
+    """
+    try:
+        payload = _serializer().loads(token, max_age=current_app.config['AUTH_TOKEN_MAX_AGE_SECONDS'])
+    except SignatureExpired as e:
+        raise ValueError('Сесията е изтекла - влезте отново') from e
+    except BadSignature as e:
+        raise ValueError('Невалиден токен') from e
+
+    try:
+        return int(payload['uid']), UserRole(payload['role'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Невалиден токен') from e
+
+
+def user_id_header_allowed() -> bool:
+    """X-User-ID без подпис - само с AUTH_ALLOW_USER_ID_HEADER и в DEBUG/TESTING."""
+    return bool(current_app.config['AUTH_ALLOW_USER_ID_HEADER']
+                and (current_app.debug or current_app.testing))
+
+
+def _load_identity() -> Optional[tuple[Response, int]]:
+    """before_request: попълва g.user_id / g.user_role (без база при токен)."""
+    g.user_id = None
+    g.user_role = None
+    g.pop('current_user', None)
+
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        try:
+            g.user_id, g.user_role = verify_token(authorization[len('Bearer '):].strip())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 401
+        return None
+
+    if user_id_header_allowed():
+        user_id = request.headers.get('X-User-ID')
+        if user_id and user_id.isdigit():
+            g.user_id = int(user_id)
+    return None
+
+
+def _forget_identity(_exc: Optional[BaseException]) -> None:
+    """teardown_request: обектът на потребителя не надживява заявката."""
+    if has_app_context():  # Запазен (preserved) контекст може да се затвори след app контекста
+        g.pop('current_user', None)
+
+
+def init_identity(app: Flask) -> None:
+    """Регистрира проверката на токена за всички blueprint-и."""
+    app.before_request(_load_identity)
+    app.teardown_request(_forget_identity)
+
+
+def current_user_id() -> Optional[int]:
+    """ID на влезлия потребител (или None)."""
+    return g.get('user_id')
+
+
+def current_user() -> Optional[RegisteredUser]:
+    """
+    Влезлият потребител - зарежда се с една заявка при първото извикване.
+
+    Връща:
+        RegisteredUser / Provider / Admin според ролята, или None ако няма
+        идентичност или потребителят не съществува (напр. изтрит след входа)
+    """
+    if 'current_user' not in g:
+        user_id = g.get('user_id')
+        g.current_user = db.session.get(RegisteredUser, user_id) if user_id is not None else None
+    return g.current_user
+
+
+def current_role(fresh: bool = False) -> Optional[UserRole]:
+    """
+    Ролята на влезлия потребител.
+
+    С токен - от самия токен, без база. С X-User-ID - от current_user(),
+    т.е. същата (единствена) заявка, която ползва и останалата част от
+    обработката. None ако потребителят не съществува.
+
+    Параметри:
+        fresh: True - винаги от базата (за записи). Токенът е валиден
+            AUTH_TOKEN_MAX_AGE_SECONDS и след изтриване или смяна на ролята.
+    """
+    if fresh and g.get('user_id') is not None:
+        user = current_user()
+        g.user_role = user.role if user is not None else None
+    elif g.get('user_role') is None and g.get('user_id') is not None:
+        user = current_user()
+        g.user_role = user.role if user is not None else None
+    return g.get('user_role')
@@ -1,34 +1,60 @@
 """Маршрути за известия."""
-from flask import Blueprint, request, jsonify, Response
+import json
+from typing import Iterator
+from flask import Blueprint, request, jsonify, Response, current_app
 from db import db
-from models.user import RegisteredUser
+from models.notification import Notification
+from models.notification_stream import notification_broker, StreamSubscription
+from routes.identity import current_user
+from routes.pagination import ID_CURSOR, decode_cursor, get_page_limit, split_page, page_response
 
 notifications_bp = Blueprint('notifications', __name__)
 
 
-def _get_current_user() -> RegisteredUser | None:
-    """Помощна функция за взимане на текущия потребител."""
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
-        return None
-    return db.session.get(RegisteredUser, int(user_id))
-
-
 @notifications_bp.route('', methods=['GET'])
 def get_notifications() -> tuple[Response, int]:
-    """Връща известията на потребителя."""
-    user = _get_current_user()
+    """
+    Връща известията на потребителя (най-новите първо, keyset пагинация).
+
+    Query параметри:
+        unread_only: true - само непрочетените
+        limit: Брой известия (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
+    try:
+        after = decode_cursor(request.args.get('cursor'), ID_CURSOR)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     unread_only = request.args.get('unread_only', '').lower() == 'true'
-    return jsonify(user.get_notifications(unread_only=unread_only)), 200
+    limit = get_page_limit()
+    result = user.get_notifications(
+        unread_only=unread_only, limit=limit + 1, before_id=after[0] if after else None
+    )
+    result['notifications'], next_cursor = split_page(
+        result['notifications'], limit, lambda n: [n['id']]
+    )
+    return page_response(result, next_cursor), 200
+
+
+@notifications_bp.route('/unread-count', methods=['GET'])
+def get_unread_count() -> tuple[Response, int]:
+    """Брой непрочетени известия (значката) - от брояча на потребителя, без COUNT."""
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+
+    return jsonify({'unread_count': user.unread_notification_count}), 200
 
 
 @notifications_bp.route('/<int:notification_id>/read', methods=['PUT'])
 def mark_as_read(notification_id: int) -> tuple[Response, int]:
     """Маркира известие като прочетено."""
-    user = _get_current_user()
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
@@ -42,9 +68,113 @@ def mark_as_read(notification_id: int) -> tuple[Response, int]:
 @notifications_bp.route('/read-all', methods=['PUT'])
 def mark_all_as_read() -> tuple[Response, int]:
     """Маркира всички известия като прочетени."""
-    user = _get_current_user()
+    user = current_user()
     if not user:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
     count = user.mark_all_notifications_read()
     return jsonify({'message': f'Маркирани {count} известия'}), 200
+
+
+# ==================== SSE ПОТОК ====================
+
+# Колко пропуснати известия да изпратим при повторно свързване (Last-Event-ID).
+# При повече клиентът получава събитие resync и презарежда списъка през GET.
+STREAM_BACKLOG_LIMIT = 100
+
+
+def _format_event(notification: dict) -> str:
+    """Известие във формата на text/event-stream (id = id на известието)."""
+    data = json.dumps(notification, ensure_ascii=False)
+    return f"id: {notification['id']}\nevent: notification\ndata: {data}\n\n"
+
+
+def _event_stream(subscription: StreamSubscription, backlog: list[dict],
+                  last_id: int, heartbeat: float, resync: bool = False) -> Iterator[str]:
+    """
+    Генератор на потока - работи без контекст на приложението и без базата.
+
+    Първо изпраща пропуснатите известия (или resync, ако са прекалено много),
+    после чака на опашката. Известие, което е и в backlog-а, и в опашката,
+    се изпраща веднъж.
+    """
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        if resync:
+            yield f"id: {last_id}\nevent: resync\ndata: {{}}\n\n"
+        for notification in backlog:
+            last_id = max(last_id, notification['id'])
+            yield _format_event(notification)
+
+        while not subscription.overflowed:
+            notification = subscription.get(timeout=heartbeat)
+            if notification is None:
+                yield ': keep-alive\n\n'
+            elif notification['id'] > last_id:
+                last_id = notification['id']
+                yield _format_event(notification)
+    finally:
+        notification_broker.unsubscribe(subscription)
+
+
+def _max_notification_id(user_id: int) -> int:
+    return db.session.query(db.func.max(Notification.id)).filter_by(user_id=user_id).scalar() or 0
+
+
+@notifications_bp.route('/stream', methods=['GET'])
+def stream_notifications() -> Response | tuple[Response, int]:
+    """
+    Server-Sent Events поток с новите известия.
+
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
+    Повторно свързване: header Last-Event-ID (или ?last_event_id=) -
+    изпращат се известията с id > Last-Event-ID, после новите. Ако
+    пропуснатите са повече от STREAM_BACKLOG_LIMIT, вместо тях идва
+    събитие resync - клиентът презарежда списъка с GET /api/notifications.
+    """
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Невалиден Last-Event-ID'}), 400
+
+    if last_id is None:
+        # Ново свързване - само известията от тук нататък. Границата се чете
+        # ПРЕДИ абонамента: записаното между двете идва от backlog-а отдолу.
+        last_id = _max_notification_id(user.id)
+
+    # Абонираме се ПРЕДИ четенето на backlog-а - известие, записано между
+    # двете, идва по опашката (дубликатите се филтрират по id)
+    subscription = notification_broker.subscribe(
+        user.id, current_app.config['NOTIFICATION_STREAM_QUEUE_SIZE']
+    )
+
+    missed = (
+        Notification.query
+        .filter(Notification.user_id == user.id, Notification.id > last_id)
+        .order_by(Notification.id)
+        .limit(STREAM_BACKLOG_LIMIT + 1)
+        .all()
+    )
+    resync = len(missed) > STREAM_BACKLOG_LIMIT
+    if resync:
+        backlog: list[dict] = []
+        last_id = _max_notification_id(user.id)
+    else:
+        backlog = [n.to_dict() for n in missed]
+
+    stream = _event_stream(
+        subscription, backlog, last_id, current_app.config['NOTIFICATION_STREAM_HEARTBEAT_SECONDS'], resync
+    )
+    response = Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Ако клиентът се откаже преди първото събитие, генераторът не стартира
+    # и неговият finally не се изпълнява - затова и тук
+    response.call_on_close(lambda: notification_broker.unsubscribe(subscription))
+    return response
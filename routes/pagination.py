@@ -0,0 +1,96 @@
+"""
+Помощни функции за keyset (cursor) пагинация.
+
+Вместо OFFSET (който кара базата да прочете и изхвърли всички предишни
+редове), клиентът получава курсор - стойностите на ключа за сортиране
+на последния ред. Следващата страница започва с WHERE (ключ, id) > курсор,
+което е едно търсене в индекса - цената е O(страница), не O(offset).
+
+Договорка за отговорите:
+    - Тялото остава същото (списък или речник)
+    - Курсорът за следващата страница е в хедъра X-Next-Cursor
+      (липсва, ако това е последната страница)
+"""
+import base64
+import json
+from typing import Any, Callable, Optional, Sequence
+from flask import request, jsonify, Response
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Типове на стойностите в курсора (за decode_cursor(token, types))
+ID_CURSOR = (int,)                   # [id]
+SORT_VALUE = (int, float, type(None))  # стойност на числова колона (може да е NULL)
+
+
+def encode_cursor(values: list) -> str:
+    """Кодира стойностите на ключа в непрозрачен (за клиента) низ."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str], types: Optional[Sequence] = None) -> Optional[list]:
+    """
+    Декодира курсор от query параметъра.
+
+    Параметри:
+        token: Стойността на ?cursor=
+        types: Позволените типове на всяка стойност поред (напр. ID_CURSOR или
+               (SORT_VALUE, int)) - проверява и броя им. Курсорът идва от клиента,
+               а грешен тип в WHERE (ключ, id) > курсор дава 500 вместо 400.
+
+    Връща:
+        Списък със стойностите или None ако няма курсор
+
+    Изключения:
+        ValueError: Ако курсорът е невалиден
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Невалиден курсор') from e
+    if not isinstance(values, list):
+        raise ValueError('Невалиден курсор')
+    if types is not None and (len(values) != len(types) or not all(
+        isinstance(value, allowed) and not isinstance(value, bool) for value, allowed in zip(values, types)
+    )):
+        raise ValueError('Невалиден курсор')
+    return values
+
+
+def get_page_limit(default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Чете ?limit= и го ограничава в интервала [1, MAX_PAGE_SIZE]."""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def split_page(rows: list, limit: int,
+               cursor_key: Callable[[Any], list]) -> tuple[list, Optional[str]]:
+    """
+    Отделя страницата от "+1" реда, който показва дали има още.
+
+    Параметри:
+        rows: Резултатът от заявка с LIMIT limit + 1
+        limit: Размер на страницата
+        cursor_key: Функция ред -> стойности на ключа (за курсора)
+
+    Връща:
+        (редовете на страницата, курсор за следващата или None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(cursor_key(page[-1]))
+
+
+def page_response(payload: Any, next_cursor: Optional[str]) -> Response:
+    """jsonify + хедър X-Next-Cursor, ако има следваща страница."""
+    response = jsonify(payload)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -5,17 +5,31 @@
 - CRUD операции за резервации
 - Свободни часове (available-slots)
 - История на обслужвания
+- Брой резервации по ден/седмица (timeseries)
 """
 from flask import Blueprint, request, jsonify, Response
 from typing import Any
-from datetime import datetime
+from datetime import datetime, timedelta
 from db import db
-from models.reservation import Reservation, ReservationStatus
+from models.reservation import Reservation, ReservationStatus, ACTIVE_STATUSES
+from models.reservation_rollup import GRANULARITIES, reservation_series
 from models.service import Service
-from models.user import RegisteredUser, Provider, UserRole
+from models.events import EventType
+from models.user import RegisteredUser, UserRole
+from routes.identity import current_user, current_user_id, current_role
 
 reservations_bp = Blueprint('reservations', __name__)
 
+# Най-дългият период на /timeseries (около 3 години по дни)
+MAX_TIMESERIES_DAYS = 1100
+
+# Нов статус -> събитие, както в Provider.confirm/reject/complete_reservation
+STATUS_EVENTS = {
+    ReservationStatus.CONFIRMED: EventType.RESERVATION_CONFIRMED,
+    ReservationStatus.CANCELED: EventType.RESERVATION_REJECTED,
+    ReservationStatus.COMPLETED: EventType.RESERVATION_COMPLETED,
+}
+
 
 # ==================== СПЕЦИФИЧНИ МАРШРУТИ (ПРЕДИ WILDCARD) ====================
 
@@ -47,22 +61,18 @@ def get_available_slots() -> tuple[Response, int]:
         return jsonify({'error': 'Невалиден формат на датата. Използвайте YYYY-MM-DD'}), 400
 
     # Определяме работно време (по подразбиране 09:00 - 18:00)
-    work_start = 9   # 09:00
-    work_end = 18    # 18:00
-
-    # Ако услугата има дефинирано работно време
-    if service.working_hours_start and service.working_hours_end:
-        work_start = service.working_hours_start.hour
-        work_end = service.working_hours_end.hour
+    work_start, work_end = service.get_working_hours()
 
     # Продължителност на услугата (по подразбиране 60 минути)
     duration_minutes = service.duration or 60
 
-    # Вземаме резервациите за този ден и услуга
+    # Вземаме резервациите за този ден и услуга (интервал по datetime -> индекс (service_id, datetime))
+    day_start = datetime.combine(target_date, datetime.min.time())
     existing_reservations = Reservation.query.filter(
         Reservation.service_id == service_id,  # type: ignore[arg-type]
-        db.func.date(Reservation.datetime) == target_date,  # type: ignore[arg-type]
-        Reservation.status.in_([ReservationStatus.PENDING, ReservationStatus.CONFIRMED])  # type: ignore[attr-defined]
+        Reservation.datetime >= day_start,  # type: ignore[arg-type]
+        Reservation.datetime < day_start + timedelta(days=1),  # type: ignore[arg-type]
+        Reservation.status.in_(ACTIVE_STATUSES)  # type: ignore[attr-defined]
     ).all()
 
     # Създаваме set с заети часове (set comprehension)
@@ -89,14 +99,14 @@ def get_reservation_history() -> tuple[Response, int]:
     """
     Връща историята на обслужванията за потребител.
 
-    Очаква header: X-User-ID
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
     Query параметри:
         role: 'customer' или 'provider' (по подразбиране 'customer')
 
     Връща:
         Списък с COMPLETED резервации
     """
-    user_id = request.headers.get('X-User-ID')
+    user_id = current_user_id()
     if not user_id:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
@@ -105,13 +115,13 @@ def get_reservation_history() -> tuple[Response, int]:
     if role == 'provider':
         # История като сервиз
         reservations = Reservation.query.filter_by(
-            provider_id=int(user_id),
+            provider_id=user_id,
             status=ReservationStatus.COMPLETED
         ).order_by(Reservation.datetime.desc()).all()
     else:
         # История като клиент
         reservations = Reservation.query.filter_by(
-            customer_id=int(user_id),
+            customer_id=user_id,
             status=ReservationStatus.COMPLETED
         ).order_by(Reservation.datetime.desc()).all()
 
@@ -124,6 +134,56 @@ def get_reservation_history() -> tuple[Response, int]:
     }), 200
 
 
+@reservations_bp.route('/timeseries', methods=['GET'])
+def get_reservation_timeseries() -> tuple[Response, int]:
+    """
+    Брой резервации по ден/седмица за графики (от дневните обобщения).
+
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
+    Query параметри:
+        from, to: Период във формат YYYY-MM-DD (по подразбиране последните 30 дни)
+        granularity: day (по подразбиране) или week
+        provider_id: Доставчик (само за Admin - доставчикът вижда своите резервации)
+        service_id: Само за тази услуга
+
+    Връща:
+        Списък с period, pending, confirmed, canceled, completed, total
+
+    Само за Provider и Admin - обобщенията са по доставчик, затова за
+    клиент (роля user) няма какво да се покаже и отговорът е 403.
+    """
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+    role = current_role()
+    if role not in (UserRole.PROVIDER, UserRole.ADMIN):
+        return jsonify({'error': 'Само доставчици и администратори'}), 403
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'Невалидна грануларност. Валидни: {list(GRANULARITIES)}'}), 400
+
+    try:
+        end = datetime.strptime(request.args.get('to', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        default_start = (end - timedelta(days=29)).isoformat()
+        start = datetime.strptime(request.args.get('from', default_start), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Невалидна дата. Използвайте формат YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'error': 'Началото на периода е след края му'}), 400
+    if (end - start).days >= MAX_TIMESERIES_DAYS:
+        return jsonify({'error': f'Периодът е най-много {MAX_TIMESERIES_DAYS} дни'}), 400
+
+    provider_id = request.args.get('provider_id', type=int)
+    if role != UserRole.ADMIN:
+        provider_id = user_id
+
+    series = reservation_series(start, end, provider_id=provider_id,
+                                service_id=request.args.get('service_id', type=int),
+                                granularity=granularity)
+    return jsonify(series), 200
+
+
 # ==================== ОСНОВНИ CRUD МАРШРУТИ ====================
 
 @reservations_bp.route('', methods=['GET'])
@@ -178,14 +238,13 @@ def create_reservation() -> tuple[Response, int]:
     """
     Създава нова резервация.
 
-    Очаква header: X-User-ID
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
     Очаква JSON: datetime, service_id, notes, problem_image_url (незадължително)
     """
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
+    if not current_user_id():
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
+    user = current_user()
     if not user:
         return jsonify({'error': 'Потребителят не съществува'}), 404
 
@@ -250,6 +309,9 @@ def update_reservation(reservation_id: int) -> tuple[Response, int]:
     if 'problem_image_url' in data:
         reservation.problem_image_url = data['problem_image_url']
 
+    # Доставчикът получава известие, както при RegisteredUser.update_reservation
+    if db.session.is_modified(reservation):
+        RegisteredUser.publish_booking_event(EventType.RESERVATION_UPDATED, reservation)
     db.session.commit()
 
     return jsonify({'message': 'Резервацията е обновена'}), 200
@@ -271,7 +333,14 @@ def update_reservation_status(reservation_id: int) -> tuple[Response, int]:
     if data['status'] not in valid_statuses:
         return jsonify({'error': f'Невалиден статус. Валидни: {valid_statuses}'}), 400
 
-    reservation.status = ReservationStatus(data['status'])
+    status = ReservationStatus(data['status'])
+    if status != reservation.status:
+        event_type = STATUS_EVENTS.get(status)
+        if status == ReservationStatus.CANCELED and current_user_id() == reservation.customer_id:
+            event_type = EventType.RESERVATION_CANCELED  # Отмяна от клиента - известие за доставчика
+        reservation.status = status
+        if event_type:
+            RegisteredUser.publish_booking_event(event_type, reservation)
     db.session.commit()
 
     return jsonify({'message': 'Статусът е обновен'}), 200
@@ -285,6 +354,9 @@ def delete_reservation(reservation_id: int) -> tuple[Response, int]:
     if not reservation:
         return jsonify({'error': 'Резервацията не е намерена'}), 404
 
+    # Изтриването на активна резервация е отмяна - доставчикът получава известие
+    if reservation.status in ACTIVE_STATUSES:
+        RegisteredUser.publish_booking_event(EventType.RESERVATION_CANCELED, reservation)
     db.session.delete(reservation)
     db.session.commit()
 
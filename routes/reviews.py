@@ -1,18 +1,36 @@
+import io
 from flask import Blueprint, request, jsonify, Response
 from typing import Any
 from db import db
+from models.leaderboard import leaderboard
 from models.review import Review
+from models.review_import import detect_format, import_reviews
 from models.service import Service
-from models.user import RegisteredUser
+from models.user import UserRole
+from routes.identity import current_user, current_user_id, current_role
+from routes.pagination import ID_CURSOR, decode_cursor, get_page_limit, split_page, page_response
 
 reviews_bp = Blueprint('reviews', __name__)
 
 
 @reviews_bp.route('', methods=['GET'])
 def get_reviews() -> tuple[Response, int]:
-    """Връща ревюта."""
+    """
+    Връща ревюта (най-новите първо, keyset пагинация).
+
+    Query параметри:
+        service_id: Филтрира по услуга
+        user_id: Филтрира по автор
+        limit: Брой ревюта (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
     service_id = request.args.get('service_id', type=int)
     user_id = request.args.get('user_id', type=int)
+
+    try:
+        after = decode_cursor(request.args.get('cursor'), ID_CURSOR)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     query = Review.query
     
@@ -20,19 +38,14 @@ def get_reviews() -> tuple[Response, int]:
         query = query.filter_by(service_id=service_id)
     if user_id:
         query = query.filter_by(user_id=user_id)
+    if after:
+        query = query.filter(Review.id < after[0])
+
+    limit = get_page_limit()
+    reviews = query.order_by(Review.id.desc()).limit(limit + 1).all()
+    page, next_cursor = split_page(reviews, limit, lambda r: [r.id])
     
-    reviews = query.all()
-    result = []
-    for r in reviews:
-        result.append({
-            'id': r.id,
-            'rating': r.rating,
-            'comment': r.comment,
-            'user_id': r.user_id,
-            'service_id': r.service_id
-        })
-    
-    return jsonify(result), 200
+    return page_response([r.to_dict() for r in page], next_cursor), 200
 
 
 @reviews_bp.route('/<int:review_id>', methods=['GET'])
@@ -56,14 +69,13 @@ def create_review() -> tuple[Response, int]:
     """
     Създава ревю.
     
-    Очаква header: X-User-ID
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
     Очаква JSON: rating, service_id, comment (незадължително)
     """
-    user_id = request.headers.get('X-User-ID')
-    if not user_id:
+    if not current_user_id():
         return jsonify({'error': 'Не сте влезли в системата'}), 401
     
-    user = RegisteredUser.query.get(int(user_id))
+    user = current_user()
     if not user:
         return jsonify({'error': 'Потребителят не съществува'}), 404
     
@@ -92,7 +104,47 @@ def delete_review(review_id: int) -> tuple[Response, int]:
     if not review:
         return jsonify({'error': 'Ревюто не е намерено'}), 404
     
+    service_id, rating = review.service_id, review.rating
     db.session.delete(review)
+    generation = leaderboard.generation
     db.session.commit()
+
+    leaderboard.record_review(service_id, rating, -1, generation)
     
     return jsonify({'message': 'Ревюто е изтрито'}), 200
+
+
+@reviews_bp.route('/import', methods=['POST'])
+def import_reviews_file() -> tuple[Response, int]:
+    """
+    Масов импорт на ревюта (само Admin).
+
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим)
+    Тяло: multipart поле "file" или суровото съдържание на файла
+    Query параметри:
+        format: csv или ndjson (по подразбиране - по името на файла / Content-Type)
+    """
+    if not current_user_id():
+        return jsonify({'error': 'Не сте влезли в системата'}), 401
+
+    if current_role(fresh=True) != UserRole.ADMIN:
+        return jsonify({'error': 'Нямате права'}), 403
+
+    upload = request.files.get('file')
+    if upload is not None:
+        raw_stream = upload.stream
+        file_format = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+    else:
+        raw_stream = request.stream
+        file_format = request.args.get('format') or detect_format(None, request.content_type)
+
+    if file_format is None:
+        return jsonify({'error': 'Не може да се познае форматът (параметър format)'}), 400
+
+    try:
+        stream = io.TextIOWrapper(raw_stream, encoding='utf-8', newline='')
+        report = import_reviews(stream, file_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(report), 200
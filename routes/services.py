@@ -3,17 +3,85 @@ from typing import Any
 from datetime import date
 from db import db
 from models.service import Service
-from models.user import RegisteredUser, Provider, UserRole, Guest
+from models.cascade_delete import delete_services
+from models.leaderboard import leaderboard
+from models.user import UserRole, Guest
+from routes.identity import current_user_id, current_role
+from routes.pagination import (
+    ID_CURSOR, SORT_VALUE, decode_cursor, get_page_limit, split_page, page_response
+)
 
 services_bp = Blueprint('services', __name__)
 
 
 @services_bp.route('', methods=['GET'])
 def get_all_services() -> tuple[Response, int]:
-    """Връща всички услуги."""
-    services = Service.query.all()
-    result = [s.to_dict() for s in services]
-    return jsonify(result), 200
+    """
+    Връща страница от каталога с услуги.
+
+    Query параметри:
+        sort: id (по подразбиране), price, duration, rating, bookings, favorites
+        order: asc (по подразбиране) или desc
+        limit: Брой услуги (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
+    sort = request.args.get('sort', 'id')
+    if sort not in Service.SORT_KEYS:
+        return jsonify({'error': f'Невалидно сортиране. Валидни: {list(Service.SORT_KEYS)}'}), 400
+
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'Невалиден ред. Използвайте asc или desc'}), 400
+
+    try:
+        after = decode_cursor(request.args.get('cursor'), ID_CURSOR if sort == 'id' else (SORT_VALUE, int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    services = Service.catalog_page(sort=sort, descending=order == 'desc', limit=limit + 1, after=after)
+    page, next_cursor = split_page(services, limit, lambda s: s.cursor_for(sort))
+
+    return page_response([s.to_dict() for s in page], next_cursor), 200
+
+
+@services_bp.route('/most-favorited', methods=['GET'])
+def get_most_favorited_services() -> tuple[Response, int]:
+    """
+    Най-често добавяните в любими услуги (по favorite_count, низходящо).
+
+    Query параметри:
+        limit: Брой услуги (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
+    try:
+        after = decode_cursor(request.args.get('cursor'), (SORT_VALUE, int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
+    # Индексът (favorite_count, id) се чете отзад напред - без сканиране на favorites
+    services = Service.catalog_page(sort='favorites', descending=True, limit=limit + 1, after=after)
+    page, next_cursor = split_page(services, limit, lambda s: s.cursor_for('favorites'))
+
+    return page_response([s.to_dict() for s in page], next_cursor), 200
+
+
+@services_bp.route('/top', methods=['GET'])
+def get_top_services() -> tuple[Response, int]:
+    """
+    Най-добре оценените услуги в категория (Байесова средна оценка).
+
+    Query параметри:
+        category: Име на категорията (задължително)
+        limit: Брой (по подразбиране и максимум LEADERBOARD_SIZE)
+    """
+    category = request.args.get('category')
+    if not category:
+        return jsonify({'error': 'Липсва параметър category'}), 400
+
+    limit = request.args.get('limit', type=int)
+    return jsonify(leaderboard.top(category, limit)), 200
 
 
 @services_bp.route('/<int:service_id>', methods=['GET'])
@@ -33,43 +101,32 @@ def create_service() -> tuple[Response, int]:
     """
     Създава нова услуга.
 
-    Очаква header: X-User-ID (трябва да е Provider или Admin)
+    Очаква header: Authorization: Bearer <токен> (X-User-ID - само в демо режим);
+    потребителят трябва да е Provider или Admin
     """
-    user_id = request.headers.get('X-User-ID')
+    user_id = current_user_id()
     if not user_id:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
-    if not user or user.role not in [UserRole.PROVIDER, UserRole.ADMIN]:
+    if current_role(fresh=True) not in [UserRole.PROVIDER, UserRole.ADMIN]:
         return jsonify({'error': 'Нямате права да създавате услуги'}), 403
 
     data: dict[str, Any] | None = request.get_json()
     if not data or not data.get('name') or not data.get('category'):
         return jsonify({'error': 'Липсват задължителни полета (name, category)'}), 400
 
-    provider = db.session.get(Provider, int(user_id))
-    if not provider:
-        service = Service(
-            name=data['name'],
-            category=data['category'],
-            provider_id=int(user_id),
-            description=data.get('description'),
-            price=data.get('price', 0.0),
-            duration=data.get('duration', 60),
-            availability=data.get('availability'),
-            image_url=data.get('image_url')
-        )
-        db.session.add(service)
-        db.session.commit()
-    else:
-        service = provider.create_service(
-            name=data['name'],
-            description=data.get('description', ''),
-            category=data['category'],
-            price=data.get('price', 0.0),
-            duration=data.get('duration', 60),
-            availability=data.get('availability')
-        )
+    service = Service(
+        name=data['name'],
+        category=data['category'],
+        provider_id=user_id,
+        description=data.get('description'),
+        price=data.get('price', 0.0),
+        duration=data.get('duration', 60),
+        availability=data.get('availability'),
+        image_url=data.get('image_url')
+    )
+    db.session.add(service)
+    db.session.commit()
 
     return jsonify({'message': 'Услугата е създадена', 'service_id': service.id}), 201
 
@@ -77,12 +134,12 @@ def create_service() -> tuple[Response, int]:
 @services_bp.route('/<int:service_id>', methods=['PUT'])
 def update_service(service_id: int) -> tuple[Response, int]:
     """Обновява услуга."""
-    user_id = request.headers.get('X-User-ID')
+    user_id = current_user_id()
     if not user_id:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
-    if not user:
+    role = current_role(fresh=True)
+    if role is None:
         return jsonify({'error': 'Потребителят не е намерен'}), 404
 
     data: dict[str, Any] | None = request.get_json()
@@ -93,7 +150,7 @@ def update_service(service_id: int) -> tuple[Response, int]:
     if not service:
         return jsonify({'error': 'Услугата не е намерена'}), 404
 
-    if service.provider_id != int(user_id) and user.role != UserRole.ADMIN:
+    if service.provider_id != user_id and role != UserRole.ADMIN:
         return jsonify({'error': 'Нямате права да редактирате тази услуга'}), 403
 
     if 'name' in data:
@@ -118,23 +175,22 @@ def update_service(service_id: int) -> tuple[Response, int]:
 @services_bp.route('/<int:service_id>', methods=['DELETE'])
 def delete_service(service_id: int) -> tuple[Response, int]:
     """Изтрива услуга."""
-    user_id = request.headers.get('X-User-ID')
+    user_id = current_user_id()
     if not user_id:
         return jsonify({'error': 'Не сте влезли в системата'}), 401
 
-    user = db.session.get(RegisteredUser, int(user_id))
-    if not user:
+    role = current_role(fresh=True)
+    if role is None:
         return jsonify({'error': 'Потребителят не е намерен'}), 404
 
     service = db.session.get(Service, service_id)
     if not service:
         return jsonify({'error': 'Услугата не е намерена'}), 404
 
-    if service.provider_id != int(user_id) and user.role != UserRole.ADMIN:
+    if service.provider_id != user_id and role != UserRole.ADMIN:
         return jsonify({'error': 'Нямате права да изтриете тази услуга'}), 403
 
-    db.session.delete(service)
-    db.session.commit()
+    delete_services(Service.id == service_id)
     return jsonify({'message': 'Услугата е изтрита'}), 200
 
 
@@ -147,6 +203,7 @@ def search_services() -> tuple[Response, int]:
         name: Част от името
         category: Категория
         date: Дата (YYYY-MM-DD)
+        facets: 'true' - връща {'results': [...], 'facets': {...}} вместо списък
     """
     name = request.args.get('name')
     category = request.args.get('category')
@@ -162,12 +219,41 @@ def search_services() -> tuple[Response, int]:
     guest = Guest()
     result = guest.search_services(name=name, category=category, date_on=date_on)
 
+    if request.args.get('facets', '').lower() == 'true':
+        facets = guest.search_facets(name=name, category=category, date_on=date_on)
+        return jsonify({'results': result, 'facets': facets}), 200
+
     return jsonify(result), 200
 
 
 @services_bp.route('/<int:service_id>/reviews', methods=['GET'])
 def get_service_reviews(service_id: int) -> tuple[Response, int]:
-    """Връща ревютата за услуга."""
+    """
+    Връща ревютата за услуга (най-новите първо, keyset пагинация).
+
+    Query параметри:
+        limit: Брой ревюта (по подразбиране 20, максимум 100)
+        cursor: Стойността от хедъра X-Next-Cursor на предишната страница
+    """
+    try:
+        after = decode_cursor(request.args.get('cursor'), ID_CURSOR)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = get_page_limit()
     guest = Guest()
-    reviews = guest.view_reviews(service_id)
-    return jsonify(reviews), 200
+    reviews = guest.view_reviews(service_id, limit=limit + 1, before_id=after[0] if after else None)
+    page, next_cursor = split_page(reviews, limit, lambda r: [r['id']])
+    return page_response(page, next_cursor), 200
+
+
+@services_bp.route('/<int:service_id>/reviews/summary', methods=['GET'])
+def get_service_rating_summary(service_id: int) -> tuple[Response, int]:
+    """Брой, средна оценка и хистограма по звезди (без четене на ревютата)."""
+    guest = Guest()
+    summary = guest.view_rating_summary(service_id)
+
+    if not summary:
+        return jsonify({'error': 'Услугата не е намерена'}), 404
+
+    return jsonify(summary), 200
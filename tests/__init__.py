@@ -1,2 +1,9 @@
 # Този файл прави tests/ да е Python пакет
-# Празен е, но е задължителен за unittest discover
+# Задължителен е за unittest discover
+
+import os
+
+# Тестовете използват SECRET_KEY по подразбиране и X-User-ID (main.py ги позволява само при TESTING)
+os.environ.setdefault('FLASK_TESTING', '1')
+# Известията от събитията се записват веднага след commit (фоновият запис - с flush() в тестовете му)
+os.environ.setdefault('NOTIFICATION_WRITE_INTERVAL_SECONDS', '0')
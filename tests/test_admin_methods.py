@@ -17,6 +17,7 @@ import unittest
 import sys
 import os
 from datetime import datetime, timedelta
+from sqlalchemy import event
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -24,8 +25,13 @@ from main import app
 from db import db
 from models.user import RegisteredUser, Provider, Admin, UserRole
 from models.service import Service
+from models.category import Category
 from models.review import Review
+from models.favorite import Favorite
+from models.notification import Notification, NotificationType
 from models.reservation import Reservation, ReservationStatus
+from models.reservation_rollup import ReservationRollup
+from models.platform_stats import compute_statistics, get_platform_statistics, invalidate_statistics_cache
 
 
 def make_reservation(customer_id: int, provider_id: int, service_id: int,
@@ -63,6 +69,8 @@ class TestAdminMethods(unittest.TestCase):
 
     def setUp(self):
         """Изпълнява се ПРЕДИ всеки тест."""
+        db.session.query(Notification).delete()
+        db.session.query(Favorite).delete()
         db.session.query(Reservation).delete()
         db.session.query(Review).delete()
         db.session.query(Service).delete()
@@ -315,6 +323,122 @@ class TestAdminMethods(unittest.TestCase):
         result = self.admin.delete_category('NonExistent')
         self.assertFalse(result)
 
+    def test_rename_category_is_single_row_update(self):
+        """Тест: преименуването променя реда в categories, не услугите."""
+        category_id = self.service.category_id
+
+        self.admin.rename_category('Test Category', 'Renamed Category')
+
+        category = db.session.get(Category, category_id)
+        assert category is not None
+        self.assertEqual(category.name, 'Renamed Category')
+        self.assertEqual(self.service.category_id, category_id)
+
+    def test_rename_category_merges_into_existing(self):
+        """Тест: преименуване към съществуваща категория слива двете."""
+        other = Service(name='Other', category='Other Category', provider_id=self.provider.id)
+        db.session.add(other)
+        db.session.commit()
+
+        result = self.admin.rename_category('Test Category', 'Other Category')
+
+        self.assertEqual(result, 1)
+        self.assertEqual(self.admin.get_all_categories(), ['Other Category'])
+        self.assertEqual(self.service.category, 'Other Category')
+        self.assertIsNone(Category.get_by_name('Test Category'))
+
+    def test_get_all_categories_skips_empty(self):
+        """Тест: категория без услуги не се връща в списъка."""
+        db.session.add(Category(name='Empty Category'))
+        db.session.commit()
+
+        self.assertNotIn('Empty Category', self.admin.get_all_categories())
+
+    def test_delete_category_removes_category_row(self):
+        """Тест: delete_category() изтрива и реда в categories."""
+        self.admin.delete_category('Test Category')
+        self.assertIsNone(Category.get_by_name('Test Category'))
+
+    # ==================== CASCADE DELETE TESTS ====================
+
+    def _add_dependents(self, customer: RegisteredUser, service: Service) -> None:
+        """Резервация, ревю, любима и известие на customer за service."""
+        db.session.add(make_reservation(
+            customer_id=customer.id,
+            provider_id=service.provider_id,
+            service_id=service.id,
+            scheduled_time=datetime.now() + timedelta(days=1)
+        ))
+        db.session.add(Review(user_id=customer.id, service_id=service.id, rating=5))
+        db.session.add(Favorite(user_id=customer.id, service_id=service.id))
+        db.session.add(Notification(customer.id, 'Test', NotificationType.RESERVATION_CONFIRMED))
+        db.session.commit()
+
+    def test_delete_user_removes_dependents(self):
+        """Тест: delete_user() трие резервациите, ревютата, любимите и известията му."""
+        self._add_dependents(self.user, self.service)
+        service_id = self.service.id
+
+        self.assertTrue(self.admin.delete_user(self.user.id))
+
+        for model in (Reservation, Review, Favorite, Notification):
+            self.assertEqual(db.session.query(model).count(), 0, model.__name__)
+        service = db.session.get(Service, service_id)
+        self.assertEqual((service.booking_count, service.favorite_count, service.rating_count), (0, 0, 0))
+        self.assertEqual(db.session.query(db.func.sum(ReservationRollup.pending)).scalar(), 0)
+        self.assertEqual(get_platform_statistics(max_age=0), compute_statistics())
+
+    def test_delete_provider_removes_services(self):
+        """Тест: изтрит доставчик - услугите му и всичко към тях изчезват."""
+        self._add_dependents(self.user, self.service)
+
+        self.assertTrue(self.admin.delete_user(self.provider.id))
+
+        self.assertEqual(Service.query.count(), 0)
+        self.assertEqual(Reservation.query.count(), 0)
+        self.assertEqual(Review.query.count(), 0)
+        self.assertIsNotNone(db.session.get(RegisteredUser, self.user.id))
+        self.assertEqual(get_platform_statistics(max_age=0), compute_statistics())
+
+    def test_delete_any_service_removes_dependents(self):
+        """Тест: delete_any_service() трие резервациите, ревютата и любимите на услугата."""
+        self._add_dependents(self.user, self.service)
+
+        self.assertTrue(self.admin.delete_any_service(self.service.id))
+
+        for model in (Reservation, Review, Favorite):
+            self.assertEqual(db.session.query(model).count(), 0, model.__name__)
+        self.assertEqual(Notification.query.count(), 1)  # Известията са на потребителя
+        self.assertEqual(get_platform_statistics(max_age=0), compute_statistics())
+
+    def test_delete_category_deletes_in_batches(self):
+        """Тест: delete_category() трие на пакети - една DELETE заявка за services на пакет."""
+        for i in range(4):
+            service = Service(name=f'Extra {i}', category='Test Category', provider_id=self.provider.id)
+            db.session.add(service)
+            db.session.commit()
+            self._add_dependents(self.user, service)
+        statements = []
+
+        def count_statement(_conn, _cursor, statement, *_args):
+            if statement.lstrip().upper().startswith('DELETE FROM SERVICES'):
+                statements.append(statement)
+
+        app.config['CASCADE_DELETE_BATCH_SIZE'] = 2
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            count = self.admin.delete_category('Test Category')
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+            app.config['CASCADE_DELETE_BATCH_SIZE'] = 500
+
+        self.assertEqual(count, 5)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(Reservation.query.count(), 0)
+        self.assertEqual(Review.query.count(), 0)
+        self.assertEqual(Favorite.query.count(), 0)
+
     # ==================== GET STATISTICS TESTS ====================
 
     def test_get_statistics(self):
@@ -352,6 +476,111 @@ class TestAdminMethods(unittest.TestCase):
         self.assertGreaterEqual(stats['total_reservations'], 1)
         self.assertGreaterEqual(stats['total_reviews'], 1)
 
+    def test_statistics_counters_follow_writes(self):
+        """Тест: броячите съвпадат с пълното преброяване след ORM записи."""
+        reservation = make_reservation(
+            customer_id=self.user.id,
+            provider_id=self.provider.id,
+            service_id=self.service.id,
+            scheduled_time=datetime.now() + timedelta(days=1)
+        )
+        db.session.add(reservation)
+        db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=4))
+        db.session.commit()
+        self.assertEqual(get_platform_statistics(max_age=0), compute_statistics())
+        self.assertEqual(get_platform_statistics(max_age=0)['pending_reservations'], 1)
+
+        reservation.status = ReservationStatus.CONFIRMED
+        self.admin.change_user_role(self.user.id, UserRole.PROVIDER)
+        db.session.commit()
+
+        stats = get_platform_statistics(max_age=0)
+        self.assertEqual(stats, compute_statistics())
+        self.assertEqual(stats['pending_reservations'], 0)
+        self.assertEqual(stats['total_users'], 0)
+        self.assertEqual(stats['total_providers'], 2)
+
+    def test_statistics_bulk_delete_recomputes_counters(self):
+        """Тест: query.delete() минава покрай събитията - броячите се преизчисляват."""
+        db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=4))
+        db.session.commit()
+        db.session.query(Review).delete()
+        db.session.commit()
+
+        self.assertEqual(get_platform_statistics(max_age=0)['total_reviews'], 0)
+
+    def test_statistics_are_cached(self):
+        """Тест: повторното четене в рамките на max_age не стига до базата."""
+        invalidate_statistics_cache()
+        statements = []
+
+        def count_statement(_conn, _cursor, statement, *_args):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            first = self.admin.get_statistics()
+            second = self.admin.get_statistics()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(statements), 1)
+
+    def test_statistics_cache_cleared_after_commit_and_rollback(self):
+        """Тест: кешът се изчиства след commit (не при flush) и след rollback."""
+        before = self.admin.get_statistics()
+        db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=4))
+        db.session.flush()
+        during = get_platform_statistics(max_age=0)  # Кешира некомитнатия брояч
+        db.session.rollback()
+        self.assertEqual(during['total_reviews'], before['total_reviews'] + 1)
+        self.assertEqual(self.admin.get_statistics(), before)
+
+        db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=4))
+        db.session.commit()
+        self.assertEqual(self.admin.get_statistics()['total_reviews'], before['total_reviews'] + 1)
+
+    def test_statistics_not_cached_if_invalidated_while_reading(self):
+        """Тест: commit по време на четенето -> прочетените стойности не се кешират."""
+        invalidate_statistics_cache()
+        reads = []
+
+        def concurrent_commit(_conn, _cursor, statement, *_args):
+            if 'platform_counters' in statement and statement.lstrip().upper().startswith('SELECT'):
+                reads.append(statement)
+                if len(reads) == 1:
+                    invalidate_statistics_cache()  # Както after_commit на друга заявка
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', concurrent_commit)
+        try:
+            for _ in range(3):
+                get_platform_statistics(max_age=60)
+        finally:
+            event.remove(engine, 'before_cursor_execute', concurrent_commit)
+
+        self.assertEqual(len(reads), 2)
+
+    def test_compute_statistics_is_single_query(self):
+        """Тест: пълното преброяване е една заявка."""
+        statements = []
+
+        def count_statement(_conn, _cursor, statement, *_args):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            stats = compute_statistics()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(stats['total_admins'], 1)
+        self.assertEqual(stats['total_services'], 1)
+
 
 class TestAdminReservationRoutes(unittest.TestCase):
     """Тестове за admin reservation routes."""
@@ -0,0 +1,297 @@
+"""
+Тестове за администраторския API (routes/admin.py).
+
+Тества:
+    - Достъп само за Admin
+    - Keyset пагинация и филтри на списъците
+    - Масово изтриване и смяна на роля
+"""
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from db import db
+from models.user import RegisteredUser, Provider, Admin, UserRole
+from models.service import Service
+from models.review import Review
+from models.reservation import Reservation, ReservationStatus
+from models.platform_stats import compute_statistics, get_platform_statistics
+
+
+class TestAdminRoutes(unittest.TestCase):
+    """Тестове за /api/admin."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Създава тестова база данни."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['TESTING'] = True
+        cls.app = app
+        cls.client = app.test_client()
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Изтрива тестовата база данни."""
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        """Изпълнява се ПРЕДИ всеки тест."""
+        db.session.query(Reservation).delete()
+        db.session.query(Review).delete()
+        db.session.query(Service).delete()
+        db.session.query(RegisteredUser).delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.admin = Admin(username='admin', email='admin@test.com')
+        self.admin.set_password('admin123')
+        self.provider = Provider(username='provider', email='provider@test.com')
+        self.provider.set_password('password123')
+        db.session.add_all([self.admin, self.provider])
+        self.users = []
+        for i in range(5):
+            user = RegisteredUser(username=f'user{i}', email=f'user{i}@test.com')
+            user.set_password('password123')
+            self.users.append(user)
+        db.session.add_all(self.users)
+        db.session.commit()
+
+        self.service = Service(name='Test Service', category='Test Category', provider_id=self.provider.id)
+        db.session.add(self.service)
+        db.session.commit()
+
+        self.admin_headers = {'X-User-ID': str(self.admin.id)}
+
+    def test_requires_login(self):
+        """Тест: без идентичност -> 401."""
+        response = self.client.get('/api/admin/users')
+        self.assertEqual(response.status_code, 401)
+
+    def test_requires_admin(self):
+        """Тест: потребител без роля admin -> 403."""
+        response = self.client.get('/api/admin/users', headers={'X-User-ID': str(self.provider.id)})
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_users_pages(self):
+        """Тест: страниците с потребители се обхождат с курсора."""
+        response = self.client.get('/api/admin/users?limit=3', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        first = response.get_json()
+        self.assertEqual(len(first), 3)
+        cursor = response.headers['X-Next-Cursor']
+
+        response = self.client.get(f'/api/admin/users?limit=4&cursor={cursor}', headers=self.admin_headers)
+        second = response.get_json()
+        self.assertEqual(len(second), 4)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        self.assertLess(first[-1]['id'], second[0]['id'])
+
+    def test_list_users_filters(self):
+        """Тест: филтри по роля и начало на името."""
+        response = self.client.get('/api/admin/users?role=provider', headers=self.admin_headers)
+        self.assertEqual([u['username'] for u in response.get_json()], ['provider'])
+
+        response = self.client.get('/api/admin/users?q=user1', headers=self.admin_headers)
+        self.assertEqual([u['username'] for u in response.get_json()], ['user1'])
+
+        response = self.client.get('/api/admin/users?role=owner', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_users_invalid_cursor(self):
+        """Тест: невалиден курсор -> 400."""
+        response = self.client.get('/api/admin/users?cursor=not-a-cursor', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_reservations_newest_first(self):
+        """Тест: резервациите са най-новите първо и се филтрират по статус."""
+        for i, status in enumerate([ReservationStatus.PENDING, ReservationStatus.CONFIRMED,
+                                    ReservationStatus.PENDING]):
+            db.session.add(Reservation(
+                datetime=datetime.now() + timedelta(days=i + 1),
+                customer_id=self.users[0].id,
+                provider_id=self.provider.id,
+                service_id=self.service.id,
+                status=status
+            ))
+        db.session.commit()
+
+        response = self.client.get('/api/admin/reservations?status=Pending&limit=1', headers=self.admin_headers)
+        first = response.get_json()
+        cursor = response.headers['X-Next-Cursor']
+        response = self.client.get(f'/api/admin/reservations?status=Pending&cursor={cursor}',
+                                   headers=self.admin_headers)
+        second = response.get_json()
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertGreater(first[0]['id'], second[0]['id'])
+
+    def test_list_services_by_provider(self):
+        """Тест: услугите се филтрират по доставчик."""
+        response = self.client.get(f'/api/admin/services?provider_id={self.provider.id}',
+                                   headers=self.admin_headers)
+        self.assertEqual([s['id'] for s in response.get_json()], [self.service.id])
+
+    def test_bulk_delete_users_single_statement(self):
+        """Тест: масовото изтриване е една DELETE заявка и пропуска собствения профил."""
+        ids = [self.users[0].id, self.users[1].id, self.admin.id]
+        statements = []
+
+        def count_statement(_conn, _cursor, statement, *_args):
+            if statement.lstrip().upper().startswith('DELETE FROM USERS'):
+                statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            response = self.client.post('/api/admin/users/bulk-delete', json={'ids': ids},
+                                        headers=self.admin_headers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['deleted'], 2)
+        self.assertEqual(len(statements), 1)
+        self.assertIsNotNone(db.session.get(RegisteredUser, self.admin.id))
+        self.assertEqual(get_platform_statistics(max_age=0), compute_statistics())
+
+    def test_bulk_change_role(self):
+        """Тест: масова смяна на роля."""
+        ids = [user.id for user in self.users[:3]]
+        response = self.client.post('/api/admin/users/bulk-role',
+                                    json={'ids': ids, 'role': 'provider'}, headers=self.admin_headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['updated'], 3)
+        stats = get_platform_statistics(max_age=0)
+        self.assertEqual(stats['total_providers'], 4)
+        self.assertEqual(stats, compute_statistics())
+        self.assertEqual(len(Admin.get_all_users(self.admin, role=UserRole.PROVIDER)), 4)
+
+    def test_bulk_change_role_reloads_class(self):
+        """Тест: заредените в сесията потребители се зареждат наново с новия клас."""
+        user_id = self.users[0].id
+        self.assertNotIsInstance(db.session.get(RegisteredUser, user_id), Provider)
+
+        self.admin.change_users_role([user_id], UserRole.PROVIDER)
+
+        user = db.session.get(RegisteredUser, user_id)
+        self.assertIsInstance(user, Provider)
+        self.assertEqual(user.role, UserRole.PROVIDER)
+
+    def test_bulk_validation(self):
+        """Тест: невалидни тела на масовите действия -> 400."""
+        for body in ({}, {'ids': []}, {'ids': ['1']}, {'ids': list(range(501))}):
+            response = self.client.post('/api/admin/users/bulk-delete', json=body, headers=self.admin_headers)
+            self.assertEqual(response.status_code, 400, body)
+
+        response = self.client.post('/api/admin/users/bulk-role',
+                                    json={'ids': [self.users[0].id], 'role': 'owner'}, headers=self.admin_headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_user_delete_and_role(self):
+        """Тест: изтриване и смяна на роля на един потребител (не и на собствения)."""
+        user_id = self.users[0].id
+        response = self.client.put(f'/api/admin/users/{user_id}/role', json={'role': 'provider'},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['role'], 'provider')
+
+        for role_body in ({}, {'role': 'owner'}):
+            response = self.client.put(f'/api/admin/users/{user_id}/role', json=role_body,
+                                       headers=self.admin_headers)
+            self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/api/admin/users/{self.admin.id}/role', json={'role': 'user'},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/admin/users/9999/role', json={'role': 'user'},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(self.client.delete(f'/api/admin/users/{user_id}', headers=self.admin_headers).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/admin/users/{user_id}', headers=self.admin_headers).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/admin/users/{user_id}', headers=self.admin_headers).status_code, 404)
+        self.assertEqual(
+            self.client.delete(f'/api/admin/users/{self.admin.id}', headers=self.admin_headers).status_code, 400
+        )
+
+    def test_delete_service_and_reservation(self):
+        """Тест: администраторът трие услуга и резервация на всеки доставчик."""
+        reservation = Reservation(datetime=datetime.now() + timedelta(days=1), customer_id=self.users[0].id,
+                                  provider_id=self.provider.id, service_id=self.service.id)
+        db.session.add(reservation)
+        db.session.commit()
+        reservation_id, service_id = reservation.id, self.service.id
+
+        response = self.client.delete(f'/api/admin/reservations/{reservation_id}', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(db.session.get(Reservation, reservation_id))
+        response = self.client.delete(f'/api/admin/reservations/{reservation_id}', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.delete(f'/api/admin/services/{service_id}', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(db.session.get(Service, service_id))
+        response = self.client.delete(f'/api/admin/services/{service_id}', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_and_delete_reviews(self):
+        """Тест: ревютата се обхождат с курсора и се трият."""
+        for rating in (3, 4, 5):
+            self.users[rating - 3].leave_review(self.service.id, rating)
+
+        response = self.client.get('/api/admin/reviews?limit=2', headers=self.admin_headers)
+        first = response.get_json()
+        cursor = response.headers['X-Next-Cursor']
+        response = self.client.get(f'/api/admin/reviews?cursor={cursor}', headers=self.admin_headers)
+        second = response.get_json()
+        self.assertEqual([r['rating'] for r in first + second], [3, 4, 5])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+        response = self.client.get(f'/api/admin/reviews?user_id={self.users[1].id}', headers=self.admin_headers)
+        self.assertEqual([r['rating'] for r in response.get_json()], [4])
+
+        review_id = first[0]['id']
+        self.assertEqual(self.client.delete(f'/api/admin/reviews/{review_id}', headers=self.admin_headers).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/admin/reviews/{review_id}', headers=self.admin_headers).status_code, 404)
+        self.assertEqual(db.session.get(Service, self.service.id).rating_count, 2)
+
+    def test_categories(self):
+        """Тест: списък, преименуване и изтриване на категория."""
+        response = self.client.get('/api/admin/categories', headers=self.admin_headers)
+        self.assertEqual(response.get_json(), ['Test Category'])
+
+        response = self.client.put('/api/admin/categories/Test Category', json={'name': 'Renamed'},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['services'], 1)
+        for body in ({}, {'name': '  '}, {'name': 5}):
+            response = self.client.put('/api/admin/categories/Renamed', json=body, headers=self.admin_headers)
+            self.assertEqual(response.status_code, 400, body)
+        response = self.client.put('/api/admin/categories/Missing', json={'name': 'X'}, headers=self.admin_headers)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.delete('/api/admin/categories/Renamed', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['deleted_services'], 1)
+        self.assertEqual(self.client.delete('/api/admin/categories/Renamed', headers=self.admin_headers).status_code, 404)
+
+    def test_statistics(self):
+        """Тест: GET /statistics."""
+        response = self.client.get('/api/admin/statistics', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['total_users'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
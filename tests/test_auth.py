@@ -14,8 +14,12 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
+from sqlalchemy import event
 from db import db
 from models.user import RegisteredUser, Provider, Admin, UserRole
+from models.password_hasher import HasherBusyError, password_hasher
+from models.rate_limit import login_rate_limiter
+from routes.identity import verify_token
 
 
 class TestAuthRoutes(unittest.TestCase):
@@ -43,6 +47,8 @@ class TestAuthRoutes(unittest.TestCase):
         """Изпълнява се ПРЕДИ всеки тест."""
         db.session.query(RegisteredUser).delete()
         db.session.commit()
+        db.session.expunge_all()  # SQLite преизползва id-тата на изтритите потребители
+        login_rate_limiter.reset()
 
     # ==================== REGISTER TESTS ====================
 
@@ -122,6 +128,33 @@ class TestAuthRoutes(unittest.TestCase):
             'password': 'password123'
         })
         self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Имейлът е зает')
+
+    def test_register_is_single_insert(self):
+        """Тест: Регистрацията е един INSERT - без SELECT-и за заетост преди него."""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if 'users' in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/api/auth/register', json={
+                'username': 'oneshot',
+                'email': 'oneshot@test.com',
+                'password': 'password123',
+                'role': 'provider'
+            })
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(statements[0].lstrip().upper().startswith('INSERT'))
+        self.assertEqual(sum(s.lstrip().upper().startswith('INSERT') for s in statements), 1)
+        self.assertFalse([s for s in statements if 'users.username =' in s or 'users.email =' in s])
+        user = db.session.get(RegisteredUser, response.get_json()['user_id'])
+        self.assertIsInstance(user, Provider)
 
     # ==================== LOGIN TESTS ====================
 
@@ -143,6 +176,25 @@ class TestAuthRoutes(unittest.TestCase):
         self.assertIn('user_id', data)
         self.assertEqual(data['username'], 'loginuser')
 
+    def test_login_returns_signed_token(self):
+        """Тест: Входът връща токен с id и роля на потребителя."""
+        self.client.post('/api/auth/register', json={
+            'username': 'tokenuser',
+            'email': 'token@test.com',
+            'password': 'password123',
+            'role': 'provider'
+        })
+
+        response = self.client.post('/api/auth/login', json={
+            'email': 'token@test.com',
+            'password': 'password123'
+        })
+        data = response.get_json()
+        self.assertIn('token', data)
+
+        with app.test_request_context():
+            self.assertEqual(verify_token(data['token']), (data['user_id'], UserRole.PROVIDER))
+
     def test_login_success_with_username(self):
         """Тест: Успешен вход с потребителско име."""
         self.client.post('/api/auth/register', json={
@@ -186,6 +238,68 @@ class TestAuthRoutes(unittest.TestCase):
         })
         self.assertEqual(response.status_code, 400)
 
+    # ==================== PASSWORD HASHING TESTS ====================
+
+    def _hasher_config(self, **overrides):
+        """Временни настройки на хеширането - връща старите за възстановяване."""
+        previous = {key: app.config[key] for key in overrides}
+        app.config.update(overrides)
+        return previous
+
+    def test_password_hashed_in_worker_process(self):
+        """Тест: Хешът се смята в пула с метода от PASSWORD_HASH_METHOD."""
+        previous = self._hasher_config(PASSWORD_HASH_WORKERS=1,
+                                       PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+        try:
+            user = RegisteredUser(username='pooled', email='pooled@test.com')
+            user.set_password('password123')
+
+            self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+            self.assertTrue(user.check_password('password123'))
+            self.assertFalse(user.check_password('wrong'))
+        finally:
+            app.config.update(previous)
+            password_hasher.shutdown()
+
+    def test_login_returns_503_when_hash_queue_full(self):
+        """Тест: Пълна опашка за хеширане -> 503 с Retry-After, без чакане."""
+        self.client.post('/api/auth/register', json={
+            'username': 'storm',
+            'email': 'storm@test.com',
+            'password': 'password123'
+        })
+        previous = self._hasher_config(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+        try:
+            _, slots = password_hasher._pool(1, 1)  # pylint: disable=protected-access
+            slots.acquire()  # Единственото място е заето от "друга" заявка
+            try:
+                response = self.client.post('/api/auth/login', json={
+                    'email': 'storm@test.com',
+                    'password': 'password123'
+                })
+            finally:
+                slots.release()
+
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response.headers)
+
+            response = self.client.post('/api/auth/login', json={
+                'email': 'storm@test.com',
+                'password': 'password123'
+            })
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config.update(previous)
+            password_hasher.shutdown()
+
+    def test_hasher_busy_is_503_app_wide(self):
+        """Тест: HasherBusyError извън auth blueprint-а също става 503."""
+        with app.test_request_context('/api/services'):
+            response = app.make_response(app.handle_user_exception(HasherBusyError('Зает')))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
     # ==================== LOGOUT TESTS ====================
 
     def test_logout(self):
@@ -195,6 +309,32 @@ class TestAuthRoutes(unittest.TestCase):
 
     # ==================== PROFILE TESTS ====================
 
+    def test_profile_loads_user_once(self):
+        """Тест: PUT /profile зарежда потребителя с една заявка (кеш в flask.g)."""
+        user = Provider(username='once', email='once@test.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.expunge_all()
+
+        statements = []
+
+        def count_users_queries(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM users' in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_users_queries)
+        try:
+            response = self.client.put('/api/auth/profile',
+                                       headers={'X-User-ID': str(user_id)},
+                                       json={'username': 'once2'})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_users_queries)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([s for s in statements if 'users.id = ' in s]), 1)
+
     def test_get_profile_success(self):
         """Тест: Получаване на профил."""
         # Създаваме потребител
@@ -291,6 +431,26 @@ class TestAuthRoutes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_update_profile_duplicate_email_rolls_back(self):
+        """Тест: Зает имейл -> 400, а промените по профила не се записват."""
+        user1 = RegisteredUser(username='mail1', email='mail1@test.com')
+        user1.set_password('password123')
+        user2 = RegisteredUser(username='mail2', email='mail2@test.com')
+        user2.set_password('password123')
+        db.session.add_all([user1, user2])
+        db.session.commit()
+
+        response = self.client.put(
+            '/api/auth/profile',
+            headers={'X-User-ID': str(user2.id)},
+            json={'username': 'renamed', 'email': 'mail1@test.com'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Имейлът е зает')
+
+        db.session.expire_all()
+        self.assertEqual(db.session.get(RegisteredUser, user2.id).username, 'mail2')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,6 +9,7 @@
 """
 import unittest
 from datetime import datetime, timedelta
+from sqlalchemy import event
 
 import sys
 import os
@@ -16,10 +17,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
 from db import db
-from models.user import RegisteredUser, Provider, UserRole
+from models.user import MAX_SYNC_FAVORITES, RegisteredUser, Provider, UserRole
 from models.service import Service
 from models.favorite import Favorite
 from models.notification import Notification, NotificationType
+from models.notification_stream import notification_broker
+from models.notification_writer import notification_writer
+from models.events import EventType, event_bus
+from models.notification_retention import purge_read_notifications, compact_unread_notifications
+from routes.notifications import STREAM_BACKLOG_LIMIT
 
 
 class TestFavoriteMethods(unittest.TestCase):
@@ -258,6 +264,138 @@ class TestNotificationMethods(unittest.TestCase):
         result = self.user.get_notifications()
         self.assertEqual(result['unread_count'], 0)
 
+    def test_unread_counter_follows_changes(self):
+        """Тест: unread_notification_count следи добавяне, прочитане и изтриване."""
+        notifications = [
+            Notification(user_id=self.user.id, message=f'Известие {i}',
+                         notification_type=NotificationType.RESERVATION_CONFIRMED)
+            for i in range(3)
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        self.assertEqual(self.user.unread_notification_count, 3)
+
+        self.user.mark_notification_read(notifications[0].id)
+        self.assertEqual(self.user.unread_notification_count, 2)
+
+        db.session.delete(notifications[0])  # Прочетено - броячът не се променя
+        db.session.delete(notifications[1])
+        db.session.commit()
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+        RegisteredUser.recompute_unread_counts()
+        db.session.commit()
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+    def test_unread_counter_counts_event_notifications(self):
+        """Тест: известията от шината (Core INSERT) също увеличават брояча."""
+        for rating in (4, 5):
+            event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.user.id,
+                              service_name='Услуга', rating=rating, related_id=None)
+        db.session.commit()
+
+        self.assertEqual(self.user.get_notifications()['unread_count'], 2)
+
+    def test_event_notifications_buffered_across_transactions(self):
+        """Тест: с интервал известията чакат фоновия запис - един INSERT за няколко commit-а."""
+        app.config['NOTIFICATION_WRITE_INTERVAL_SECONDS'] = 60
+        try:
+            for rating in (4, 5):
+                event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.user.id,
+                                  service_name='Услуга', rating=rating, related_id=None)
+                db.session.commit()
+
+            self.assertEqual(Notification.query.count(), 0)
+            self.assertEqual(notification_writer.pending_count(), 2)
+            self.assertEqual(notification_writer.flush(), 2)
+        finally:
+            app.config['NOTIFICATION_WRITE_INTERVAL_SECONDS'] = 0
+            notification_writer.clear()
+
+        self.assertEqual(Notification.query.count(), 2)
+        self.assertEqual(self.user.get_notifications()['unread_count'], 2)
+
+    def _add_notification(self, is_read: bool = False, days_old: int = 0,
+                          notification_type: NotificationType = NotificationType.NEW_REVIEW) -> Notification:
+        notification = Notification(user_id=self.user.id, message='Известие',
+                                    notification_type=notification_type)
+        notification.is_read = is_read
+        notification.created_at = datetime.now() - timedelta(days=days_old)
+        db.session.add(notification)
+        db.session.commit()
+        return notification
+
+    def test_purge_read_notifications(self):
+        """Тест: purge_read_notifications() трие само старите прочетени (на пакети)."""
+        for _ in range(3):
+            self._add_notification(is_read=True, days_old=100)
+        recent = self._add_notification(is_read=True, days_old=1)
+        old_unread = self._add_notification(is_read=False, days_old=100)
+
+        deleted = purge_read_notifications(older_than_days=90, batch_size=2)
+
+        self.assertEqual(deleted, 3)
+        remaining = {n.id for n in Notification.query.all()}
+        self.assertEqual(remaining, {recent.id, old_unread.id})
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+    def test_compact_unread_notifications(self):
+        """Тест: много непрочетени от един тип стават едно обобщение."""
+        for _ in range(5):
+            self._add_notification()
+        other = self._add_notification(notification_type=NotificationType.RESERVATION_CONFIRMED)
+        self._add_notification(is_read=True)
+
+        result = compact_unread_notifications(min_group=5)
+
+        self.assertEqual(result, {'digests': 1, 'collapsed': 5})
+        digest = Notification.query.filter_by(
+            user_id=self.user.id, type=NotificationType.NEW_REVIEW, is_read=False
+        ).one()
+        self.assertEqual(digest.digest_count, 5)
+        self.assertTrue(digest.message.startswith('5 нови ревюта'))
+        self.assertIsNotNone(db.session.get(Notification, other.id))
+        self.assertEqual(self.user.unread_notification_count, 2)
+
+        # Повторно компактиране обединява обобщението с новите известия
+        for _ in range(4):
+            self._add_notification()
+        compact_unread_notifications(min_group=5)
+        digest = Notification.query.filter_by(
+            user_id=self.user.id, type=NotificationType.NEW_REVIEW, is_read=False
+        ).one()
+        self.assertEqual(digest.digest_count, 9)
+
+    def test_compact_counts_only_deleted_rows(self):
+        """Тест: известие, прочетено между избора на групата и DELETE-а, не се брои."""
+        notifications = [self._add_notification() for _ in range(5)]
+        self._add_notification(notification_type=NotificationType.RESERVATION_CONFIRMED)
+        read_id = notifications[0].id
+        marked = []
+
+        def mark_read_concurrently(conn, clauseelement, *_args):
+            if not marked and getattr(clauseelement, 'is_delete', False):
+                marked.append(read_id)  # Както mark_notification_read от друга заявка
+                conn.exec_driver_sql('UPDATE notifications SET is_read = 1 WHERE id = ?', (read_id,))
+                conn.exec_driver_sql(
+                    'UPDATE users SET unread_notification_count = unread_notification_count - 1 WHERE id = ?',
+                    (self.user.id,)
+                )
+
+        event.listen(db.engine, 'before_execute', mark_read_concurrently)
+        try:
+            result = compact_unread_notifications(min_group=5)
+        finally:
+            event.remove(db.engine, 'before_execute', mark_read_concurrently)
+
+        self.assertEqual(result, {'digests': 1, 'collapsed': 4})
+        digest = Notification.query.filter_by(
+            user_id=self.user.id, type=NotificationType.NEW_REVIEW, is_read=False
+        ).one()
+        self.assertEqual(digest.digest_count, 4)
+        db.session.refresh(self.user)
+        self.assertEqual(self.user.unread_notification_count, 2)
+
 
 class TestFavoriteRoutes(unittest.TestCase):
     """Тестове за favorites routes."""
@@ -376,6 +514,128 @@ class TestFavoriteRoutes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def test_favorite_count_follows_add_and_remove(self):
+        """Тест: favorite_count на услугата се обновява при добавяне/премахване."""
+        other = RegisteredUser(username='other', email='other@test.com')
+        other.set_password('password123')
+        db.session.add(other)
+        db.session.commit()
+
+        self.user.add_favorite(self.service.id)
+        other.add_favorite(self.service.id)
+        self.assertEqual(self.service.to_dict()['favorite_count'], 2)
+
+        self.user.remove_favorite(self.service.id)
+        self.assertEqual(self.service.favorite_count, 1)
+
+        Service.recompute_favorite_counts()
+        db.session.commit()
+        self.assertEqual(self.service.favorite_count, 1)
+
+    def test_most_favorited_services(self):
+        """Тест: GET /services/most-favorited подрежда по брой любими."""
+        popular = Service(name='Popular', category='Test', provider_id=self.provider.id)
+        db.session.add(popular)
+        db.session.commit()
+        self.user.add_favorite(popular.id)
+        self.provider.add_favorite(popular.id)
+        self.user.add_favorite(self.service.id)
+
+        response = self.client.get('/api/services/most-favorited?limit=1')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([s['name'] for s in data], ['Popular'])
+        self.assertEqual(data[0]['favorite_count'], 2)
+
+        cursor = response.headers['X-Next-Cursor']
+        response = self.client.get(f'/api/services/most-favorited?limit=1&cursor={cursor}')
+        self.assertEqual([s['name'] for s in response.get_json()], ['Test Service'])
+
+    def test_sync_favorites_applies_diff(self):
+        """Тест: PUT /favorites добавя липсващите и маха излишните."""
+        second = Service(name='Second', category='Test', provider_id=self.provider.id)
+        db.session.add(second)
+        db.session.commit()
+        self.user.add_favorite(self.service.id)
+
+        response = self.client.put(
+            '/api/favorites',
+            headers={'X-User-ID': str(self.user.id)},
+            json={'service_ids': [second.id, 9999]}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['added'], [second.id])
+        self.assertEqual(data['removed'], [self.service.id])
+        self.assertEqual(data['unknown'], [9999])
+
+        self.assertEqual([f['service_id'] for f in self.user.get_favorites()], [second.id])
+        self.assertEqual(db.session.get(Service, second.id).favorite_count, 1)
+        self.assertEqual(db.session.get(Service, self.service.id).favorite_count, 0)
+
+    def test_sync_favorites_is_idempotent(self):
+        """Тест: повторна синхронизация със същия набор не променя нищо."""
+        headers = {'X-User-ID': str(self.user.id)}
+        self.client.put('/api/favorites', headers=headers, json={'service_ids': [self.service.id]})
+        response = self.client.put('/api/favorites', headers=headers, json={'service_ids': [self.service.id]})
+
+        self.assertEqual(response.get_json()['added'], [])
+        self.assertEqual(response.get_json()['removed'], [])
+        self.assertEqual(db.session.get(Service, self.service.id).favorite_count, 1)
+
+    def test_sync_favorites_invalid_payload(self):
+        """Тест: PUT /favorites без списък от числа връща 400."""
+        headers = {'X-User-ID': str(self.user.id)}
+        response = self.client.put('/api/favorites', headers=headers, json={'service_ids': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        for body in ({}, ['service_ids'], 'service_ids', {'service_ids': [1, '2']}, {'service_ids': [True]}):
+            response = self.client.put('/api/favorites', headers=headers, json=body)
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_sync_favorites_too_many_ids(self):
+        """Тест: повече от MAX_SYNC_FAVORITES услуги -> 400 (не 500 от лимита на SQLite)."""
+        headers = {'X-User-ID': str(self.user.id)}
+        response = self.client.put('/api/favorites', headers=headers,
+                                   json={'service_ids': list(range(1, MAX_SYNC_FAVORITES + 2))})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.put('/api/favorites', headers=headers,
+                                   json={'service_ids': [self.service.id] * (MAX_SYNC_FAVORITES + 1)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_favorites_expanded(self):
+        """Тест: GET /favorites?expand=true връща и данните на услугата."""
+        self.user.add_favorite(self.service.id)
+
+        response = self.client.get(
+            '/api/favorites?expand=true&next_slot=true',
+            headers={'X-User-ID': str(self.user.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['service']['name'], 'Test Service')
+        self.assertIn('rating_count', data[0]['service'])
+        self.assertIsNotNone(data[0]['service']['next_free_slot'])
+
+    def test_get_favorites_expanded_paginated(self):
+        """Тест: expand режимът се странира с X-Next-Cursor."""
+        second = Service(name='Second', category='Test', provider_id=self.provider.id)
+        db.session.add(second)
+        db.session.commit()
+        self.user.add_favorite(self.service.id)
+        self.user.add_favorite(second.id)
+
+        headers = {'X-User-ID': str(self.user.id)}
+        first_page = self.client.get('/api/favorites?expand=true&limit=1', headers=headers)
+        self.assertEqual([f['service']['name'] for f in first_page.get_json()], ['Test Service'])
+        self.assertNotIn('next_free_slot', first_page.get_json()[0]['service'])
+
+        cursor = first_page.headers['X-Next-Cursor']
+        second_page = self.client.get(f'/api/favorites?expand=true&limit=1&cursor={cursor}', headers=headers)
+        self.assertEqual([f['service']['name'] for f in second_page.get_json()], ['Second'])
+        self.assertNotIn('X-Next-Cursor', second_page.headers)
+
 
 class TestNotificationRoutes(unittest.TestCase):
     """Тестове за notifications routes."""
@@ -471,6 +731,116 @@ class TestNotificationRoutes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_get_notifications_paginated(self):
+        """Тест: GET /notifications се странира с X-Next-Cursor (най-новите първо)."""
+        for i in range(3):
+            db.session.add(Notification(user_id=self.user.id, message=f'Известие {i}',
+                                        notification_type=NotificationType.NEW_REVIEW))
+        db.session.commit()
+        headers = {'X-User-ID': str(self.user.id)}
+
+        first = self.client.get('/api/notifications?limit=2', headers=headers)
+        data = first.get_json()
+        self.assertEqual([n['message'] for n in data['notifications']], ['Известие 2', 'Известие 1'])
+        self.assertEqual(data['unread_count'], 3)
+
+        cursor = first.headers['X-Next-Cursor']
+        second = self.client.get(f'/api/notifications?limit=2&cursor={cursor}', headers=headers)
+        self.assertEqual([n['message'] for n in second.get_json()['notifications']], ['Известие 0'])
+        self.assertNotIn('X-Next-Cursor', second.headers)
+
+    def test_get_unread_count(self):
+        """Тест: GET /notifications/unread-count връща брояча."""
+        db.session.add(Notification(user_id=self.user.id, message='Тест',
+                                    notification_type=NotificationType.NEW_REVIEW))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/notifications/unread-count',
+            headers={'X-User-ID': str(self.user.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'unread_count': 1})
+
+    # ==================== SSE STREAM TESTS ====================
+
+    def test_stream_unauthorized(self):
+        """Тест: GET /notifications/stream без auth връща 401."""
+        response = self.client.get('/api/notifications/stream')
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_pushes_new_notifications(self):
+        """Тест: новите известия от шината идват по отворения поток."""
+        response = self.client.get(
+            '/api/notifications/stream',
+            headers={'X-User-ID': str(self.user.id)},
+            buffered=False
+        )
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertTrue(next(chunks).startswith(b'retry:'))
+        self.assertEqual(notification_broker.subscriber_count(self.user.id), 1)
+
+        event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.user.id,
+                          service_name='Услуга', rating=5, related_id=None)
+        db.session.commit()
+
+        chunk = next(chunks).decode()
+        notification = Notification.query.filter_by(user_id=self.user.id).one()
+        self.assertTrue(chunk.startswith(f'id: {notification.id}\nevent: notification\n'))
+        self.assertIn('"type": "new_review"', chunk)
+
+        response.close()
+        self.assertEqual(notification_broker.subscriber_count(self.user.id), 0)
+
+    def test_stream_resumes_from_last_event_id(self):
+        """Тест: Last-Event-ID изпраща само пропуснатите известия."""
+        notifications = []
+        for i in range(2):
+            notification = Notification(
+                user_id=self.user.id,
+                message=f'Известие {i}',
+                notification_type=NotificationType.RESERVATION_CONFIRMED
+            )
+            db.session.add(notification)
+            notifications.append(notification)
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/notifications/stream',
+            headers={'X-User-ID': str(self.user.id), 'Last-Event-ID': str(notifications[0].id)},
+            buffered=False
+        )
+        chunks = iter(response.response)
+        next(chunks)  # retry
+        self.assertTrue(next(chunks).decode().startswith(f'id: {notifications[1].id}\n'))
+        response.close()
+
+    def test_stream_resync_when_backlog_too_long(self):
+        """Тест: повече пропуснати от STREAM_BACKLOG_LIMIT -> resync с id на последното."""
+        db.session.add_all([
+            Notification(user_id=self.user.id, message=f'Известие {i}',
+                         notification_type=NotificationType.NEW_REVIEW)
+            for i in range(STREAM_BACKLOG_LIMIT + 2)
+        ])
+        db.session.commit()
+        first_id, last_id = db.session.query(db.func.min(Notification.id), db.func.max(Notification.id)).one()
+
+        response = self.client.get(
+            '/api/notifications/stream',
+            headers={'X-User-ID': str(self.user.id), 'Last-Event-ID': str(first_id - 1)},
+            buffered=False
+        )
+        chunks = iter(response.response)
+        next(chunks)  # retry
+        self.assertEqual(next(chunks).decode(), f'id: {last_id}\nevent: resync\ndata: {{}}\n\n')
+
+        event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.user.id,
+                          service_name='Услуга', rating=5, related_id=None)
+        db.session.commit()
+        self.assertTrue(next(chunks).decode().startswith(f'id: {last_id + 1}\nevent: notification\n'))
+        response.close()
+
 
 class TestNotificationModel(unittest.TestCase):
     """Тестове за Notification модела."""
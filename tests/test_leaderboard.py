@@ -0,0 +1,151 @@
+"""
+Тестове за класацията "най-добре оценени" (models/leaderboard.py).
+
+Тества:
+    - Байесовата средна (едно ревю 5 звезди не печели)
+    - Инкрементално обновяване от leave_review / delete_review
+    - Пълно преизчисляване при смяна на категория
+    - GET /api/services/top
+"""
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from db import db
+from models.user import RegisteredUser, Provider, Admin
+from models.service import Service
+from models.review import Review
+from models.leaderboard import leaderboard
+
+
+class TestRatingLeaderboard(unittest.TestCase):
+    """Тестове за RatingLeaderboard."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Създава тестова база данни."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['TESTING'] = True
+        cls.app = app
+        cls.client = app.test_client()
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Изтрива тестовата база данни."""
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        """Изпълнява се ПРЕДИ всеки тест."""
+        db.session.query(Review).delete()
+        db.session.query(Service).delete()
+        db.session.query(RegisteredUser).delete()
+        db.session.commit()
+        leaderboard.invalidate()
+
+        self.provider = Provider(username='provider', email='provider@test.com')
+        self.provider.set_password('password123')
+        self.admin = Admin(username='admin', email='admin@test.com')
+        self.admin.set_password('admin123')
+        db.session.add_all([self.provider, self.admin])
+        db.session.commit()
+
+        self.users = []
+        for index in range(4):
+            user = RegisteredUser(username=f'user{index}', email=f'user{index}@test.com')
+            user.set_password('password123')
+            self.users.append(user)
+        db.session.add_all(self.users)
+
+        self.popular = Service(name='Popular', category='Repair', provider_id=self.provider.id)
+        self.newcomer = Service(name='Newcomer', category='Repair', provider_id=self.provider.id)
+        db.session.add_all([self.popular, self.newcomer])
+        db.session.commit()
+
+    def test_bayesian_average_beats_single_review_outlier(self):
+        """Тест: 4 ревюта 4-5 звезди са над едно ревю 5 звезди."""
+        weak = Service(name='Weak', category='Other', provider_id=self.provider.id)
+        db.session.add(weak)
+        db.session.commit()
+        for user in self.users[:2]:
+            user.leave_review(weak.id, 2)  # Сваля средната за каталога до 4.0
+
+        for user, rating in zip(self.users, [5, 5, 4, 5]):
+            user.leave_review(self.popular.id, rating)
+        self.users[0].leave_review(self.newcomer.id, 5)
+
+        top = leaderboard.top('Repair')
+
+        self.assertEqual([entry['service_id'] for entry in top], [self.popular.id, self.newcomer.id])
+        self.assertEqual(top[1]['average_rating'], 5.0)
+
+    def test_incremental_update_after_review(self):
+        """Тест: ново ревю се отразява без пълно преизчисляване."""
+        self.users[0].leave_review(self.popular.id, 4)
+        leaderboard.top('Repair')  # Построява класацията
+
+        self.users[1].leave_review(self.newcomer.id, 5)
+        self.users[2].leave_review(self.newcomer.id, 5)
+
+        top = leaderboard.top('Repair')
+        self.assertEqual(top[0]['service_id'], self.newcomer.id)
+        self.assertEqual(top[0]['rating_count'], 2)
+
+    def test_delete_review_removes_service(self):
+        """Тест: Admin.delete_review() премахва услугата без ревюта от класацията."""
+        review = self.users[0].leave_review(self.newcomer.id, 5)
+        self.users[1].leave_review(self.popular.id, 3)
+        leaderboard.top('Repair')
+
+        self.admin.delete_review(review.id)
+
+        top = leaderboard.top('Repair')
+        self.assertEqual([entry['service_id'] for entry in top], [self.popular.id])
+
+    def test_review_in_rebuild_snapshot_not_counted_twice(self):
+        """Тест: ревю, commit-нато преди паралелно преизчисляване, не се брои два пъти."""
+        self.users[0].leave_review(self.popular.id, 4)
+        leaderboard.top('Repair')
+
+        generation = leaderboard.generation  # "Заявката" на ревюто - преди commit
+        db.session.add(Review(user_id=self.users[1].id, service_id=self.popular.id, rating=5))
+        db.session.commit()
+        leaderboard.rebuild()  # Паралелното преизчисляване вече вижда ревюто
+        leaderboard.record_review(self.popular.id, 5, 1, generation)
+
+        top = leaderboard.top('Repair')
+        self.assertEqual(top[0]['rating_count'], 2)
+        self.assertEqual(top[0]['average_rating'], 4.5)
+
+    def test_category_change_triggers_rebuild(self):
+        """Тест: смяната на категория премества услугата в новата класация."""
+        self.users[0].leave_review(self.newcomer.id, 5)
+        leaderboard.top('Repair')
+
+        self.newcomer.category = 'Tires'
+        db.session.commit()
+
+        self.assertEqual(leaderboard.top('Repair'), [])
+        self.assertEqual(leaderboard.top('Tires')[0]['service_id'], self.newcomer.id)
+
+    def test_top_route(self):
+        """Тест: GET /api/services/top?category=..."""
+        self.users[0].leave_review(self.popular.id, 4)
+
+        response = self.client.get('/api/services/top?category=Repair&limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]['service_id'], self.popular.id)
+
+        response = self.client.get('/api/services/top')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@
     - get_service_reviews()
     - get_average_rating()
     - set_availability()
+    - Известия от домейн събитията (models/events.py)
 """
 import unittest
 import sys
@@ -23,6 +24,9 @@ from models.user import RegisteredUser, Provider, Admin
 from models.service import Service
 from models.review import Review
 from models.reservation import Reservation, ReservationStatus
+from models.notification import Notification, NotificationType
+from models.events import EventType, event_bus
+from models.booking_digest import booking_digest
 
 
 def make_reservation(customer_id: int, provider_id: int, service_id: int,
@@ -60,6 +64,8 @@ class TestProviderMethods(unittest.TestCase):
 
     def setUp(self):
         """Изпълнява се ПРЕДИ всеки тест."""
+        booking_digest.clear()
+        db.session.query(Notification).delete()
         db.session.query(Reservation).delete()
         db.session.query(Review).delete()
         db.session.query(Service).delete()
@@ -314,6 +320,122 @@ class TestProviderMethods(unittest.TestCase):
         result = self.provider.complete_reservation(reservation.id)
         self.assertIsInstance(result, bool)
 
+    # ==================== NOTIFICATION EVENTS TESTS ====================
+
+    def _pending_reservation(self) -> Reservation:
+        reservation = make_reservation(
+            customer_id=self.user.id,
+            provider_id=self.provider.id,
+            service_id=self.service.id,
+            scheduled_time=datetime(2026, 5, 4, 10, 0)
+        )
+        db.session.add(reservation)
+        db.session.commit()
+        return reservation
+
+    def test_confirm_reservation_notifies_customer(self):
+        """Тест: confirm_reservation() създава известие за клиента след commit."""
+        reservation = self._pending_reservation()
+        self.provider.confirm_reservation(reservation.id)
+
+        notifications = Notification.query.filter_by(user_id=self.user.id).all()
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual(notifications[0].type, NotificationType.RESERVATION_CONFIRMED)
+        self.assertEqual(notifications[0].related_id, reservation.id)
+        self.assertIn('Test Service', notifications[0].message)
+
+    def test_reject_and_complete_notify_customer(self):
+        """Тест: reject/complete създават съответните известия."""
+        rejected = self._pending_reservation()
+        completed = self._pending_reservation()
+        self.provider.reject_reservation(rejected.id)
+        self.provider.complete_reservation(completed.id)
+
+        types = {n.related_id: n.type for n in Notification.query.filter_by(user_id=self.user.id)}
+        self.assertEqual(types[rejected.id], NotificationType.RESERVATION_CANCELLED)
+        self.assertEqual(types[completed.id], NotificationType.RESERVATION_COMPLETED)
+
+    def test_leave_review_notifies_provider(self):
+        """Тест: leave_review() създава известие за собственика на услугата."""
+        review = self.user.leave_review(self.service.id, 4, 'OK')
+
+        notification = Notification.query.filter_by(user_id=self.provider.id).one()
+        self.assertEqual(notification.type, NotificationType.NEW_REVIEW)
+        self.assertEqual(notification.related_id, review.id)
+
+    def test_events_are_discarded_on_rollback(self):
+        """Тест: събитие от отменена транзакция не създава известие."""
+        event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.provider.id,
+                          service_name='X', rating=5, related_id=None)
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(Notification.query.count(), 0)
+
+    def test_events_from_one_transaction_are_delivered_together(self):
+        """Тест: няколко събития в една транзакция -> всички известия след commit."""
+        for rating in (3, 5):
+            event_bus.publish(EventType.REVIEW_CREATED, provider_id=self.provider.id,
+                              service_name='X', rating=rating, related_id=None)
+        self.assertEqual(Notification.query.count(), 0)
+
+        db.session.commit()
+        self.assertEqual(Notification.query.filter_by(user_id=self.provider.id).count(), 2)
+
+    # ==================== BOOKING DIGEST TESTS ====================
+
+    def test_new_booking_waits_for_digest_window(self):
+        """Тест: известието за нова резервация се буферира до изтичане на прозореца."""
+        reservation = self.user.create_reservation(self.service.id, datetime(2026, 5, 4, 10, 0))
+
+        self.assertEqual(booking_digest.pending_count(), 1)
+        self.assertEqual(booking_digest.flush(), 0)  # Прозорецът още не е изтекъл
+        self.assertEqual(Notification.query.filter_by(user_id=self.provider.id).count(), 0)
+
+        self.assertEqual(booking_digest.flush(force=True), 1)
+        notification = Notification.query.filter_by(user_id=self.provider.id).one()
+        self.assertEqual(notification.type, NotificationType.NEW_BOOKING)
+        self.assertEqual(notification.related_id, reservation.id)
+        self.assertEqual(notification.digest_count, 1)
+
+    def test_booking_burst_becomes_one_digest(self):
+        """Тест: вълна от резервации -> едно обобщение за доставчика."""
+        for hour in range(9, 14):
+            self.user.create_reservation(self.service.id, datetime(2026, 5, 4, hour, 0))
+
+        booking_digest.flush(force=True)
+
+        notification = Notification.query.filter_by(user_id=self.provider.id).one()
+        self.assertEqual(notification.digest_count, 5)
+        self.assertTrue(notification.message.startswith('5 нови резервации'))
+        self.assertIsNone(notification.related_id)
+        self.assertEqual(self.provider.unread_notification_count, 1)
+
+    def test_update_and_cancel_notify_provider_separately(self):
+        """Тест: промяна и отмяна са отделни групи (различни типове)."""
+        reservation = self.user.create_reservation(self.service.id, datetime(2026, 5, 4, 10, 0))
+        booking_digest.clear()
+
+        self.user.update_reservation(reservation.id, new_notes='Друго')
+        self.user.update_reservation(reservation.id, new_notes='Друго')  # Без промяна - без събитие
+        self.user.cancel_reservation(reservation.id)
+        booking_digest.flush(force=True)
+
+        types = sorted(n.type.value for n in Notification.query.filter_by(user_id=self.provider.id))
+        self.assertEqual(types, ['booking_canceled', 'booking_updated'])
+
+    def test_booking_digest_disabled_writes_immediately(self):
+        """Тест: BOOKING_DIGEST_WINDOW_SECONDS = 0 записва известието веднага."""
+        window = app.config['BOOKING_DIGEST_WINDOW_SECONDS']
+        app.config['BOOKING_DIGEST_WINDOW_SECONDS'] = 0
+        try:
+            self.user.create_reservation(self.service.id, datetime(2026, 5, 4, 10, 0))
+        finally:
+            app.config['BOOKING_DIGEST_WINDOW_SECONDS'] = window
+
+        self.assertEqual(booking_digest.pending_count(), 0)
+        self.assertEqual(Notification.query.filter_by(user_id=self.provider.id).count(), 1)
+
     # ==================== GET SERVICE REVIEWS TESTS ====================
 
     def test_get_service_reviews(self):
@@ -0,0 +1,175 @@
+"""
+Тестове за ограничаването на опитите за вход (models/rate_limit.py).
+
+Тества:
+    - Token bucket: пик, пълнене с времето, Retry-After
+    - LRU изхвърляне в MemoryBackend
+    - Общо състояние на два "worker-а" през SQLiteBackend
+    - 429 от POST /api/auth/login (по акаунт и по IP) и /register (по IP)
+"""
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from db import db
+from models.user import RegisteredUser
+from models.rate_limit import (
+    BucketLimit, MemoryBackend, SQLiteBackend, login_rate_limiter, MAX_RETRY_AFTER_SECONDS
+)
+
+
+class TestTokenBucketBackends(unittest.TestCase):
+    """Тестове за хранилищата на кофите."""
+
+    limit = BucketLimit(capacity=2, refill_per_minute=60)  # 1 жетон в секунда
+
+    def test_burst_then_refill(self):
+        """Тест: Пикът се изчерпва, после жетоните се връщат с времето."""
+        backend = MemoryBackend()
+
+        self.assertTrue(backend.take('k', self.limit, now=0)[0])
+        self.assertTrue(backend.take('k', self.limit, now=0)[0])
+        allowed, retry_after = backend.take('k', self.limit, now=0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+
+        self.assertTrue(backend.take('k', self.limit, now=1.0)[0])
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        """Тест: Над max_keys се изхвърля най-отдавна използваният ключ."""
+        backend = MemoryBackend(max_keys=2)
+        backend.take('a', self.limit, now=0)
+        backend.take('b', self.limit, now=0)
+        backend.take('a', self.limit, now=0)  # 'a' е използван последен
+        backend.take('c', self.limit, now=0)
+
+        self.assertEqual(len(backend), 2)
+        # 'b' е изхвърлен -> отново пълна кофа; 'a' пази празната си кофа
+        self.assertFalse(backend.take('a', self.limit, now=0)[0])
+        self.assertTrue(backend.take('b', self.limit, now=0)[0])
+
+    def test_sqlite_backend_shared_between_workers(self):
+        """Тест: Два процеса с общ файл виждат едни и същи кофи."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'buckets.db')
+            worker_a = SQLiteBackend(path)
+            worker_b = SQLiteBackend(path)
+
+            self.assertTrue(worker_a.take('k', self.limit, now=100)[0])
+            self.assertTrue(worker_b.take('k', self.limit, now=100)[0])
+            self.assertFalse(worker_a.take('k', self.limit, now=100)[0])
+            self.assertEqual(len(worker_b), 1)
+
+    def test_sqlite_backend_prunes_to_max_keys(self):
+        """Тест: Почистването оставя най-скоро използваните max_keys кофи."""
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SQLiteBackend(os.path.join(directory, 'buckets.db'), max_keys=3)
+            for i in range(5):
+                backend.take(f'k{i}', self.limit, now=float(i))
+            backend._prune()  # pylint: disable=protected-access
+
+            keys = {row[0] for row in backend._connect().execute(  # pylint: disable=protected-access
+                'SELECT key FROM rate_limit_buckets')}
+            self.assertEqual(keys, {'k2', 'k3', 'k4'})
+
+
+class TestLoginRateLimit(unittest.TestCase):
+    """Тестове за 429 от /api/auth/login."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Създава тестова база данни."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['TESTING'] = True
+        cls.app = app
+        cls.client = app.test_client()
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Изтрива тестовата база данни."""
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        """Изпълнява се ПРЕДИ всеки тест."""
+        db.session.query(RegisteredUser).delete()
+        db.session.commit()
+        login_rate_limiter.reset()
+        self.previous = {key: app.config[key] for key in (
+            'LOGIN_RATE_LIMIT_ACCOUNT_BURST', 'LOGIN_RATE_LIMIT_IP_BURST', 'LOGIN_RATE_LIMIT_ACCOUNT_PER_MINUTE',
+            'REGISTER_RATE_LIMIT_IP_BURST'
+        )}
+
+    def tearDown(self):
+        """Връща настройките и изчиства кофите."""
+        app.config.update(self.previous)
+        login_rate_limiter.reset()
+
+    def _login(self, email: str, password: str = 'wrong', ip: str = '10.0.0.1'):
+        return self.client.post('/api/auth/login',
+                                json={'email': email, 'password': password},
+                                environ_base={'REMOTE_ADDR': ip})
+
+    def test_account_limited_before_password_check(self):
+        """Тест: След пика от опити за акаунта -> 429, дори с вярна парола."""
+        app.config['LOGIN_RATE_LIMIT_ACCOUNT_BURST'] = 2
+        user = RegisteredUser(username='victim', email='victim@test.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+
+        self.assertEqual(self._login('victim@test.com', ip='10.0.0.1').status_code, 401)
+        self.assertEqual(self._login('VICTIM@test.com', ip='10.0.0.2').status_code, 401)
+        response = self._login('victim@test.com', 'password123', ip='10.0.0.3')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        # Друг акаунт не е засегнат
+        self.assertEqual(self._login('other@test.com', ip='10.0.0.3').status_code, 401)
+
+    def test_ip_limited_across_accounts(self):
+        """Тест: Един IP адрес, много акаунти -> 429 след пика на IP адреса."""
+        app.config['LOGIN_RATE_LIMIT_IP_BURST'] = 3
+
+        statuses = [self._login(f'user{i}@test.com').status_code for i in range(4)]
+
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self._login('user9@test.com', ip='10.0.0.9').status_code, 401)
+
+    def test_no_refill_caps_retry_after(self):
+        """Тест: *_PER_MINUTE = 0 (кофата не се пълни) -> 429 с ограничен Retry-After, не 500."""
+        app.config['LOGIN_RATE_LIMIT_ACCOUNT_BURST'] = 1
+        app.config['LOGIN_RATE_LIMIT_ACCOUNT_PER_MINUTE'] = 0
+
+        self.assertEqual(self._login('victim@test.com').status_code, 401)
+        response = self._login('victim@test.com')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response.headers['Retry-After']), MAX_RETRY_AFTER_SECONDS)
+
+    def test_register_limited_by_ip(self):
+        """Тест: Повторни регистрации от един IP адрес -> 429 преди хеширането."""
+        app.config['REGISTER_RATE_LIMIT_IP_BURST'] = 2
+
+        def register(i: int, ip: str = '10.0.0.1'):
+            return self.client.post('/api/auth/register', environ_base={'REMOTE_ADDR': ip}, json={
+                'username': 'taken', 'email': f'taken{i}@test.com', 'password': 'password123'
+            })
+
+        statuses = [register(i).status_code for i in range(3)]
+
+        self.assertEqual(statuses, [201, 400, 429])
+        self.assertIn('Retry-After', register(3).headers)
+        self.assertEqual(register(4, ip='10.0.0.2').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
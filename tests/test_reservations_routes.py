@@ -6,11 +6,12 @@
     - Available slots
     - History
     - Status updates
+    - Timeseries (дневни обобщения)
 """
 import unittest
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -19,6 +20,9 @@ from db import db
 from models.user import RegisteredUser, Provider, Admin
 from models.service import Service
 from models.reservation import Reservation, ReservationStatus
+from models.notification import Notification, NotificationType
+from models.booking_digest import booking_digest
+from models.reservation_rollup import ReservationRollup, backfill_reservation_rollups, rebuild_reservation_rollups
 
 
 def make_reservation(customer_id: int, provider_id: int, service_id: int,
@@ -58,9 +62,11 @@ class TestReservationsRoutes(unittest.TestCase):
     def setUp(self):
         """Изпълнява се ПРЕДИ всеки тест."""
         db.session.query(Reservation).delete()
+        db.session.query(Notification).delete()
         db.session.query(Service).delete()
         db.session.query(RegisteredUser).delete()
         db.session.commit()
+        booking_digest.clear()
 
         # Създаваме provider
         self.provider = Provider(username='provider', email='provider@test.com')
@@ -378,6 +384,67 @@ class TestReservationsRoutes(unittest.TestCase):
         response = self.client.delete('/api/reservations/9999')
         self.assertEqual(response.status_code, 404)
 
+    # ==================== NOTIFICATION TESTS ====================
+
+    def _provider_notification_types(self) -> list[str]:
+        booking_digest.flush(force=True)
+        return sorted(n.type.value for n in Notification.query.filter_by(user_id=self.provider.id))
+
+    def test_update_reservation_notifies_provider(self):
+        """Тест: PUT /reservations/:id с промяна -> известие за доставчика."""
+        reservation = make_reservation(self.user.id, self.provider.id, self.service.id,
+                                       datetime.now() + timedelta(days=1))
+        db.session.add(reservation)
+        db.session.commit()
+
+        self.client.put(f'/api/reservations/{reservation.id}', json={'notes': reservation.notes})
+        self.assertEqual(self._provider_notification_types(), [])  # Без промяна - без известие
+
+        new_date = (datetime.now() + timedelta(days=2)).replace(microsecond=0).isoformat()
+        response = self.client.put(f'/api/reservations/{reservation.id}', json={'datetime': new_date})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._provider_notification_types(), [NotificationType.BOOKING_UPDATED.value])
+
+    def test_update_status_notifies_customer(self):
+        """Тест: PUT /reservations/:id/status -> известие като от методите на Provider."""
+        reservation = make_reservation(self.user.id, self.provider.id, self.service.id,
+                                       datetime.now() + timedelta(days=1))
+        db.session.add(reservation)
+        db.session.commit()
+
+        for status in ('Confirmed', 'Confirmed', 'Completed'):  # Повторението не е промяна
+            response = self.client.put(f'/api/reservations/{reservation.id}/status', json={'status': status},
+                                       headers={'X-User-ID': str(self.provider.id)})
+            self.assertEqual(response.status_code, 200)
+
+        types = sorted(n.type.value for n in Notification.query.filter_by(user_id=self.user.id))
+        self.assertEqual(types, [NotificationType.RESERVATION_COMPLETED.value,
+                                 NotificationType.RESERVATION_CONFIRMED.value])
+
+    def test_cancel_status_by_customer_notifies_provider(self):
+        """Тест: отмяна от клиента през /status -> известие за доставчика, не за клиента."""
+        reservation = make_reservation(self.user.id, self.provider.id, self.service.id,
+                                       datetime.now() + timedelta(days=1))
+        db.session.add(reservation)
+        db.session.commit()
+
+        self.client.put(f'/api/reservations/{reservation.id}/status', json={'status': 'Canceled'},
+                        headers={'X-User-ID': str(self.user.id)})
+
+        self.assertEqual(self._provider_notification_types(), [NotificationType.BOOKING_CANCELED.value])
+        self.assertEqual(Notification.query.filter_by(user_id=self.user.id).count(), 0)
+
+    def test_delete_reservation_notifies_provider(self):
+        """Тест: DELETE на активна резервация -> известие за отмяна."""
+        reservation = make_reservation(self.user.id, self.provider.id, self.service.id,
+                                       datetime.now() + timedelta(days=1))
+        db.session.add(reservation)
+        db.session.commit()
+
+        response = self.client.delete(f'/api/reservations/{reservation.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._provider_notification_types(), [NotificationType.BOOKING_CANCELED.value])
+
     # ==================== AVAILABLE SLOTS TESTS ====================
 
     def test_get_available_slots(self):
@@ -483,5 +550,103 @@ class TestReservationsRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 401)
 
 
+    # ==================== TIMESERIES TESTS ====================
+
+    def _rollup_rows(self) -> set:
+        return {
+            (r.day, r.provider_id, r.service_id, r.pending, r.confirmed, r.canceled, r.completed)
+            for r in ReservationRollup.query.all() if r.pending or r.confirmed or r.canceled or r.completed
+        }
+
+    def test_timeseries_follows_status_changes(self):
+        """Тест: GET /reservations/timeseries брои по ден и седмица от обобщенията."""
+        monday = datetime(2030, 1, 7, 10, 0)
+        reservations = [
+            make_reservation(self.user.id, self.provider.id, self.service.id, monday),
+            make_reservation(self.user.id, self.provider.id, self.service.id, monday.replace(hour=12)),
+            make_reservation(self.user.id, self.provider.id, self.service.id, monday + timedelta(days=2)),
+        ]
+        db.session.add_all(reservations)
+        db.session.commit()
+
+        response = self.client.put(f'/api/reservations/{reservations[0].id}/status', json={'status': 'Confirmed'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            '/api/reservations/timeseries?from=2030-01-07&to=2030-01-13',
+            headers={'X-User-ID': str(self.provider.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        days = response.get_json()
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[0], {'period': '2030-01-07', 'pending': 1, 'confirmed': 1,
+                                   'canceled': 0, 'completed': 0, 'total': 2})
+        self.assertEqual(days[2]['pending'], 1)
+        self.assertEqual(days[1]['total'], 0)
+
+        response = self.client.get(
+            '/api/reservations/timeseries?from=2030-01-07&to=2030-01-13&granularity=week',
+            headers={'X-User-ID': str(self.provider.id)}
+        )
+        self.assertEqual([w['total'] for w in response.get_json()], [3])
+
+    def test_timeseries_reschedule_moves_day(self):
+        """Тест: смяна на датата мести резервацията в обобщението на новия ден."""
+        reservation = make_reservation(self.user.id, self.provider.id, self.service.id,
+                                       datetime(2030, 1, 7, 10, 0))
+        db.session.add(reservation)
+        db.session.commit()
+
+        response = self.client.put(f'/api/reservations/{reservation.id}',
+                                   json={'datetime': datetime(2030, 1, 9, 10, 0).isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+        incremental = self._rollup_rows()
+        rebuild_reservation_rollups()
+        db.session.commit()
+        self.assertEqual(incremental, self._rollup_rows())
+        self.assertEqual({row[0] for row in incremental}, {date(2030, 1, 9)})
+
+    def test_timeseries_only_own_reservations(self):
+        """Тест: доставчикът вижда само своите резервации, клиентът получава 403."""
+        db.session.add(make_reservation(self.user.id, self.provider.id, self.service.id,
+                                        datetime(2030, 1, 7, 10, 0)))
+        db.session.commit()
+
+        response = self.client.get(
+            f'/api/reservations/timeseries?from=2030-01-07&to=2030-01-07&provider_id={self.provider.id + 100}',
+            headers={'X-User-ID': str(self.provider.id)}
+        )
+        self.assertEqual(response.get_json()[0]['total'], 1)
+
+        response = self.client.get(
+            f'/api/reservations/timeseries?from=2030-01-07&to=2030-01-07&provider_id={self.provider.id}',
+            headers={'X-User-ID': str(self.user.id)}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_timeseries_validation(self):
+        """Тест: без вход -> 401, невалидни параметри -> 400."""
+        self.assertEqual(self.client.get('/api/reservations/timeseries').status_code, 401)
+
+        headers = {'X-User-ID': str(self.provider.id)}
+        for query in ('granularity=month', 'from=2030-13-01', 'from=2030-01-10&to=2030-01-01',
+                      'from=2020-01-01&to=2030-01-01'):
+            response = self.client.get(f'/api/reservations/timeseries?{query}', headers=headers)
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_backfill_matches_incremental(self):
+        """Тест: backfill на пакети дава същите обобщения като събитията."""
+        for day in range(10):
+            db.session.add(make_reservation(self.user.id, self.provider.id, self.service.id,
+                                            datetime(2030, 1, 1, 9, 0) + timedelta(days=day)))
+        db.session.commit()
+        incremental = self._rollup_rows()
+
+        written = backfill_reservation_rollups(days_per_batch=3)
+
+        self.assertEqual(written, 10)
+        self.assertEqual(incremental, self._rollup_rows())
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,6 +5,8 @@
     - CRUD операции за ревюта
     - Филтрация по service_id
 """
+import io
+import json
 import unittest
 import sys
 import os
@@ -16,6 +18,8 @@ from db import db
 from models.user import RegisteredUser, Provider, Admin
 from models.service import Service
 from models.review import Review
+from models.review_import import import_reviews
+from routes.pagination import encode_cursor
 
 
 class TestReviewsRoutes(unittest.TestCase):
@@ -92,6 +96,12 @@ class TestReviewsRoutes(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(len(data), 1)
 
+    def test_get_reviews_crafted_cursor(self):
+        """Тест: курсор, който не е [id], връща 400."""
+        for values in (['x'], [None], [1, 2], [[1]]):
+            response = self.client.get(f'/api/reviews?cursor={encode_cursor(values)}')
+            self.assertEqual(response.status_code, 400, values)
+
     def test_get_reviews_by_service_id(self):
         """Тест: GET /reviews?service_id=... филтрира по услуга."""
         review = Review(
@@ -217,6 +227,113 @@ class TestReviewsRoutes(unittest.TestCase):
         response = self.client.delete('/api/reviews/9999')
         self.assertEqual(response.status_code, 404)
 
+    # ==================== IMPORT TESTS ====================
+
+    def test_import_reviews_csv_updates_aggregates(self):
+        """Тест: CSV импорт записва валидните редове и преизчислява агрегатите."""
+        content = (
+            'rating,user_id,service_id,comment\n'
+            f'5,{self.user.id},{self.service.id},Супер\n'
+            f'3,{self.user.id},{self.service.id},\n'
+            f'9,{self.user.id},{self.service.id},Грешна оценка\n'
+            f'4,{self.user.id},9999,Няма услуга\n'
+        )
+        report = import_reviews(io.StringIO(content), 'csv', chunk_size=2)
+
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual(report['skipped'], 2)
+        self.assertEqual([e['line'] for e in report['errors']], [4, 5])
+        self.assertEqual(report['services_updated'], 1)
+
+        service = db.session.get(Service, self.service.id)
+        self.assertEqual(service.rating_count, 2)
+        self.assertEqual(service.average_rating, 4.0)
+        self.assertEqual(service.rating_histogram['5'], 1)
+
+    def test_import_reviews_adds_to_existing_aggregates(self):
+        """Тест: импортът добавя към агрегатите - резултатът съвпада с преизчисляването."""
+        self.user.leave_review(self.service.id, 2)
+        content = 'rating,user_id,service_id\n' + ''.join(
+            f'{rating},{self.user.id},{self.service.id}\n' for rating in (5, 5, 4, 1, 3)
+        )
+        import_reviews(io.StringIO(content), 'csv', chunk_size=2)
+
+        def aggregates():
+            service = db.session.get(Service, self.service.id)
+            db.session.refresh(service)
+            return (service.rating_count, service.rating_sum, service.rating_avg,
+                    dict(service.rating_histogram))
+
+        imported = aggregates()
+        Service.recompute_rating_aggregates(service_id=self.service.id)
+        db.session.commit()
+        self.assertEqual(imported, aggregates())
+        self.assertEqual(imported[:2], (6, 20))
+
+    def test_import_reviews_commits_each_chunk(self):
+        """Тест: прекъснат импорт запазва вече записаните пакети с верни агрегати."""
+        def broken_stream():
+            yield 'rating,user_id,service_id\n'
+            for rating in (5, 3):
+                yield f'{rating},{self.user.id},{self.service.id}\n'
+            raise OSError('Връзката прекъсна')
+
+        with self.assertRaises(OSError):
+            import_reviews(broken_stream(), 'csv', chunk_size=1)
+
+        service = db.session.get(Service, self.service.id)
+        self.assertEqual(service.rating_count, 2)
+        self.assertEqual(service.average_rating, 4.0)
+
+    def test_import_reviews_endpoint_ndjson(self):
+        """Тест: POST /reviews/import със сурово NDJSON тяло."""
+        lines = [
+            json.dumps({'rating': 4, 'user_id': self.user.id, 'service_id': self.service.id}),
+            'не е json',
+            json.dumps({'rating': 2, 'user_id': 9999, 'service_id': self.service.id}),
+        ]
+        response = self.client.post(
+            '/api/reviews/import?format=ndjson',
+            headers={'X-User-ID': str(self.admin.id)},
+            data='\n'.join(lines)
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['skipped'], 2)
+        self.assertIn('rows_per_second', data)
+        self.assertEqual(Review.query.count(), 1)
+
+    def test_import_reviews_endpoint_file_upload(self):
+        """Тест: POST /reviews/import с качен .csv файл (форматът се познава от името)."""
+        content = f'rating,user_id,service_id\n5,{self.user.id},{self.service.id}\n'
+        response = self.client.post(
+            '/api/reviews/import',
+            headers={'X-User-ID': str(self.admin.id)},
+            data={'file': (io.BytesIO(content.encode('utf-8')), 'reviews.csv')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['imported'], 1)
+
+    def test_import_reviews_requires_admin(self):
+        """Тест: обикновен потребител не може да импортира."""
+        response = self.client.post(
+            '/api/reviews/import?format=csv',
+            headers={'X-User-ID': str(self.user.id)},
+            data='rating,user_id,service_id\n'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_reviews_unknown_format(self):
+        """Тест: без format и без разпознаваемо име -> 400."""
+        response = self.client.post(
+            '/api/reviews/import',
+            headers={'X-User-ID': str(self.admin.id)},
+            data='1,2,3'
+        )
+        self.assertEqual(response.status_code, 400)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,8 +5,10 @@
     - Създаване на услуга
     - Конструктора (__init__)
     - to_dict() метода
+    - Агрегатите на ревютата (rating_count, rating_sum, хистограма)
 """
 import unittest
+from datetime import datetime, time
 import sys
 import os
 
@@ -16,6 +18,8 @@ from main import app
 from db import db
 from models.user import Provider, RegisteredUser
 from models.service import Service
+from models.review import Review
+from models.reservation import Reservation
 
 
 class TestService(unittest.TestCase):
@@ -133,5 +137,129 @@ class TestService(unittest.TestCase):
         self.assertEqual(loaded_service.provider_id, self.provider.id)
 
 
+
+class TestServiceRatingAggregates(unittest.TestCase):
+    """Тестове за денормализираните агрегати на ревютата."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Създава тестова база данни."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['TESTING'] = True
+        cls.app = app
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Изтрива тестовата база данни."""
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        """Изпълнява се ПРЕДИ всеки тест."""
+        db.session.query(Review).delete()
+        db.session.query(Reservation).delete()
+        db.session.query(Service).delete()
+        db.session.query(RegisteredUser).delete()
+        db.session.commit()
+
+        self.provider = Provider(username='test_provider', email='provider@test.com')
+        self.provider.set_password('password123')
+        self.user = RegisteredUser(username='reviewer', email='reviewer@test.com')
+        self.user.set_password('password123')
+        db.session.add_all([self.provider, self.user])
+        db.session.commit()
+
+        self.service = Service(name='Услуга', category='Кат', provider_id=self.provider.id)
+        db.session.add(self.service)
+        db.session.commit()
+
+    def test_new_service_has_empty_aggregates(self):
+        """Тест: нова услуга няма оценки."""
+        result = self.service.to_dict()
+
+        self.assertIsNone(result['average_rating'])
+        self.assertEqual(result['rating_count'], 0)
+        self.assertEqual(result['rating_histogram'], {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0})
+
+    def test_leave_review_updates_aggregates(self):
+        """Тест: leave_review() обновява броя, сумата и хистограмата."""
+        self.user.leave_review(self.service.id, 5)
+        self.user.leave_review(self.service.id, 2)
+
+        result = self.service.to_dict()
+        self.assertEqual(result['rating_count'], 2)
+        self.assertEqual(result['average_rating'], 3.5)
+        self.assertEqual(result['rating_histogram']['5'], 1)
+        self.assertEqual(result['rating_histogram']['2'], 1)
+
+    def test_delete_review_updates_aggregates(self):
+        """Тест: изтриването на ревю го премахва от агрегатите."""
+        review = self.user.leave_review(self.service.id, 4)
+        self.user.leave_review(self.service.id, 2)
+
+        db.session.delete(review)
+        db.session.commit()
+
+        self.assertEqual(self.service.rating_count, 1)
+        self.assertEqual(self.service.rating_sum, 2)
+        self.assertEqual(self.service.rating_4, 0)
+
+    def test_recompute_rating_aggregates(self):
+        """Тест: repair job-ът възстановява разминали се агрегати."""
+        self.user.leave_review(self.service.id, 3)
+        self.service.rating_count = 99
+        self.service.rating_sum = 0
+        db.session.commit()
+
+        Service.recompute_rating_aggregates()
+        db.session.commit()
+
+        self.assertEqual(self.service.rating_count, 1)
+        self.assertEqual(self.service.rating_sum, 3)
+        self.assertEqual(self.service.rating_histogram['3'], 1)
+
+    def test_booking_count_follows_reservations(self):
+        """Тест: booking_count се увеличава/намалява с резервациите."""
+        reservation = self.user.create_reservation(self.service.id, datetime(2026, 3, 1, 10, 0))
+        self.user.create_reservation(self.service.id, datetime(2026, 3, 1, 11, 0))
+        self.assertEqual(self.service.booking_count, 2)
+
+        db.session.delete(reservation)
+        db.session.commit()
+        self.assertEqual(self.service.booking_count, 1)
+
+        Service.recompute_booking_counts()
+        db.session.commit()
+        self.assertEqual(self.service.booking_count, 1)
+
+    def test_next_free_slots_skips_booked_hours(self):
+        """Тест: next_free_slots() прескача заетите часове и края на работния ден."""
+        self.user.create_reservation(self.service.id, datetime(2026, 3, 2, 9, 0))
+        self.user.create_reservation(self.service.id, datetime(2026, 3, 2, 10, 0))
+
+        slots = Service.next_free_slots([self.service], now=datetime(2026, 3, 2, 8, 30))
+        self.assertEqual(slots[self.service.id], datetime(2026, 3, 2, 11, 0))
+
+        # След края на работното време -> първият час на следващия ден
+        slots = Service.next_free_slots([self.service], now=datetime(2026, 3, 2, 17, 30))
+        self.assertEqual(slots[self.service.id], datetime(2026, 3, 3, 9, 0))
+
+    def test_daily_slots_expression_matches_python(self):
+        """Тест: SQL версията на daily_slots съвпада с Python версията (и не е отрицателна)."""
+        self.service.working_hours_start = time(18, 0)
+        self.service.working_hours_end = time(9, 0)
+        db.session.commit()
+
+        slots = db.session.execute(
+            db.select(Service.daily_slots).where(Service.id == self.service.id)
+        ).scalar_one()
+        self.assertEqual(slots, self.service.daily_slots)
+        self.assertEqual(slots, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
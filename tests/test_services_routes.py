@@ -9,6 +9,7 @@
 import unittest
 import sys
 import os
+from sqlalchemy import event
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -17,6 +18,9 @@ from db import db
 from models.user import RegisteredUser, Provider, Admin, UserRole
 from models.service import Service
 from models.review import Review
+from models.service_facets import get_facet_summary, invalidate_facet_cache
+from routes.identity import issue_token
+from routes.pagination import encode_cursor
 
 
 class TestServicesRoutes(unittest.TestCase):
@@ -46,6 +50,9 @@ class TestServicesRoutes(unittest.TestCase):
         db.session.query(Service).delete()
         db.session.query(RegisteredUser).delete()
         db.session.commit()
+        # Масовият delete не маха изтеклите обекти от предишните тестове от
+        # identity map-а, а SQLite преизползва id-тата им
+        db.session.expunge_all()
 
         # Създаваме provider
         self.provider = Provider(username='provider', email='provider@test.com')
@@ -84,6 +91,63 @@ class TestServicesRoutes(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(len(data), 1)
 
+    def _add_catalog(self):
+        """Помощен метод - добавя още услуги с различни цени."""
+        for index, price in enumerate([30.0, 10.0, 20.0]):
+            db.session.add(Service(name=f'Extra {index}', category='Extra',
+                                   provider_id=self.provider.id, price=price))
+        db.session.commit()
+
+    def test_get_all_services_sorted_by_price(self):
+        """Тест: GET /services?sort=price подрежда по цена."""
+        self._add_catalog()
+
+        response = self.client.get('/api/services?sort=price')
+        prices = [s['price'] for s in response.get_json()]
+        self.assertEqual(prices, [10.0, 20.0, 30.0, 100.0])
+
+        response = self.client.get('/api/services?sort=price&order=desc')
+        prices = [s['price'] for s in response.get_json()]
+        self.assertEqual(prices, [100.0, 30.0, 20.0, 10.0])
+
+    def test_get_all_services_keyset_pagination(self):
+        """Тест: страниците се свързват чрез хедъра X-Next-Cursor."""
+        self._add_catalog()
+
+        first = self.client.get('/api/services?sort=price&limit=3')
+        self.assertEqual([s['price'] for s in first.get_json()], [10.0, 20.0, 30.0])
+        cursor = first.headers.get('X-Next-Cursor')
+        self.assertIsNotNone(cursor)
+
+        second = self.client.get(f'/api/services?sort=price&limit=3&cursor={cursor}')
+        self.assertEqual([s['price'] for s in second.get_json()], [100.0])
+        self.assertNotIn('X-Next-Cursor', second.headers)
+
+    def test_get_all_services_sorted_by_rating(self):
+        """Тест: sort=rating използва денормализираната средна оценка."""
+        self._add_catalog()
+        top = Service.query.filter_by(name='Extra 1').one()
+        self.user.leave_review(top.id, 5)
+
+        response = self.client.get('/api/services?sort=rating&order=desc&limit=1')
+        self.assertEqual(response.get_json()[0]['id'], top.id)
+
+    def test_get_all_services_invalid_sort(self):
+        """Тест: невалиден sort/cursor връща 400."""
+        self.assertEqual(self.client.get('/api/services?sort=name').status_code, 400)
+        self.assertEqual(self.client.get('/api/services?cursor=???').status_code, 400)
+
+    def test_get_all_services_crafted_cursor(self):
+        """Тест: курсор с грешен брой или тип на стойностите -> 400, не 500."""
+        for sort, values in (('id', ['x']), ('id', [1, 2]), ('id', [True]), ('price', [[1], 1]),
+                             ('price', [10.0, 'x']), ('price', [10.0])):
+            cursor = encode_cursor(values)
+            response = self.client.get(f'/api/services?sort={sort}&cursor={cursor}')
+            self.assertEqual(response.status_code, 400, (sort, values))
+
+        cursor = encode_cursor([{'a': 1}, 1])
+        self.assertEqual(self.client.get(f'/api/services/most-favorited?cursor={cursor}').status_code, 400)
+
     def test_get_service_by_id(self):
         """Тест: GET /services/:id връща услуга."""
         response = self.client.get(f'/api/services/{self.service.id}')
@@ -150,6 +214,103 @@ class TestServicesRoutes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_create_service_with_bearer_token(self):
+        """Тест: POST /services само с токен, без X-User-ID."""
+        with app.test_request_context():
+            token = issue_token(self.provider)
+
+        response = self.client.post(
+            '/api/services',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'name': 'Token Service', 'category': 'Token'}
+        )
+        self.assertEqual(response.status_code, 201)
+        service = db.session.get(Service, response.get_json()['service_id'])
+        self.assertEqual(service.provider_id, self.provider.id)
+
+    def test_create_service_with_user_token_forbidden(self):
+        """Тест: Токен на обикновен потребител -> 403."""
+        with app.test_request_context():
+            token = issue_token(self.user)
+
+        response = self.client.post(
+            '/api/services',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'name': 'Test', 'category': 'Test'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_demoted_provider_token_forbidden(self):
+        """Тест: Токен на доставчик, понижен след входа -> 403 (ролята се сверява с базата)."""
+        with app.test_request_context():
+            token = issue_token(self.provider)
+        db.session.execute(
+            db.update(RegisteredUser).where(RegisteredUser.id == self.provider.id).values(role=UserRole.USER)
+        )
+        db.session.commit()
+        db.session.expunge_all()
+
+        response = self.client.post(
+            '/api/services',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'name': 'Test', 'category': 'Test'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_tampered_token_rejected(self):
+        """Тест: Променен токен (напр. друга роля) -> 401."""
+        with app.test_request_context():
+            token = issue_token(self.user)
+
+        response = self.client.post(
+            '/api/services',
+            headers={'Authorization': f'Bearer {token[:-2]}xx'},
+            json={'name': 'Test', 'category': 'Test'}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_expired_token_rejected(self):
+        """Тест: Изтекъл токен -> 401."""
+        with app.test_request_context():
+            token = issue_token(self.provider)
+
+        app.config['AUTH_TOKEN_MAX_AGE_SECONDS'] = -1
+        try:
+            response = self.client.post(
+                '/api/services',
+                headers={'Authorization': f'Bearer {token}'},
+                json={'name': 'Test', 'category': 'Test'}
+            )
+        finally:
+            app.config['AUTH_TOKEN_MAX_AGE_SECONDS'] = 86400
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_id_header_can_be_disabled(self):
+        """Тест: AUTH_ALLOW_USER_ID_HEADER=False -> X-User-ID се игнорира."""
+        app.config['AUTH_ALLOW_USER_ID_HEADER'] = False
+        try:
+            response = self.client.post(
+                '/api/services',
+                headers={'X-User-ID': str(self.provider.id)},
+                json={'name': 'Test', 'category': 'Test'}
+            )
+        finally:
+            app.config['AUTH_ALLOW_USER_ID_HEADER'] = True
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_id_header_only_in_debug_or_testing(self):
+        """Тест: извън DEBUG/TESTING X-User-ID се игнорира дори при включен флаг."""
+        app.config['TESTING'] = False
+        try:
+            response = self.client.post(
+                '/api/services',
+                headers={'X-User-ID': str(self.provider.id)},
+                json={'name': 'Test', 'category': 'Test'}
+            )
+        finally:
+            app.config['TESTING'] = True
+        self.assertEqual(response.status_code, 401)
+
     # ==================== UPDATE SERVICE TESTS ====================
 
     def test_update_service_as_owner(self):
@@ -308,6 +469,82 @@ class TestServicesRoutes(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(len(data), 0)
 
+    def test_search_services_with_facets(self):
+        """Тест: GET /services/search?facets=true връща резултати + фасети."""
+        db.session.add(Service(name='Cheap', category='Other', provider_id=self.provider.id,
+                               price=20.0, duration=30))
+        db.session.commit()
+
+        response = self.client.get('/api/services/search?facets=true')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data['results']), 2)
+
+        facets = data['facets']
+        self.assertEqual(facets['categories'], [
+            {'value': 'Other', 'count': 1},
+            {'value': 'Test Category', 'count': 1},
+        ])
+        price = {b['value']: b['count'] for b in facets['price']}
+        self.assertEqual(price, {'0-50': 1, '50-100': 0, '100-200': 1, '200+': 0})
+        duration = {b['value']: b['count'] for b in facets['duration']}
+        self.assertEqual(duration['30-60'], 1)
+        self.assertEqual(duration['60-120'], 1)
+
+    def test_search_facets_follow_filters(self):
+        """Тест: фасетите се изчисляват върху филтрирания резултат."""
+        db.session.add(Service(name='Cheap', category='Other', provider_id=self.provider.id,
+                               price=20.0))
+        db.session.commit()
+
+        response = self.client.get('/api/services/search?category=Other&facets=true')
+        facets = response.get_json()['facets']
+        self.assertEqual(facets['categories'], [{'value': 'Other', 'count': 1}])
+
+    def test_facet_summary_invalidated_on_write(self):
+        """Тест: кешираното обобщение се обновява след запис на услуга."""
+        first = self.client.get('/api/services/search?facets=true').get_json()['facets']
+        self.assertEqual(len(first['categories']), 1)
+
+        self.client.post(
+            '/api/services',
+            json={'name': 'New', 'category': 'Fresh Category'},
+            headers={'X-User-ID': str(self.provider.id)}
+        )
+
+        second = self.client.get('/api/services/search?facets=true').get_json()['facets']
+        self.assertIn({'value': 'Fresh Category', 'count': 1}, second['categories'])
+
+    def test_facet_summary_invalidated_after_rollback(self):
+        """Тест: обобщение, кеширано от незавършена транзакция, не надживява rollback-а."""
+        db.session.add(Service(name='Draft', category='Draft Category', provider_id=self.provider.id))
+        db.session.flush()
+        self.assertIn({'value': 'Draft Category', 'count': 1}, get_facet_summary()['categories'])
+
+        db.session.rollback()
+
+        self.assertNotIn({'value': 'Draft Category', 'count': 1}, get_facet_summary()['categories'])
+
+    def test_facet_summary_not_cached_if_invalidated_while_computing(self):
+        """Тест: commit по време на изчислението -> резултатът не се кешира."""
+        invalidate_facet_cache()
+        facet_queries = []
+
+        def concurrent_commit(_conn, _cursor, statement, *_args):
+            if 'facet' in statement:
+                facet_queries.append(statement)
+                if len(facet_queries) == 1:
+                    invalidate_facet_cache()  # Както after_commit на друга заявка
+
+        event.listen(db.engine, 'before_cursor_execute', concurrent_commit)
+        try:
+            get_facet_summary()
+            get_facet_summary()
+            get_facet_summary()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', concurrent_commit)
+        self.assertEqual(len(facet_queries), 2)
+
     # ==================== SERVICE REVIEWS TESTS ====================
 
     def test_get_service_reviews_empty(self):
@@ -333,6 +570,38 @@ class TestServicesRoutes(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(len(data), 1)
 
+    def test_get_service_reviews_paginated_newest_first(self):
+        """Тест: ревютата са най-новите първо и се странират с курсор."""
+        for rating in [1, 2, 3]:
+            db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=rating))
+        db.session.commit()
+
+        first = self.client.get(f'/api/services/{self.service.id}/reviews?limit=2')
+        self.assertEqual([r['rating'] for r in first.get_json()], [3, 2])
+        cursor = first.headers['X-Next-Cursor']
+
+        second = self.client.get(f'/api/services/{self.service.id}/reviews?limit=2&cursor={cursor}')
+        self.assertEqual([r['rating'] for r in second.get_json()], [1])
+        self.assertNotIn('X-Next-Cursor', second.headers)
+
+    def test_get_service_rating_summary(self):
+        """Тест: GET /services/:id/reviews/summary връща агрегатите."""
+        for rating in [5, 4, 4]:
+            db.session.add(Review(user_id=self.user.id, service_id=self.service.id, rating=rating))
+        db.session.commit()
+
+        response = self.client.get(f'/api/services/{self.service.id}/reviews/summary')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['rating_count'], 3)
+        self.assertAlmostEqual(data['average_rating'], 13 / 3)
+        self.assertEqual(data['rating_histogram'], {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+
+    def test_get_service_rating_summary_not_found(self):
+        """Тест: обобщение за несъществуваща услуга."""
+        response = self.client.get('/api/services/9999/reviews/summary')
+        self.assertEqual(response.status_code, 404)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,6 +7,7 @@
     - Assert: Проверка на резултата
 """
 import unittest
+from datetime import datetime, date
 import sys
 import os
 
@@ -131,6 +132,74 @@ class TestGuest(unittest.TestCase):
         # Assert
         self.assertEqual(len(result), 0)
 
+    def _book(self, service: Service, hour: int,
+              status: ReservationStatus = ReservationStatus.CONFIRMED) -> None:
+        """Помощен метод - резервира 10.02.2026 в даден час."""
+        db.session.add(Reservation(
+            datetime=datetime(2026, 2, 10, hour, 0),
+            customer_id=self.provider.id,
+            provider_id=self.provider.id,
+            service_id=service.id,
+            status=status
+        ))
+
+    def test_search_services_by_date_partially_booked(self):
+        """Тест: услуга с една резервация остава налична за деня."""
+        # Arrange
+        self._book(self.service1, 10)
+        db.session.commit()
+        guest = Guest()
+
+        # Act
+        result = guest.search_services(date_on=date(2026, 2, 10))
+
+        # Assert
+        self.assertEqual(len(result), 2)
+
+    def test_search_services_by_date_fully_booked(self):
+        """Тест: услуга с всички заети часове (09:00-18:00) отпада от резултата."""
+        # Arrange
+        for hour in range(9, 18):
+            self._book(self.service1, hour)
+        db.session.commit()
+        guest = Guest()
+
+        # Act
+        result = guest.search_services(date_on=date(2026, 2, 10))
+        other_day = guest.search_services(date_on=date(2026, 2, 11))
+
+        # Assert
+        self.assertEqual([s['name'] for s in result], ['Massage'])
+        self.assertEqual(len(other_day), 2)
+
+    def test_search_services_by_date_ignores_hours_outside_work(self):
+        """Тест: резервации извън работното време не запълват деня."""
+        # Arrange
+        for hour in list(range(9, 17)) + [7, 20]:  # 8 от 9-те работни часа + 2 извън тях
+            self._book(self.service1, hour)
+        db.session.commit()
+        guest = Guest()
+
+        # Act
+        result = guest.search_services(date_on=date(2026, 2, 10))
+
+        # Assert
+        self.assertEqual(len(result), 2)
+
+    def test_search_services_by_date_ignores_canceled(self):
+        """Тест: отменените резервации не заемат часове."""
+        # Arrange
+        for hour in range(9, 18):
+            self._book(self.service1, hour, status=ReservationStatus.CANCELED)
+        db.session.commit()
+        guest = Guest()
+
+        # Act
+        result = guest.search_services(date_on=date(2026, 2, 10))
+
+        # Assert
+        self.assertEqual(len(result), 2)
+
     def test_view_service_existing(self):
         """Тест: view_service() връща услуга по ID."""
         # Arrange
@@ -346,6 +415,19 @@ class TestProvider(unittest.TestCase):
         self.assertIsInstance(self.provider, RegisteredUser)
         self.assertIsInstance(self.provider, Guest)
 
+    def test_polymorphic_loading(self):
+        """Тест: Зареждане през RegisteredUser връща Provider (по колоната role)."""
+        # Arrange
+        provider_id = self.provider.id
+        db.session.expunge_all()
+
+        # Act
+        loaded = db.session.get(RegisteredUser, provider_id)
+
+        # Assert
+        self.assertIsInstance(loaded, Provider)
+        self.assertIsNone(db.session.get(Admin, provider_id))
+
     def test_provider_role(self):
         """Тест: Provider има роля PROVIDER."""
         # Assert